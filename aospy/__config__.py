@@ -1,3 +1,5 @@
 import os
 
 user_path = os.path.join(os.getenv('HOME', ''), 'aospy_user', 'aospy_user')
+cache_path = os.getenv('AOSPY_CACHE_DIR',
+                       os.path.join(os.getenv('HOME', ''), '.aospy_cache'))
@@ -5,7 +5,7 @@ from . import utils
 from . import var
 from .var import Var
 from . import region
-from .region import Region
+from .region import Region, RegionSet
 from . import run
 from .run import Run
 from . import model
@@ -17,5 +17,5 @@ from .calc import CalcInterface, Calc
 from .automate import submit_mult_calcs
 from . import examples
 
-__all__ = ['Proj', 'Model', 'Run', 'Var', 'Region', 'calc',
+__all__ = ['Proj', 'Model', 'Run', 'Var', 'Region', 'RegionSet', 'calc',
            '_constants', 'utils']
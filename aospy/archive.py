@@ -0,0 +1,199 @@
+"""Archives bundling the outputs of aospy calculations into single files.
+
+Each `Calc` can add its outputs to an archive in the ``tar_direc_out``
+directory of its `Proj`.  Archives are written by many calculations, possibly
+running concurrently in separate processes, so adding (or replacing) a member
+must be cheap and safe to do concurrently.  :py:class:`TarArchive`, the
+default, achieves this by only ever appending to a standard tar file and
+keeping an index of where the latest version of each member is stored.
+"""
+import io
+import json
+import logging
+import os
+import shutil
+import tarfile
+
+from .utils.io import file_lock, replace_file
+
+
+class Archive(object):
+    """Base class for archives of aospy output files.
+
+    Subclasses implement ``add``, ``open``, and ``names``, and set the
+    ``file_name`` class attribute to the name of the archive file within the
+    ``tar_direc_out`` directory of each `Calc`.
+
+    Writes are serialized across threads and (where ``fcntl`` is available)
+    processes by locking a ``.lock`` file alongside the archive, so that
+    calculations executed in parallel can write to the same archive.
+
+    Parameters
+    ----------
+    path : str
+        Path to the archive file
+    """
+    file_name = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return '{0} "{1}"'.format(type(self).__name__, self.path)
+
+    __repr__ = __str__
+
+    def _locked(self):
+        """Hold an exclusive lock on the archive."""
+        return file_lock(self.path)
+
+    def add(self, path, arcname):
+        """Add a file to the archive, replacing any member of the same name.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file to add
+        arcname : str
+            Name of the member within the archive
+        """
+        raise NotImplementedError
+
+    def open(self, arcname):
+        """Return a file-like object of the contents of a member.
+
+        Raises
+        ------
+        KeyError
+            If the archive has no member of the given name
+        """
+        raise NotImplementedError
+
+    def names(self):
+        """Names of the members of the archive."""
+        raise NotImplementedError
+
+
+class TarArchive(Archive):
+    """Append-only tar file with an index of its members.
+
+    Adding a member appends it to the end of the tar file, overwriting only
+    the end-of-archive marker, so that its cost is proportional to the size
+    of the member rather than of the archive.  Replacing a member appends
+    its new version; like the ``tar`` command and Python's ``tarfile``
+    module, readers use the last version of each member, and superseded
+    versions can be removed via ``compact``.
+
+    The offset and size of the latest version of each member is recorded in
+    a JSON index alongside the archive (``data.tar.index``), so that members
+    can be read without scanning the archive.  The index is rebuilt by
+    scanning the archive if it is missing or out of date (e.g. for archives
+    written by other tools).
+
+    Parameters
+    ----------
+    path : str
+        Path to the tar file
+    """
+    file_name = 'data.tar'
+
+    @property
+    def _index_path(self):
+        return self.path + '.index'
+
+    def _scan(self):
+        """Build the index by reading the headers of all members."""
+        index = dict(members={}, end=0, size=0)
+        if os.path.isfile(self.path) and os.path.getsize(self.path):
+            with tarfile.open(self.path, 'r') as tar:
+                for member in tar:
+                    if member.isfile():
+                        index['members'][member.name] = [member.offset_data,
+                                                         member.size]
+                index['end'] = tar.offset
+            index['size'] = os.path.getsize(self.path)
+        return index
+
+    def _write_index(self, index):
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        replace_file(tmp_path, self._index_path)
+
+    def _read_index(self):
+        """The index, or None if it is missing or out of date."""
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        size = (os.path.getsize(self.path) if os.path.isfile(self.path)
+                else 0)
+        if index.get('size') != size:
+            return None
+        return index
+
+    def _index(self, locked=False):
+        index = self._read_index()
+        if index is not None:
+            return index
+        if not locked:
+            with self._locked():
+                return self._index(locked=True)
+        logging.debug('Indexing {}'.format(self.path))
+        index = self._scan()
+        self._write_index(index)
+        return index
+
+    def add(self, path, arcname):
+        tarinfo = tarfile.TarInfo(arcname)
+        stat = os.stat(path)
+        tarinfo.size = stat.st_size
+        tarinfo.mtime = stat.st_mtime
+        tarinfo.mode = 0o644
+        header = tarinfo.tobuf(tarfile.DEFAULT_FORMAT, 'utf-8', 'strict')
+        with self._locked():
+            index = self._index(locked=True)
+            mode = 'r+b' if os.path.isfile(self.path) else 'w+b'
+            with open(self.path, mode) as tar, open(path, 'rb') as f:
+                tar.seek(index['end'])
+                tar.write(header)
+                offset_data = tar.tell()
+                shutil.copyfileobj(f, tar)
+                remainder = tarinfo.size % tarfile.BLOCKSIZE
+                if remainder:
+                    tar.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+                end = tar.tell()
+                # End-of-archive marker
+                tar.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+                tar.truncate()
+            index['members'][arcname] = [offset_data, tarinfo.size]
+            index['end'] = end
+            index['size'] = os.path.getsize(self.path)
+            self._write_index(index)
+
+    def open(self, arcname):
+        offset, size = self._index()['members'][arcname]
+        with open(self.path, 'rb') as tar:
+            tar.seek(offset)
+            return io.BytesIO(tar.read(size))
+
+    def names(self):
+        return sorted(self._index()['members'])
+
+    def compact(self):
+        """Rewrite the archive without superseded versions of its members."""
+        with self._locked():
+            index = self._index(locked=True)
+            tmp_path = self.path + '.tmp'
+            with tarfile.open(tmp_path, 'w') as new:
+                with open(self.path, 'rb') as old:
+                    for name in sorted(index['members']):
+                        offset, size = index['members'][name]
+                        old.seek(offset)
+                        tarinfo = tarfile.TarInfo(name)
+                        tarinfo.size = size
+                        tarinfo.mode = 0o644
+                        new.addfile(tarinfo, io.BytesIO(old.read(size)))
+            replace_file(tmp_path, self.path)
+            self._write_index(self._scan())
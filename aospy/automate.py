@@ -12,6 +12,7 @@ import traceback
 
 from .calc import Calc, CalcInterface
 from .region import Region
+from .utils.io import hashable
 from .var import Var
 
 
@@ -256,22 +257,114 @@ def _compute_or_skip_on_error(calc, compute_kwargs):
         return None
 
 
+def _input_loads(calc):
+    """The input data loads a Calc will request from its DataLoader.
+
+    Each load is identified by the same information the DataLoader's input
+    cache uses, so that two Calcs sharing a load will, when executed in the
+    same process, only read that data from disk once.
+    """
+    names = set(var.names for var in calc._input_variables())
+    common = (calc.data_loader, calc.start_date, calc.end_date,
+              hashable(calc.time_offset),
+              calc.data_loader._loading_attrs(**calc.data_loader_attrs))
+    return set((var_names,) + common for var_names in names)
+
+
+def _group_calcs_by_shared_inputs(calcs, max_group_size=None):
+    """Group Calcs that (directly or transitively) share input data loads.
+
+    Parameters
+    ----------
+    calcs : Sequence of ``aospy.Calc`` objects
+    max_group_size : int or None, default None
+        Maximum number of Calcs in a group.  Groups of Calcs sharing inputs
+        that are larger than this are split, in order of first appearance in
+        ``calcs``, into consecutive groups of at most this size, which then
+        load their shared inputs separately.  If None, groups are unbounded.
+
+    Returns
+    -------
+    A list of lists of the indices of the Calcs in each group, with groups
+    ordered by (and the indices within each group sorted by) first appearance
+    in ``calcs``.
+    """
+    parents = list(range(len(calcs)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    owners = {}
+    for i, calc in enumerate(calcs):
+        for load in _input_loads(calc):
+            if load in owners:
+                parents[find(i)] = find(owners[load])
+            else:
+                owners[load] = i
+    groups = {}
+    for i in range(len(calcs)):
+        groups.setdefault(find(i), []).append(i)
+    if max_group_size is None:
+        return sorted(groups.values())
+    return sorted(group[start:start + max_group_size]
+                  for group in groups.values()
+                  for start in range(0, len(group), max_group_size))
+
+
+def _max_group_size(calcs, n_workers):
+    """The largest group of Calcs sharing inputs to run as a single task.
+
+    A widely shared input (e.g. surface pressure) would otherwise join most
+    or all of the Calcs into a single group, which is executed serially.
+    Capping the group size at an even share of the Calcs per worker ensures
+    that every worker is given work.
+    """
+    return max(1, -(-len(calcs) // max(1, n_workers)))
+
+
 def _submit_calcs_on_client(calcs, client, func):
-    """Submit calculations via dask.bag and a distributed client"""
+    """Submit calculations via dask.bag and a distributed client
+
+    Calcs sharing input data are submitted together as a single task, so that
+    they execute on the same worker and each shared input is loaded only
+    once (via ``aospy.data_loader.input_cache``).  The size of these groups
+    is capped so that the Calcs are still spread over all of the client's
+    workers.  Results are returned in the same order as ``calcs``.
+    """
     logging.info('Connected to client: {}'.format(client))
+    n_workers = sum(client.ncores().values())
+    groups = _group_calcs_by_shared_inputs(
+        calcs, _max_group_size(calcs, n_workers))
+
+    def func_group(group):
+        return [func(calc) for calc in group]
+
     with dask.set_options(get=client.get):
-        return db.from_sequence(calcs).map(func).compute()
+        group_results = db.from_sequence(
+            [[calcs[i] for i in group] for group in groups],
+            npartitions=len(groups)).map(func_group).compute()
+    result = [None] * len(calcs)
+    for group, results in zip(groups, group_results):
+        for i, calc_result in zip(group, results):
+            result[i] = calc_result
+    return result
 
 
 def _n_workers_for_local_cluster(calcs):
     """The number of workers used in a LocalCluster
 
-    An upper bound is set at the cpu_count or the number of calcs submitted,
+    An upper bound is set at the cpu_count or the number of groups of calcs
+    sharing input data (of at most an even share of the calcs per cpu),
     depending on which is smaller.  This is to prevent more workers from
     being started than needed (but also to prevent too many workers from
     being started in the case that a large number of calcs are submitted).
     """
-    return min(cpu_count(), len(calcs))
+    n_cpus = cpu_count()
+    return min(n_cpus, len(_group_calcs_by_shared_inputs(
+        calcs, _max_group_size(calcs, n_cpus))))
 
 
 def _exec_calcs(calcs, parallelize=False, client=None, **compute_kwargs):
@@ -295,8 +388,6 @@ def _exec_calcs(calcs, parallelize=False, client=None, **compute_kwargs):
         def func(calc):
             """Wrap _compute_or_skip_on_error to require only the calc
             argument"""
-            if 'write_to_tar' in compute_kwargs:
-                compute_kwargs['write_to_tar'] = False
             return _compute_or_skip_on_error(calc, compute_kwargs)
 
         if client is None:
@@ -306,19 +397,16 @@ def _exec_calcs(calcs, parallelize=False, client=None, **compute_kwargs):
                     result = _submit_calcs_on_client(calcs, client, func)
         else:
             result = _submit_calcs_on_client(calcs, client, func)
-        if compute_kwargs['write_to_tar']:
-            _serial_write_to_tar(calcs)
         return result
     else:
-        return [_compute_or_skip_on_error(calc, compute_kwargs)
-                for calc in calcs]
-
-
-def _serial_write_to_tar(calcs):
-    for calc in calcs:
-        if calc.proj.tar_direc_out:
-            for dtype_out_time in calc.dtype_out_time:
-                calc._write_to_tar(dtype_out_time)
+        # Execute Calcs sharing inputs consecutively so that their shared
+        # inputs are still in the input cache when needed.
+        result = [None] * len(calcs)
+        for group in _group_calcs_by_shared_inputs(calcs):
+            for i in group:
+                result[i] = _compute_or_skip_on_error(calcs[i],
+                                                      compute_kwargs)
+        return result
 
 
 def _print_suite_summary(calc_suite_specs):
@@ -431,7 +519,9 @@ def submit_mult_calcs(calc_suite_specs, exec_options=None):
               calculations to be performed and prompt user to confirm before
               submitting for execution.
         - parallelize : (default False) If True, submit calculations in
-              parallel.
+              parallel.  Calculations that share input data are executed
+              together on the same worker, so that the shared data are only
+              loaded once.
         - client : distributed.Client or None (default None) The
               dask.distributed Client used to schedule computations.  If None
               and parallelize is True, a LocalCluster will be started.
@@ -441,6 +531,24 @@ def submit_mult_calcs(calc_suite_specs, exec_options=None):
               their root directory, which is specified via the `tar_direc_out`
               argument of each Proj object's instantiation.
 
+        - skip_up_to_date : (default False) If True, skip calculations
+              whose outputs already exist on disk and were generated from
+              the same specifications, Var function, and (unchanged) input
+              files.  See :py:meth:`aospy.Calc.is_up_to_date`.
+        - append : (default False) If True, calculations for which
+              up-to-date outputs exist over the same date range except
+              ending in an earlier year only compute the additional years,
+              which are appended to the existing outputs.  See
+              :py:meth:`aospy.Calc.compute`.
+        - years_per_block : (default None) If given, each calculation
+              loads and reduces its input data in blocks of this many years
+              at a time, keeping memory use bounded for long date ranges.
+              See :py:meth:`aospy.Calc.compute`.
+        - compression : (default None) If True or a dict of compression
+              options, save netcdf outputs in the compressed NETCDF4 format,
+              e.g. ``{'complevel': 4, 'least_significant_digit': 3,
+              'chunks': 'ts'}``.  See :py:meth:`aospy.Calc.compute`.
+
     Returns
     -------
     A list of the return values from each :py:meth:`aospy.Calc.compute` call
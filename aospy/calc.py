@@ -1,23 +1,42 @@
 """Functionality for performing user-specified calculations on aospy data."""
 from collections import OrderedDict
+import copy
+import datetime
+import glob
+import hashlib
+import inspect
 import logging
+from distutils.version import LooseVersion
+from multiprocessing.pool import ThreadPool
 import os
 import shutil
-import subprocess
-import tarfile
+import tempfile
 from time import ctime
 
 import numpy as np
+import pandas as pd
 import xarray as xr
 
 from ._constants import GRAV_EARTH
 from . import internal_names
 from . import utils
+from .model import _values_hash
+from .region import RegionSet
+from .results import ResultsStore
 from .var import Var
 
 
 logging.basicConfig(level=logging.INFO)
 
+FINGERPRINT_ATTR = 'aospy_fingerprint'
+# Whether ``Dataset.to_zarr`` can add variables to existing stores.
+_ZARR_APPEND = LooseVersion(xr.__version__) >= LooseVersion('0.12')
+_PRESSURE_VAR_NAMES = ('p', 'dp')
+_MODEL_GRID_VAR_NAMES = (internal_names.LAT_STR, internal_names.LON_STR,
+                         internal_names.TIME_STR, internal_names.PLEVEL_STR,
+                         internal_names.PK_STR, internal_names.BK_STR,
+                         internal_names.SFC_AREA_STR)
+
 
 dp = Var(
     name='dp',
@@ -192,6 +211,8 @@ class Calc(object):
                     internal_names.PFULL_STR, internal_names.PLEVEL_STR]
     _grid_attrs = OrderedDict([(key, internal_names.GRID_ATTRS[key])
                                for key in _grid_coords])
+    # Whether loaded inputs are stored in ``data_loader.input_cache``
+    _use_input_cache = True
 
     def __str__(self):
         """String representation of the object."""
@@ -215,8 +236,13 @@ class Calc(object):
                             self.model.name, self.run.name,
                             ens_label)
 
-    def _file_name(self, dtype_out_time, extension='nc'):
+    def _output_is_zarr(self):
+        return self.proj.output_format == 'zarr'
+
+    def _file_name(self, dtype_out_time, extension=None):
         """Create the name of the aospy file."""
+        if extension is None:
+            extension = 'zarr' if self._output_is_zarr() else 'nc'
         out_lbl = utils.io.data_out_label(self.intvl_out, dtype_out_time,
                                           dtype_vert=self.dtype_out_vert)
         in_lbl = utils.io.data_in_label(self.intvl_in, self.dtype_in_time,
@@ -232,7 +258,8 @@ class Calc(object):
         return os.path.join(self.dir_out, self.file_name[dtype_out_time])
 
     def _path_tar_out(self):
-        return os.path.join(self.dir_tar_out, 'data.tar')
+        return os.path.join(self.dir_tar_out,
+                            self.proj.archive_class.file_name)
 
     @staticmethod
     def _print_verbose(*args):
@@ -248,8 +275,6 @@ class Calc(object):
             'Initializing Calc instance:', self.__str__()
         ))
 
-        self.model.set_grid_data()
-
         if isinstance(calc_interface.ens_mem, int):
             self.data_direc = self.data_direc[calc_interface.ens_mem]
 
@@ -264,22 +289,27 @@ class Calc(object):
 
     def _to_desired_dates(self, arr):
         """Restrict the xarray DataArray or Dataset to the desired months."""
-        times = utils.times.extract_months(
-            arr[internal_names.TIME_STR], self.months
-        )
-        return arr.sel(time=times)
+        inds = utils.times._month_conditional(arr[internal_names.TIME_STR],
+                                              self.months)
+        return arr.isel(**{internal_names.TIME_STR:
+                           np.flatnonzero(inds.values)})
 
     def _add_grid_attributes(self, ds):
         """Add model grid attributes to a dataset"""
         for name_int, names_ext in self._grid_attrs.items():
             ds_coord_name = set(names_ext).intersection(set(ds.coords) |
                                                         set(ds.data_vars))
-            model_attr = getattr(self.model, name_int, None)
-            if ds_coord_name and (model_attr is not None):
+            # The Model's hash is computed once per grid, so that matching
+            # coordinates are found without comparing them to the Model's.
+            model_hash = self.model.grid_hash(name_int)
+            if ds_coord_name and (model_hash is not None):
                 # Force coords to have desired name.
                 ds = ds.rename({list(ds_coord_name)[0]: name_int})
                 ds = ds.set_coords(name_int)
-                if not np.array_equal(ds[name_int], model_attr):
+                if (_values_hash(ds[name_int]) != model_hash and
+                        not np.array_equal(ds[name_int],
+                                           getattr(self.model, name_int))):
+                    model_attr = getattr(self.model, name_int)
                     if np.allclose(ds[name_int], model_attr):
                         msg = ("Values for '{0}' are nearly (but not exactly) "
                                "the same in the Run {1} and the Model {2}.  "
@@ -294,12 +324,11 @@ class Calc(object):
                                "".format(name_int, ds[name_int], model_attr))
                         logging.info(msg)
 
-            else:
-                # Bring in coord from model object if it exists.
-                ds = ds.load()
-                if model_attr is not None:
-                    ds[name_int] = model_attr
-                    ds = ds.set_coords(name_int)
+            elif model_hash is not None:
+                # Bring in coord from model object if it exists.  Only the
+                # coordinate is added, so lazily loaded data remain lazy.
+                ds = ds.assign_coords(
+                    **{name_int: getattr(self.model, name_int)})
             if (self.dtype_in_vert == 'pressure' and
                 internal_names.PLEVEL_STR in ds.coords):
                 self.pressure = ds.level
@@ -337,7 +366,7 @@ class Calc(object):
         except AttributeError:
             self._ps_data = self.data_loader.load_variable(
                 self.ps, start_date, end_date, self.time_offset,
-                **self.data_loader_attrs)
+                use_cache=self._use_input_cache, **self.data_loader_attrs)
             name = self._ps_data.name
             self._ps_data = self._add_grid_attributes(
                 self._ps_data.to_dataset(name=name))
@@ -359,24 +388,21 @@ class Calc(object):
             return var
         # aospy.Var objects remain.
         # Pressure handled specially due to complications from sigma vs. p.
-        elif var.name in ('p', 'dp'):
+        elif var.name in _PRESSURE_VAR_NAMES:
             data = self._get_pressure_vals(var, start_date, end_date)
             if self.dtype_in_vert == internal_names.ETA_STR:
                 return self._to_desired_dates(data)
             return data
         # Get grid, time, etc. arrays directly from model object
-        elif var.name in (internal_names.LAT_STR, internal_names.LON_STR,
-                          internal_names.TIME_STR, internal_names.PLEVEL_STR,
-                          internal_names.PK_STR, internal_names.BK_STR,
-                          internal_names.SFC_AREA_STR):
+        elif var.name in _MODEL_GRID_VAR_NAMES:
             data = getattr(self.model, var.name)
         else:
             cond_pfull = ((not hasattr(self, internal_names.PFULL_STR))
                           and var.def_vert and
                           self.dtype_in_vert == internal_names.ETA_STR)
-            data = self.data_loader.load_variable(var, start_date, end_date,
-                                                  self.time_offset,
-                                                  **self.data_loader_attrs)
+            data = self.data_loader.load_variable(
+                var, start_date, end_date, self.time_offset,
+                use_cache=self._use_input_cache, **self.data_loader_attrs)
             name = data.name
             data = self._add_grid_attributes(data.to_dataset(name=data.name))
             data = data[name]
@@ -437,6 +463,11 @@ class Calc(object):
     def _compute(self, data, monthly_mean=False):
         """Perform the calculation."""
         if monthly_mean:
+            # Averaging over each month drops the time weights, so take them
+            # from the inputs beforehand.
+            dt = next(d[internal_names.TIME_WEIGHTS_STR] for d in data
+                      if internal_names.TIME_WEIGHTS_STR in
+                      getattr(d, 'coords', ()))
             data_monthly = []
             for d in data:
                 try:
@@ -445,30 +476,46 @@ class Calc(object):
                     data_monthly.append(d)
             data = data_monthly
         local_ts = self._local_ts(*data)
-        dt = local_ts[internal_names.TIME_WEIGHTS_STR]
-        if monthly_mean:
-            dt = utils.times.monthly_mean_ts(dt)
+        if not monthly_mean:
+            dt = local_ts[internal_names.TIME_WEIGHTS_STR]
         # Convert dt to units of days to prevent overflow
         dt = dt / np.timedelta64(1, 'D')
+        if monthly_mean:
+            dt = utils.times.monthly_mean_ts(dt)
         return local_ts, dt
 
-    def _compute_full_ts(self, data, monthly_mean=False, zonal_asym=False):
-        """Perform calculation and create yearly timeseries at each point."""
+    def _vert_int_dp(self):
+        """Pressure thicknesses for vertical integrals, or None if unneeded.
+
+        Loads the surface pressure (if needed) as a side effect.
+        """
+        vert_types = ('vert_int', 'vert_av')
+        if self.dtype_out_vert in vert_types and self.var.def_vert:
+            # Here we need file read-in dates (NOT xarray dates)
+            return self._get_pressure_vals(dp, self.start_date,
+                                           self.end_date)
+        return None
+
+    def _compute_full_ts(self, data, monthly_mean=False, zonal_asym=False,
+                         dp_vals=None):
+        """Perform calculation and create yearly timeseries at each point.
+
+        The pressure thicknesses for vertical integrals, ``dp_vals``, are
+        computed (see ``_vert_int_dp``) if not given.
+        """
         # Get results at each desired timestep and spatial point.
         # Here we need to provide file read-in dates (NOT xarray dates)
         full_ts, dt = self._compute(data, monthly_mean=monthly_mean)
         if zonal_asym:
             full_ts = full_ts - full_ts.mean(internal_names.LON_STR)
         # Vertically integrate.
-        vert_types = ('vert_int', 'vert_av')
-        if self.dtype_out_vert in vert_types and self.var.def_vert:
-            # Here we need file read-in dates (NOT xarray dates)
-            full_ts = utils.vertcoord.int_dp_g(
-                full_ts, self._get_pressure_vals(dp, self.start_date,
-                                                 self.end_date)
-            )
+        if dp_vals is None:
+            dp_vals = self._vert_int_dp()
+        if dp_vals is not None:
+            full_ts = utils.vertcoord.int_dp_g(full_ts, dp_vals)
             if self.dtype_out_vert == 'vert_av':
-                full_ts *= (GRAV_EARTH / self._to_desired_dates(self._ps_data))
+                full_ts = full_ts * (GRAV_EARTH /
+                                     self._to_desired_dates(self._ps_data))
         return full_ts, dt
 
     def _full_to_yearly_ts(self, arr, dt):
@@ -504,37 +551,49 @@ class Calc(object):
                 self._get_input_data(Var('p'), self.start_date, self.end_date,
                                      0), self.var.func_input_dtype
             ), arr[internal_names.TIME_WEIGHTS_STR]).rename('pressure')
-        # Loop over the regions, performing the calculation.
-        reg_dat = {}
-        for reg in self.region:
-            # Just pass along the data if averaged already.
-            if 'av' in self.dtype_in_time:
-                data_out = reg.ts(arr)
-            # Otherwise perform the calculation.
-            else:
-                method = getattr(reg, func)
-                data_out = method(arr)
-                if bool_pfull:
-                    # Don't apply e.g. standard deviation to coordinates.
-                    if func not in ['av', 'ts']:
-                        method = reg.ts
-                    # Convert Pa to hPa
-                    coord = method(pfull) * 1e-2
-                    data_out = data_out.assign_coords(
-                        **{reg.name + '_pressure': coord}
-                    )
-            reg_dat.update(**{reg.name: data_out})
-        return xr.Dataset(reg_dat)
+        regions = self._region_set()
+        # Just pass along the data if averaged already.
+        if 'av' in self.dtype_in_time:
+            return regions.ts(arr)
+        # Otherwise perform the calculation for all regions at once.
+        reg_dat = getattr(regions, func)(arr)
+        if bool_pfull:
+            # Don't apply e.g. standard deviation to coordinates.
+            method = func if func in ['av', 'ts'] else 'ts'
+            reg_pfull = getattr(regions, method)(pfull)
+            # Convert Pa to hPa
+            reg_dat = xr.Dataset(
+                {name: data.assign_coords(
+                    **{name + '_pressure': reg_pfull[name] * 1e-2})
+                 for name, data in reg_dat.data_vars.items()})
+        return reg_dat
+
+    def _region_set(self):
+        """RegionSet of this Calc's regions, reused across reductions."""
+        try:
+            return self._regions
+        except AttributeError:
+            self._regions = RegionSet(
+                [reg for reg in self.region if reg is not None])
+            return self._regions
 
     def _apply_all_time_reductions(self, full_ts, monthly_ts, eddy_ts):
-        """Apply all requested time reductions to the data."""
+        """Apply all requested time reductions to the data.
+
+        The time-series shared by the requested outputs (e.g. the regional
+        time-series from which 'reg.ts', 'reg.av', and 'reg.std' are all
+        derived) are each computed only once, as are the yearly statistics
+        from which the gridded 'av' and 'std' outputs are derived.
+        """
         logging.info(self._print_verbose("Applying desired time-"
                                          "reduction methods."))
         # Determine which are regional, eddy, time-mean.
-        reduc_specs = [r.split('.') for r in self.dtype_out_time]
-        reduced = {}
-        for reduc, specs in zip(self.dtype_out_time, reduc_specs):
-            func = specs[-1]
+        ts = {}
+        for reduc in self.dtype_out_time:
+            key = _ts_key(reduc)
+            if key in ts:
+                continue
+            specs = key.split('.')
             if 'eddy' in specs:
                 data = eddy_ts
             elif 'time-mean' in specs:
@@ -542,33 +601,71 @@ class Calc(object):
             else:
                 data = full_ts
             if 'reg' in specs:
-                reduced.update({reduc: self.region_calcs(data, func)})
+                ts[key] = self.region_calcs(data, 'ts')
             else:
-                reduced.update({reduc: self._time_reduce(data, func)})
-        return OrderedDict(sorted(reduced.items(), key=lambda t: t[0]))
+                ts[key] = data
+        moments = {}
+        if self.dtype_in_time != 'av':
+            for reduc in self.dtype_out_time:
+                key = _ts_key(reduc)
+                if (reduc.split('.')[-1] == 'std' and 'reg' not in reduc and
+                        key not in moments):
+                    moments[key] = _YearlyMoments()
+                    moments[key].update(ts[key])
+        return self._reduce_yearly_ts(ts, moments)
+
+    def _monthly_from_full(self):
+        """Whether monthly means can be derived from the full time-series.
+
+        This holds if the Var's function is linear (see ``Var.linear``), as
+        long as the result is not multiplied by (time-varying) pressure
+        thicknesses in a vertical integral or average.
+        """
+        vert_types = ('vert_int', 'vert_av')
+        return self.var.linear and not (self.dtype_out_vert in vert_types and
+                                        self.var.def_vert)
 
     def _make_full_mean_eddy_ts(self, data):
         """Create full, monthly-mean, and eddy timeseries of data."""
         bool_monthly = (['monthly_from' in self.dtype_in_time] +
                         ['time-mean' in dout for dout in self.dtype_out_time])
         bool_eddy = ['eddy' in dout for dout in self.dtype_out_time]
-        if not all(bool_monthly):
-            full, full_dt = self._compute_full_ts(data,
-                                                  monthly_mean=False)
-        else:
-            full = False
-        if any(bool_eddy) or any(bool_monthly):
+        need_full = not all(bool_monthly)
+        need_monthly = any(bool_eddy) or any(bool_monthly)
+        full, monthly, eddy = False, False, False
+        if need_monthly and self._monthly_from_full():
+            # The monthly means of a linear function equal the function of
+            # the monthly-mean inputs, so it need only be computed once.
+            full, full_dt = self._compute_full_ts(data, monthly_mean=False)
+            monthly = utils.times.monthly_mean_ts(full)
+            monthly_dt = utils.times.monthly_mean_ts(full_dt)
+        elif need_full and need_monthly:
+            # Set up the state shared by both time-series (e.g. the surface
+            # pressure) beforehand, so they can be computed concurrently
+            # from the same loaded inputs.
+            dp_vals = self._vert_int_dp()
+            pool = ThreadPool(2)
+            try:
+                full_result, monthly_result = [
+                    pool.apply_async(self._compute_full_ts, (data,),
+                                     {'monthly_mean': monthly_mean,
+                                      'dp_vals': dp_vals})
+                    for monthly_mean in (False, True)]
+                full, full_dt = full_result.get()
+                monthly, monthly_dt = monthly_result.get()
+            finally:
+                pool.close()
+                pool.join()
+        elif need_full:
+            full, full_dt = self._compute_full_ts(data, monthly_mean=False)
+        elif need_monthly:
             monthly, monthly_dt = self._compute_full_ts(data,
                                                         monthly_mean=True)
-        else:
-            monthly = False
         if any(bool_eddy):
-            eddy = full - utils.times.monthly_mean_at_each_ind(monthly, full)
-        else:
-            eddy = False
+            eddy = utils.times.deviation_from_monthly_mean(full, monthly)
 
         # Average within each year.
-        if not all(bool_monthly):
+        if need_full:
             full = self._full_to_yearly_ts(full, full_dt)
         if any(bool_monthly):
             monthly = self._full_to_yearly_ts(monthly, monthly_dt)
@@ -576,87 +673,547 @@ class Calc(object):
             eddy = self._full_to_yearly_ts(eddy, full_dt)
         return full, monthly, eddy
 
-    def compute(self, write_to_tar=True):
-        """Perform all desired calculations on the data and save externally."""
+    def _input_variables(self):
+        """The Vars whose data this Calc loads via its DataLoader."""
+        variables = [var for var in self.variables
+                     if not isinstance(var, (float, int))]
+        input_vars = [var for var in variables
+                      if var.name not in _PRESSURE_VAR_NAMES +
+                      _MODEL_GRID_VAR_NAMES]
+        needs_ps = (any(var.name in _PRESSURE_VAR_NAMES
+                        for var in variables) or
+                    (self.dtype_out_vert in ('vert_int', 'vert_av') and
+                     self.var.def_vert))
+        if needs_ps and self.ps is not None:
+            input_vars.append(self.ps)
+        return input_vars
+
+    def _region_names(self):
+        """Names of the regions over which regional reductions are done."""
+        if self.region is None:
+            return []
+        try:
+            regions = list(self.region)
+        except TypeError:
+            regions = [self.region]
+        return [reg.name for reg in regions if reg is not None]
+
+    def _input_files(self, listing=None, prune=True):
+        """Paths of all input files for this Calc, sorted.
+
+        Parameters
+        ----------
+        listing : dict, optional
+            Output of ``Calc._input_listing`` for a Calc covering at least
+            the same dates, whose catalog entries are used in place of
+            querying the file catalog
+        prune : bool, default True
+            Whether to prune the files using the file catalog
+        """
+        known = listing['entries'] if listing is not None else None
+        globbed = listing['globbed'] if listing is not None else {}
+        paths = set()
+        for var in self._input_variables():
+            file_set = self.data_loader._generate_file_set(
+                var=var, start_date=self.start_date, end_date=self.end_date,
+                **self.data_loader_attrs)
+            if isinstance(file_set, str):
+                if file_set not in globbed:
+                    globbed[file_set] = sorted(glob.glob(file_set))
+                file_set = globbed[file_set]
+            if prune:
+                file_set, _ = self.data_loader._catalog_file_set(
+                    file_set, var, self.start_date, self.end_date,
+                    known=known, time_offset=self.time_offset)
+            paths.update(file_set)
+        return sorted(paths)
+
+    def _input_listing(self):
+        """Catalog entries, sizes, and modification times of input files.
+
+        Gathered once for this Calc so that copies of it over shorter date
+        ranges can be fingerprinted (see ``Calc._find_prior_calc``) without
+        querying the file catalog or the file system again for each one.
+
+        Returns
+        -------
+        dict
+            With keys 'entries' (catalog entries keyed by path, or None if
+            the catalog is not used), 'stats' ((mtime, size) keyed by path
+            of all existing input files), and 'globbed' (the files matching
+            each glob-string file set)
+        """
+        listing = {'globbed': {}, 'entries': None}
+        paths = self._input_files(listing, prune=False)
+        listing['entries'] = self.data_loader._catalog_entries(paths)
+        stats = {}
+        for path in paths:
+            try:
+                stats[path] = (os.path.getmtime(path),
+                               os.path.getsize(path))
+            except (IOError, OSError):
+                pass
+        listing['stats'] = stats
+        return listing
+
+    def fingerprint(self, listing=None):
+        """Hash identifying this Calc's specification and its inputs.
+
+        The hash covers the Calc's specification (project, model, run, Var,
+        regions, dates, and input and output types), the source code of the
+        Var's function and of the DataLoader's preprocessing function, and
+        the paths, sizes, and modification times of the input files.  It is
+        stored in the attributes of the saved output, so that outputs can be
+        recognized as up to date; see ``Calc.is_up_to_date``.
+
+        Parameters
+        ----------
+        listing : dict, optional
+            Output of ``Calc._input_listing`` for a Calc covering at least
+            the same dates, used in place of listing the input files anew
+
+        Returns
+        -------
+        str, or None if any of the input files could not be found
+        """
+        stats = listing['stats'] if listing is not None else {}
+        try:
+            files = []
+            for path in self._input_files(listing):
+                if path in stats:
+                    files.append((path,) + stats[path])
+                else:
+                    files.append((path, os.path.getmtime(path),
+                                  os.path.getsize(path)))
+        except (IOError, OSError):
+            return None
+        regions = sorted(self._region_names())
+        parts = [self.proj.name, self.model.name, self.run.name,
+                 self.var.name, regions, self.intvl_in, self.intvl_out,
+                 self.dtype_in_time, self.dtype_in_vert,
+                 sorted(self.dtype_out_time), self.dtype_out_vert,
+                 self.level, self.start_date, self.end_date,
+                 sorted((self.time_offset or {}).items()),
+                 sorted(self.data_loader_attrs.items(), key=str),
+                 [var.name for var in self._input_variables()],
+                 _func_source(self.function),
+                 _func_source(self.data_loader.preprocess_func),
+                 files]
+        return hashlib.sha1(
+            '\n'.join(repr(part) for part in parts).encode('utf-8')
+        ).hexdigest()
+
+    def is_up_to_date(self, listing=None):
+        """Whether all outputs on disk were generated from the same inputs.
+
+        Returns True only if every output file exists and the fingerprint
+        (see ``Calc.fingerprint``) stored with each of its outputs matches
+        the current one.
+        """
+        if not all(os.path.exists(path) for path in self.path_out.values()):
+            return False
+        fingerprint = self.fingerprint(listing)
+        if fingerprint is None:
+            return False
+        for dtype_out_time in self.dtype_out_time:
+            if 'reg' in dtype_out_time:
+                names = self._region_names()
+            else:
+                names = [self.name]
+            try:
+                with _open_output(self.path_out[dtype_out_time],
+                                  decode_cf=False) as ds:
+                    stored = [ds[name].attrs.get(FINGERPRINT_ATTR)
+                              for name in names]
+            except (IOError, OSError, RuntimeError, EOFError, KeyError,
+                    ValueError):
+                return False
+            if any(value != fingerprint for value in stored):
+                return False
+        return True
+
+    def _with_dates(self, start_date, end_date):
+        """Copy of this Calc for a different date range."""
+        calc = copy.copy(self)
+        for attr in ('_ps_data', 'pfull_coord', 'coords'):
+            calc.__dict__.pop(attr, None)
+        calc.start_date = start_date
+        calc.end_date = end_date
+        calc.file_name = {d: calc._file_name(d) for d in calc.dtype_out_time}
+        calc.path_out = {d: calc._path_out(d) for d in calc.dtype_out_time}
+        calc.data_out = {}
+        return calc
+
+    def _ts_dtypes_out(self):
+        """The time-series outputs from which all outputs can be derived."""
+        return sorted(set(_ts_key(dtype) for dtype in self.dtype_out_time))
+
+    def _is_yearly_reducible(self):
+        """Whether all outputs can be derived from yearly time-series."""
+        if not self.def_time or 'av' in self.dtype_in_time:
+            return False
+        if any('eddy' in dtype or 'time-mean' in dtype
+               for dtype in self.dtype_out_time):
+            return False
+        return not (self.def_vert and self.dtype_out_vert is False and
+                    self.dtype_in_vert == internal_names.ETA_STR)
+
+    def _can_append(self):
+        """Whether the outputs can be extended with additional years."""
+        if (self.start_date.month, self.start_date.day) != (1, 1):
+            return False
+        return (self._is_yearly_reducible() and
+                set(self._ts_dtypes_out()).issubset(self.dtype_out_time))
+
+    def _reduce_yearly_ts(self, ts, moments=None):
+        """Derive all requested outputs from yearly time-series.
+
+        Parameters
+        ----------
+        ts : dict
+            Yearly time-series, keyed by the 'ts' variant of each requested
+            ``dtype_out_time`` (e.g. 'ts', 'reg.ts', or 'eddy.ts').  A
+            gridded time-series may be omitted if its ``moments`` are given
+            and no corresponding 'ts' output was requested.
+        moments : dict, optional
+            Running statistics (``_YearlyMoments``) from which to derive the
+            gridded 'av' and 'std' outputs, keyed like ``ts``
+
+        Returns
+        -------
+        OrderedDict
+            The reduced outputs, keyed by ``dtype_out_time``
+        """
+        moments = moments or {}
+        reduced = {}
+        for dtype in self.dtype_out_time:
+            func = dtype.split('.')[-1]
+            key = _ts_key(dtype)
+            if 'reg' in dtype:
+                reduced[dtype] = xr.Dataset(
+                    {name: self._region_time_reduce(arr, func)
+                     for name, arr in ts[key].data_vars.items()})
+            elif key in moments and func in ('av', 'std'):
+                reduced[dtype] = getattr(moments[key], func)()
+            else:
+                reduced[dtype] = self._time_reduce(ts[key], func)
+        return OrderedDict(sorted(reduced.items(), key=lambda t: t[0]))
+
+    def _region_time_reduce(self, arr, reduction):
+        """Time reduction of a region-average time-series.
+
+        Pressure coordinates (see ``Calc.region_calcs``) are averaged over
+        the years rather than dropped.
+        """
+        reduced = self._time_reduce(arr, reduction)
+        pressure = [name for name in arr.coords
+                    if name.endswith('_pressure') and
+                    name not in reduced.coords]
+        return reduced.assign_coords(
+            **{name: arr[name].mean(internal_names.YEAR_STR)
+               for name in pressure})
+
+    def _year_blocks(self, years_per_block):
+        """Split the date range into blocks of whole calendar years."""
+        blocks = []
+        start_date = self.start_date
+        while start_date <= self.end_date:
+            end_date = min(datetime.datetime(
+                start_date.year + years_per_block - 1, 12, 31),
+                self.end_date)
+            blocks.append((start_date, end_date))
+            start_date = datetime.datetime(end_date.year + 1, 1, 1)
+        return blocks
+
+    def _compute_streamed(self, years_per_block):
+        """Compute by streaming through blocks of years.
+
+        The input data are loaded and reduced to yearly time-series one
+        block of ``years_per_block`` years at a time.  Gridded 'av' and
+        'std' outputs are accumulated from each block using running
+        (Welford-style) statistics, so that unless a gridded 'ts' output is
+        requested, memory use is bounded by the size of a single block.
+
+        Returns
+        -------
+        OrderedDict, or None
+            The reduced outputs, keyed by ``dtype_out_time``, or None if the
+            requested outputs cannot be computed in this way
+        """
+        if not self._is_yearly_reducible():
+            return None
+        ts_dtypes = self._ts_dtypes_out()
+        keep_gridded_ts = 'ts' in self.dtype_out_time
+        moments = _YearlyMoments() if 'ts' in ts_dtypes else None
+        pieces = {dtype: [] for dtype in ts_dtypes}
+        start_years = []
+        first = {}
+        for start_date, end_date in self._year_blocks(years_per_block):
+            block = self._with_dates(start_date, end_date)
+            block.dtype_out_time = tuple(ts_dtypes)
+            # Caching the blocks would defeat the bound on memory use.
+            block._use_input_cache = False
+            block_ts = block._compute_reduced()
+            start_years.append(start_date.year)
+            for dtype in ts_dtypes:
+                data = block_ts[dtype]
+                if dtype in first:
+                    data = _shift_yearly_ts(data, start_date.year,
+                                            *first[dtype])
+                else:
+                    first[dtype] = (data, start_date.year)
+                if dtype == 'ts':
+                    moments.update(_drop_date_coords(data))
+                    if not keep_gridded_ts:
+                        pieces[dtype] = [data]
+                        continue
+                pieces[dtype].append(data)
+        ts = {dtype: _concat_yearly_ts(pieces[dtype], start_years)
+              for dtype in ts_dtypes if len(pieces[dtype]) ==
+              len(start_years)}
+        if moments is not None:
+            date_coords = _date_coords(first['ts'][0], pieces['ts'][-1])
+            moments.mean = moments.mean.assign_coords(**date_coords)
+            moments.m2 = moments.m2.assign_coords(**date_coords)
+        return self._reduce_yearly_ts(
+            ts, None if moments is None else {'ts': moments})
+
+    def _find_prior_calc(self):
+        """Find up-to-date outputs of this Calc ending in an earlier year.
+
+        Returns
+        -------
+        Calc, or None
+            A copy of this Calc ending on December 31st of the latest year
+            for which all outputs exist on disk and are up to date.
+        """
+        listing = None
+        for year in range(self.end_date.year - 1,
+                          self.start_date.year - 1, -1):
+            prior = self._with_dates(self.start_date,
+                                     datetime.datetime(year, 12, 31))
+            if not all(os.path.exists(path)
+                       for path in prior.path_out.values()):
+                continue
+            if listing is None:
+                listing = self._input_listing()
+            if prior.is_up_to_date(listing):
+                return prior
+        return None
+
+    def _load_prior_ts(self, prior, dtype_out_time):
+        """Load a time-series output of a prior Calc from disk."""
+        with _open_output(prior.path_out[dtype_out_time]) as ds:
+            if 'reg' in dtype_out_time:
+                data = ds[self._region_names()]
+            else:
+                data = ds[self.name]
+            return data.load()
+
+    def _compute_appended(self, years_per_block=None):
+        """Compute by appending new years to up-to-date prior outputs.
+
+        Only the years not covered by the prior outputs are loaded and
+        computed (streaming through blocks of ``years_per_block`` years, if
+        given); the 'ts' outputs of the prior and new years are then
+        concatenated, and all other outputs are derived from them.
+
+        Returns
+        -------
+        OrderedDict, or None
+            The reduced outputs, keyed by ``dtype_out_time``, or None if no
+            suitable prior outputs exist
+        """
+        if not self._can_append():
+            return None
+        prior = self._find_prior_calc()
+        if prior is None:
+            return None
+        start_date = datetime.datetime(prior.end_date.year + 1, 1, 1)
+        logging.info('Appending {0} -- {1} to existing outputs for '
+                     '{2} -- {3}.'.format(start_date, self.end_date,
+                                          prior.start_date, prior.end_date))
+        new = self._with_dates(start_date, self.end_date)
+        new.dtype_out_time = tuple(self._ts_dtypes_out())
+        new_reduced = None
+        if years_per_block:
+            new_reduced = new._compute_streamed(years_per_block)
+        if new_reduced is None:
+            new_reduced = new._compute_reduced()
+        ts = {dtype: _concat_yearly_ts(
+            [self._load_prior_ts(prior, dtype), new_reduced[dtype]],
+            [prior.start_date.year, new.start_date.year])
+              for dtype in new.dtype_out_time}
+        return self._reduce_yearly_ts(ts)
+
+    def _compute_reduced(self):
+        """Load the input data and apply all requested reductions."""
         data = self._prep_data(self._get_all_data(self.start_date,
                                                   self.end_date),
                                self.var.func_input_dtype)
         logging.info('Computing timeseries for {0} -- '
                      '{1}.'.format(self.start_date, self.end_date))
         full, monthly, eddy = self._make_full_mean_eddy_ts(data)
-        reduced = self._apply_all_time_reductions(full, monthly, eddy)
+        return self._apply_all_time_reductions(full, monthly, eddy)
+
+    def compute(self, write_to_tar=True, skip_up_to_date=False,
+                append=False, years_per_block=None, compression=None):
+        """Perform all desired calculations on the data and save externally.
+
+        Parameters
+        ----------
+        write_to_tar : bool (default True)
+            Whether to also add the outputs to the Calc's tar file
+        skip_up_to_date : bool (default False)
+            If True, do nothing if the outputs on disk are up to date (see
+            ``Calc.is_up_to_date``); they can still be retrieved via
+            ``Calc.load``.
+        append : bool (default False)
+            If True and up-to-date outputs of this same Calc exist on disk
+            for a date range with the same start date but ending in an
+            earlier year, only compute the additional years and append
+            them to the existing outputs.  This requires that the 'ts' (and,
+            for regional outputs, 'reg.ts') outputs were saved, and that the
+            date range starts on January 1st.  Otherwise the full date
+            range is computed.
+        years_per_block : int, optional
+            If given, load and reduce the data in blocks of this many
+            calendar years at a time, accumulating the time-mean and
+            standard deviation with running statistics, so that memory use
+            does not grow with the length of the date range.  Outputs
+            requiring the full time-series at once (e.g. 'eddy' outputs)
+            are always computed over the full date range.
+        compression : {None, True, dict}, optional
+            If given, save netcdf outputs in the NETCDF4 format, compressing
+            each data variable with zlib (rather than uncompressed in the
+            NETCDF3_64BIT format; regional outputs always use the NETCDF4
+            format, see ``Calc._save_files``).  If a dict, it can contain
+            the following options:
+
+            - complevel : (default 4) zlib compression level, from 1 to 9
+            - shuffle : (default True) whether to apply the HDF5 shuffle
+              filter before compressing
+            - least_significant_digit : (default None) if given, quantize
+              floating-point data to this many decimal digits (lossy) to
+              improve compression
+            - chunks : (default None) the chunking preset; one of 'ts'
+              (time-series friendly: full time axis, small horizontal
+              chunks), 'map' (map friendly: one time step and level of the
+              full horizontal domain per chunk), or None (the netCDF
+              library's default chunking)
+        """
+        if skip_up_to_date and self.is_up_to_date():
+            logging.info('Skipping up-to-date calculation: '
+                         '{}'.format(self))
+            return self
+        fingerprint = self.fingerprint()
+        reduced = None
+        if append:
+            reduced = self._compute_appended(years_per_block)
+        if reduced is None and years_per_block:
+            reduced = self._compute_streamed(years_per_block)
+        if reduced is None:
+            reduced = self._compute_reduced()
         logging.info("Writing desired gridded outputs to disk.")
         for dtype_time, data in reduced.items():
             data = _add_metadata_as_attrs(data, self.var.units,
                                           self.var.description,
                                           self.dtype_out_vert)
+            if fingerprint is not None:
+                data = _add_fingerprint_as_attrs(data, fingerprint)
             self.save(data, dtype_time, dtype_out_vert=self.dtype_out_vert,
-                      save_files=True, write_to_tar=write_to_tar)
+                      save_files=True, write_to_tar=write_to_tar,
+                      compression=compression)
         return self
 
-    def _save_files(self, data, dtype_out_time):
-        """Save the data to netcdf files in direc_out."""
+    def _save_files(self, data, dtype_out_time, compression=None):
+        """Save the data to netcdf files (or Zarr stores) in direc_out.
+
+        The regional outputs of all regions are stored in one file, into
+        which the data of each region is written in place.  This holds a
+        lock on the file, so that Calcs executing in parallel can write the
+        outputs of different regions to the same file.  So that regions can
+        be added without moving the data already in it, the file uses the
+        NETCDF4 format even if the outputs are not compressed (other netcdf
+        outputs use the NETCDF3_64BIT format in that case).
+        """
         path = self.path_out[dtype_out_time]
         if not os.path.isdir(self.dir_out):
             os.makedirs(self.dir_out)
-        if 'reg' in dtype_out_time:
-            try:
-                reg_data = xr.open_dataset(path)
-            except (EOFError, RuntimeError, IOError):
-                reg_data = xr.Dataset()
-            reg_data.update(data)
-            data_out = reg_data
-        else:
-            data_out = data
-        if isinstance(data_out, xr.DataArray):
-            data_out = xr.Dataset({self.name: data_out})
-        data_out.to_netcdf(path, engine='netcdf4', format='NETCDF3_64BIT')
+        if isinstance(data, xr.DataArray):
+            data = xr.Dataset({self.name: data})
+        if 'reg' not in dtype_out_time:
+            if self._output_is_zarr():
+                return self._save_zarr(data, path)
+            return _save_netcdf(data, path, compression=compression)
+        with utils.io.file_lock(path):
+            if self._output_is_zarr():
+                self._save_zarr(data, path, append=True)
+            else:
+                _save_netcdf(data, path, compression=compression,
+                             append=True)
+
+    def _save_zarr(self, data, path, append=False):
+        """Save the data to a Zarr store.
+
+        The store is chunked and compressed according to the
+        ``output_chunks`` and ``output_compressor`` attributes of the Proj.
+        If ``append`` is True and the store already exists, the data
+        variables are added to it, replacing any of the same name.  With
+        xarray >= 0.12 this is done in place; with older versions, which
+        can only write whole stores, the store is rewritten.
+        """
+        existing = set()
+        if append and os.path.isdir(path):
+            with xr.open_zarr(path) as stored:
+                existing = set(stored.variables)
+                if not _ZARR_APPEND:
+                    data = xr.merge([stored.drop([
+                        name for name in data.data_vars if name in stored
+                    ]), data]).load()
+                    existing = set()
+        chunks = {dim: size for dim, size in
+                  (self.proj.output_chunks or {}).items() if dim in data.dims}
+        if chunks:
+            data = data.chunk(chunks)
+        encoding = {}
+        if self.proj.output_compressor is not None:
+            # The encoding of variables already in the store is kept.
+            encoding = {name: {'compressor': self.proj.output_compressor}
+                        for name in data.data_vars if name not in existing}
+        data.to_zarr(path, mode='a' if existing else 'w', encoding=encoding)
+
+    def _archive(self):
+        """The archive in tar_direc_out to which outputs are added."""
+        return self.proj.archive_class(self.path_tar_out)
 
     def _write_to_tar(self, dtype_out_time):
-        """Add the data to the tar file in tar_out_direc."""
-        # When submitted in parallel and the directory does not exist yet
-        # multiple processes may try to create a new directory; this leads
-        # to an OSError for all processes that tried to make the
-        # directory, but were later than the first.
-        try:
-            os.makedirs(self.dir_tar_out)
-        except OSError:
-            pass
-        # tarfile 'append' mode won't overwrite the old file, which we want.
-        # So open in 'read' mode, extract the file, and then delete it.
-        # But 'read' mode throws OSError if file doesn't exist: make it first.
+        """Add the data to the archive (by default a tar file) in
+        tar_out_direc, replacing any previous version.
+
+        This is safe to call from calculations executing in parallel.
+        """
         utils.io.dmget([self.path_tar_out])
-        with tarfile.open(self.path_tar_out, 'a') as tar:
-            pass
-        with tarfile.open(self.path_tar_out, 'r') as tar:
-            old_data_path = os.path.join(self.dir_tar_out,
-                                         self.file_name[dtype_out_time])
-            try:
-                tar.extract(self.file_name[dtype_out_time],
-                            path=old_data_path)
-            except KeyError:
-                pass
-            else:
-                # The os module treats files on archive as non-empty
-                # directories, so can't use os.remove or os.rmdir.
-                shutil.rmtree(old_data_path)
-                retcode = subprocess.call([
-                    "tar", "--delete", "--file={}".format(self.path_tar_out),
-                    self.file_name[dtype_out_time]
-                ])
-                if retcode:
-                    msg = ("The 'tar' command to save your aospy output "
-                           "exited with an error.  Most likely, this is due "
-                           "to using an old version of 'tar' (especially if "
-                           "you are on a Mac).  Consider installing a newer "
-                           "version of 'tar' or disabling tar output by "
-                           "setting `write_to_tar=False` in the "
-                           "`calc_exec_options` argument of "
-                           "`submit_mult_calcs`.")
-                    logging.warn(msg)
-        with tarfile.open(self.path_tar_out, 'a') as tar:
-            tar.add(self.path_out[dtype_out_time],
-                    arcname=self.file_name[dtype_out_time])
+        self._archive().add(self.path_out[dtype_out_time],
+                            self.file_name[dtype_out_time])
+
+    def _add_to_results_store(self, data, dtype_out_time):
+        """Add the data to the results store of the run."""
+        store = ResultsStore.for_run(self.proj, self.model, self.run)
+        entry = dict(var=self.name, model=self.model.name,
+                     run=self.run.name, ens_mem=self.ens_mem,
+                     intvl_in=self.intvl_in, intvl_out=self.intvl_out,
+                     dtype_in_time=self.dtype_in_time,
+                     dtype_in_vert=self.dtype_in_vert,
+                     dtype_out_time=dtype_out_time,
+                     dtype_out_vert=self.dtype_out_vert,
+                     start_year=self.start_date.year,
+                     end_year=self.end_date.year)
+        if 'reg' in dtype_out_time:
+            for name, arr in data.data_vars.items():
+                store.add(arr, region=name, **entry)
+        else:
+            store.add(data, region=None, **entry)
 
     def _update_data_out(self, data, dtype):
         """Append the data of the given dtype_out to the data_out attr."""
@@ -666,19 +1223,30 @@ class Calc(object):
             self.data_out = {dtype: data}
 
     def save(self, data, dtype_out_time, dtype_out_vert=False,
-             save_files=True, write_to_tar=False):
-        """Save aospy data to data_out attr and to an external file."""
+             save_files=True, write_to_tar=False, compression=None):
+        """Save aospy data to data_out attr and to an external file.
+
+        See ``Calc.compute`` for the ``compression`` options of netcdf
+        outputs.
+        """
         self._update_data_out(data, dtype_out_time)
         if save_files:
-            self._save_files(data, dtype_out_time)
-        if write_to_tar and self.proj.tar_direc_out:
+            self._save_files(data, dtype_out_time, compression=compression)
+            if self.proj.results_store:
+                self._add_to_results_store(data, dtype_out_time)
+        if write_to_tar and self.proj.tar_direc_out and self._output_is_zarr():
+            logging.warning('Zarr outputs are not added to tar archives; '
+                            'skipping archiving of {}'.format(
+                                self.path_out[dtype_out_time]))
+        elif write_to_tar and self.proj.tar_direc_out:
             self._write_to_tar(dtype_out_time)
         logging.info('\t{}'.format(self.path_out[dtype_out_time]))
 
     def _load_from_disk(self, dtype_out_time, dtype_out_vert=False,
                         region=False):
-        """Load aospy data saved as netcdf files on the file system."""
-        ds = xr.open_dataset(self.path_out[dtype_out_time])
+        """Load aospy data saved as netcdf files (or Zarr stores) on the
+        file system."""
+        ds = _open_output(self.path_out[dtype_out_time])
         if region:
             arr = ds[region.name]
             # Use region-specific pressure values if available.
@@ -700,14 +1268,22 @@ class Calc(object):
         return ds[self.name]
 
     def _load_from_tar(self, dtype_out_time, dtype_out_vert=False):
-        """Load data save in tarball form on the file system."""
-        path = os.path.join(self.dir_tar_out, 'data.tar')
-        utils.io.dmget([path])
-        with tarfile.open(path, 'r') as data_tar:
-            ds = xr.open_dataset(
-                data_tar.extractfile(self.file_name[dtype_out_time])
-            )
-            return ds[self.name]
+        """Load data save in tarball form on the file system.
+
+        The member is copied to a temporary file before opening it, since
+        only files in the NETCDF3 formats can be read from memory, whereas
+        compressed and regional outputs use the NETCDF4 format.
+        """
+        utils.io.dmget([self.path_tar_out])
+        member = self._archive().open(self.file_name[dtype_out_time])
+        fd, tmp_path = tempfile.mkstemp(suffix='.nc')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(member, f)
+            with xr.open_dataset(tmp_path) as ds:
+                return ds[self.name].load()
+        finally:
+            os.remove(tmp_path)
 
     def _get_data_subset(self, data, region=False, time=False,
                          vert=False, lat=False, lon=False):
@@ -769,6 +1345,309 @@ class Calc(object):
             data = self.var.to_plot_units(data, dtype_vert=dtype_out_vert)
         return data
 
+
+def _year(date):
+    """Year of a scalar np.datetime64 or cftime date DataArray."""
+    return int(utils.times._datetime_field(date.values, 'year'))
+
+
+def _shift_years(date, years):
+    """Shift a np.datetime64 by a whole number of years."""
+    date = pd.Timestamp(date)
+    return np.datetime64(date.replace(year=date.year + years))
+
+
+_START_DATE_COORDS = (internal_names.RAW_START_DATE_STR,
+                      internal_names.SUBSET_START_DATE_STR)
+_END_DATE_COORDS = (internal_names.RAW_END_DATE_STR,
+                    internal_names.SUBSET_END_DATE_STR)
+
+
+def _drop_date_coords(data):
+    """Drop the scalar start and end date coordinates."""
+    return data.drop([name for name in _START_DATE_COORDS + _END_DATE_COORDS
+                      if name in data.coords])
+
+
+def _date_coords(first, last):
+    """Start date coordinates of ``first`` and end dates of ``last``."""
+    coords = {name: first[name].values for name in _START_DATE_COORDS
+              if name in first.coords}
+    coords.update({name: last[name].values for name in _END_DATE_COORDS
+                   if name in last.coords})
+    return coords
+
+
+def _shift_yearly_ts(data, start_year, ref, ref_start_year):
+    """Shift years of a yearly time-series to be consistent with another.
+
+    Out-of-range years are shifted upon loading to start in 1678 if they
+    cannot be decoded as cftime dates (see
+    ``utils.times.numpy_datetime_workaround_encode_cf``), so yearly
+    time-series computed over different date ranges can have inconsistent
+    years.  This shifts the years and date coordinates of ``data`` to match
+    those of ``ref``.
+
+    Parameters
+    ----------
+    data, ref : xarray.DataArray or xarray.Dataset
+        Yearly time-series to shift, and the reference time-series
+    start_year, ref_start_year : int
+        The true (i.e. unshifted) start years of the date ranges of ``data``
+        and ``ref``, respectively
+
+    Returns
+    -------
+    xarray.DataArray or xarray.Dataset
+    """
+    start_str = internal_names.SUBSET_START_DATE_STR
+    if start_str not in data.coords or start_str not in ref.coords:
+        return data
+    shift = ((_year(ref[start_str]) - ref_start_year) -
+             (_year(data[start_str]) - start_year))
+    if not shift:
+        return data
+    year_str = internal_names.YEAR_STR
+    coords = {year_str: data[year_str].values + shift}
+    for name in _START_DATE_COORDS + _END_DATE_COORDS:
+        if name in data.coords:
+            coords[name] = _shift_years(data[name].values, shift)
+    return data.assign_coords(**coords)
+
+
+def _concat_yearly_ts(pieces, start_years):
+    """Concatenate yearly time-series computed over consecutive periods.
+
+    Parameters
+    ----------
+    pieces : list of xarray.DataArray or xarray.Dataset
+        Yearly time-series of consecutive periods, in order
+    start_years : list of int
+        The true (i.e. unshifted) start year of each period
+
+    Returns
+    -------
+    xarray.DataArray or xarray.Dataset
+        The concatenated time-series, with years and date coordinates
+        consistent with those of the first period
+    """
+    pieces = [pieces[0]] + [
+        _shift_yearly_ts(piece, start_year, pieces[0], start_years[0])
+        for piece, start_year in zip(pieces[1:], start_years[1:])]
+    date_coords = _date_coords(pieces[0], pieces[-1])
+    if len(pieces) == 1:
+        return pieces[0]
+    return xr.concat([_drop_date_coords(piece) for piece in pieces],
+                     dim=internal_names.YEAR_STR).assign_coords(
+                         **date_coords)
+
+
+def _ts_key(dtype_out_time):
+    """The time-series output from which the given output is derived."""
+    return '.'.join(dtype_out_time.split('.')[:-1] + ['ts'])
+
+
+class _YearlyMoments(object):
+    """Running count, mean, and sum of squared deviations over years.
+
+    Blocks of yearly values are combined using the parallel variant of
+    Welford's algorithm, ignoring NaNs in the same way as the ``mean`` and
+    ``std`` methods of xarray objects.
+    """
+    def __init__(self):
+        self.count = None
+        self.mean = None
+        self.m2 = None
+
+    def update(self, arr):
+        """Add a block of yearly values to the running statistics."""
+        year_str = internal_names.YEAR_STR
+        count = arr.count(year_str)
+        mean = arr.mean(year_str)
+        m2 = ((arr - mean) ** 2).sum(year_str)
+        if self.count is None:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return
+        total = self.count + count
+        total_valid = total.where(total > 0)
+        prior_mean = self.mean.fillna(0.)
+        delta = mean.fillna(0.) - prior_mean
+        self.mean = prior_mean + delta * count / total_valid
+        self.m2 = self.m2 + m2 + (
+            delta ** 2 * self.count * count / total_valid).fillna(0.)
+        self.count = total
+
+    def av(self):
+        """Mean over all years."""
+        return self.mean
+
+    def std(self):
+        """Population standard deviation over all years."""
+        return np.sqrt(self.m2 / self.count.where(self.count > 0))
+
+
+def _func_source(func):
+    """Source code of a function, or its bytecode if unavailable."""
+    try:
+        return inspect.getsource(func)
+    except (IOError, OSError, TypeError):
+        code = getattr(func, '__code__', None)
+        if code is None:
+            return repr(func)
+        return repr((code.co_code, code.co_consts))
+
+
+_TIME_DIMS = (internal_names.TIME_STR, internal_names.YEAR_STR)
+_VERT_DIMS = (internal_names.PFULL_STR, internal_names.PHALF_STR,
+              internal_names.PLEVEL_STR)
+_TS_CHUNK_SIZE = 32
+
+
+def _chunk_sizes(var, preset):
+    """Chunk sizes of a variable according to a chunking preset.
+
+    The 'ts' preset keeps the full time axis in each chunk, and splits the
+    other dimensions into chunks of at most 32 points (one point along
+    vertical dimensions); the 'map' preset keeps the full horizontal domain
+    in each chunk, with one point along time and vertical dimensions.
+    """
+    sizes = []
+    for dim, size in zip(var.dims, var.shape):
+        if dim in _VERT_DIMS:
+            sizes.append(1)
+        elif dim in _TIME_DIMS:
+            sizes.append(size if preset == 'ts' else 1)
+        else:
+            sizes.append(min(size, _TS_CHUNK_SIZE) if preset == 'ts'
+                         else size)
+    return tuple(max(size, 1) for size in sizes)
+
+
+def _netcdf4_encoding(data, complevel=4, shuffle=True,
+                      least_significant_digit=None, chunks=None):
+    """Per-variable encoding compressing the data variables of a Dataset.
+
+    See ``Calc.compute`` for a description of the arguments.
+
+    Returns
+    -------
+    dict
+        Encoding to pass to ``Dataset.to_netcdf`` for the NETCDF4 format
+    """
+    if chunks not in (None, 'ts', 'map'):
+        raise ValueError("chunks must be one of None, 'ts', or 'map'; got "
+                         "'{}'".format(chunks))
+    encoding = {}
+    for name, var in data.data_vars.items():
+        # HDF5 filters cannot be applied to scalar variables.
+        if not var.ndim:
+            continue
+        enc = {'zlib': True, 'complevel': complevel, 'shuffle': shuffle}
+        if (least_significant_digit is not None and
+                np.issubdtype(var.dtype, np.floating)):
+            enc['least_significant_digit'] = least_significant_digit
+        if chunks is not None:
+            enc['chunksizes'] = _chunk_sizes(var, chunks)
+        encoding[name] = enc
+    return encoding
+
+
+def _appendable(path, data):
+    """Whether a Dataset can be written into a netcdf file in place.
+
+    Returns
+    -------
+    bool, or None
+        None if the file cannot be read; otherwise whether the dimensions
+        of the Dataset's variables match those of the file's variables (and
+        dimensions) of the same names.
+    """
+    try:
+        with xr.open_dataset(path, decode_cf=False) as stored:
+            for dim, size in data.dims.items():
+                if stored.dims.get(dim, size) != size:
+                    return False
+            for name, var in data.variables.items():
+                if (name in stored.variables and
+                        stored.variables[name].dims != var.dims):
+                    return False
+    except (EOFError, RuntimeError, IOError, OSError):
+        return None
+    return True
+
+
+def _save_netcdf(data, path, compression=None, append=False):
+    """Save a Dataset to a netcdf file.
+
+    If ``append`` is True and the file exists, the variables of the Dataset
+    are written into it in place, adding new variables and overwriting
+    existing ones of the same names, so that the cost does not depend on
+    the other variables in the file.  A file into which this is not
+    possible (e.g. because its variables of the same names have different
+    dimensions) is rewritten with the union of its variables and those of
+    the Dataset.  Files written with ``append`` use the NETCDF4 format, to
+    which variables can be added without moving the existing ones.
+
+    See ``Calc.compute`` for the ``compression`` options.
+    """
+    if compression is True:
+        compression = {}
+    if compression is None and not append:
+        file_format = 'NETCDF3_64BIT'
+    else:
+        file_format = 'NETCDF4'
+
+    def encoding(data):
+        if compression is None:
+            return None
+        return _netcdf4_encoding(data, **compression)
+
+    if append and os.path.isfile(path):
+        appendable = _appendable(path, data)
+        if appendable:
+            data.to_netcdf(path, mode='a', engine='netcdf4',
+                           encoding=encoding(data))
+            return
+        if appendable is not None:
+            with xr.open_dataset(path) as stored:
+                stored = stored.load()
+            stored.update(data)
+            tmp_path = path + '.tmp'
+            stored.to_netcdf(tmp_path, engine='netcdf4', format=file_format,
+                             encoding=encoding(stored))
+            utils.io.replace_file(tmp_path, path)
+            return
+    data.to_netcdf(path, engine='netcdf4', format=file_format,
+                   encoding=encoding(data))
+
+
+def _open_output(path, **kwargs):
+    """Open an output file of a Calc, which is a Zarr store if a directory.
+
+    Keyword arguments are passed to ``xr.open_dataset`` or ``xr.open_zarr``.
+
+    Raises
+    ------
+    IOError
+        If there is no output at the given path
+    """
+    if os.path.isdir(path):
+        return xr.open_zarr(path, auto_chunk=False, **kwargs)
+    if not os.path.exists(path):
+        raise IOError('No such output: {}'.format(path))
+    return xr.open_dataset(path, **kwargs)
+
+
+def _add_fingerprint_as_attrs(data, fingerprint):
+    """Add Calc fingerprint attribute to Dataset or DataArray"""
+    if isinstance(data, xr.DataArray):
+        data.attrs[FINGERPRINT_ATTR] = fingerprint
+    else:
+        for name, arr in data.data_vars.items():
+            arr.attrs[FINGERPRINT_ATTR] = fingerprint
+    return data
+
+
 def _add_metadata_as_attrs(data, units, description, dtype_out_vert):
     """Add metadata attributes to Dataset or DataArray"""
     if isinstance(data, xr.DataArray):
@@ -0,0 +1,312 @@
+"""Persistent catalog of the contents of input data files.
+
+Opening a netCDF file just to learn which variables it holds or which dates
+it spans is slow on shared filesystems, and aospy would otherwise repeat this
+every time data are loaded.  The :py:class:`FileCatalog` records, for each
+file, its variables, dimensions, time extent, calendar, and modification
+time in a SQLite database, so that DataLoaders can decide which files to open
+without reading any headers.  Entries are re-scanned automatically whenever a
+file's modification time or size changes.
+
+The catalog is populated lazily as files are loaded, but can also be built
+ahead of time (in parallel) from the command line::
+
+    python -m aospy.catalog /path/to/data/*.nc --processes 8
+
+"""
+from __future__ import print_function
+import argparse
+import glob
+import json
+from multiprocessing import Pool, cpu_count
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from .__config__ import cache_path
+from .internal_names import GRID_ATTRS, TIME_STR, TIME_BOUNDS_STR
+
+
+_COLUMNS = ('path', 'mtime', 'size', 'variables', 'dims', 'units',
+            'calendar', 'time_start', 'time_end', 'extent_start',
+            'extent_end', 'bounded')
+_JSON_COLUMNS = ('variables', 'dims', 'time_start', 'time_end',
+                 'extent_start', 'extent_end')
+# SQLite limits the number of parameters in a single statement.
+_MAX_QUERY_PARAMS = 500
+
+
+def _date_to_tuple(date):
+    """Convert a datetime-like object to a comparable tuple of its fields."""
+    if isinstance(date, np.datetime64):
+        date = pd.Timestamp(date)
+    return (date.year, date.month, date.day, date.hour, date.minute,
+            date.second)
+
+
+def _decode_dates(values, attrs):
+    """Decode raw time values into tuples of their date fields."""
+    decoded = xr.decode_cf(xr.Dataset(
+        {TIME_STR: ((TIME_STR + '_endpoints',), values, attrs)}))
+    return [_date_to_tuple(date) for date in decoded[TIME_STR].values]
+
+
+def scan_file(path):
+    """Read the metadata of a single file needed for the catalog.
+
+    Only the header and the time (and time bounds) arrays are read.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+
+    Returns
+    -------
+    dict
+        Catalog entry for the file, or None if the file cannot be opened.
+        The time-related fields are None if the file has no time axis or it
+        cannot be decoded (e.g. because it lacks CF-compliant units).
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+        ds = xr.open_dataset(path, decode_times=False, decode_coords=False)
+    except Exception:
+        logging.debug('Could not scan {} for the catalog'.format(path))
+        return None
+    entry = dict(path=path, mtime=stat.st_mtime, size=stat.st_size,
+                 variables=sorted(ds.variables), dims=dict(ds.dims),
+                 units=None, calendar=None, time_start=None, time_end=None,
+                 extent_start=None, extent_end=None, bounded=False)
+    with ds:
+        time_name = set(GRID_ATTRS[TIME_STR]).intersection(ds.variables)
+        if not time_name:
+            return entry
+        time = ds[time_name.pop()]
+        attrs = {key: time.attrs[key] for key in ('units', 'calendar')
+                 if key in time.attrs}
+        entry['units'] = attrs.get('units')
+        entry['calendar'] = attrs.get('calendar', 'standard')
+        bounds_name = set(GRID_ATTRS[TIME_BOUNDS_STR]).intersection(
+            ds.variables)
+        try:
+            values = np.atleast_1d(time.values)
+            times = _decode_dates([values.min(), values.max()], attrs)
+            entry['time_start'], entry['time_end'] = times
+            if bounds_name:
+                bounds = ds[bounds_name.pop()].values
+                extent = _decode_dates([bounds.min(), bounds.max()], attrs)
+                entry['bounded'] = True
+            else:
+                extent = times
+            entry['extent_start'], entry['extent_end'] = extent
+        except Exception:
+            logging.debug('Could not decode the time axis of '
+                          '{}'.format(path))
+    return entry
+
+
+class FileCatalog(object):
+    """SQLite-backed catalog of the contents of input data files.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path to the SQLite database.  Defaults to ``catalog.sqlite`` within
+        ``aospy.__config__.cache_path`` (which can be set via the
+        ``AOSPY_CACHE_DIR`` environment variable).
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(cache_path, 'catalog.sqlite')
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def __str__(self):
+        return 'FileCatalog "' + self.path + '"'
+
+    __repr__ = __str__
+
+    def _connect(self):
+        if not self._initialized:
+            direc = os.path.dirname(self.path)
+            if direc and not os.path.isdir(direc):
+                try:
+                    os.makedirs(direc)
+                except OSError:
+                    pass
+        conn = sqlite3.connect(self.path, timeout=60)
+        if not self._initialized:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS files ({0}, PRIMARY KEY (path))'
+                ''.format(', '.join(_COLUMNS)))
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _row_to_entry(row):
+        entry = dict(zip(_COLUMNS, row))
+        for column in _JSON_COLUMNS:
+            value = json.loads(entry[column])
+            if isinstance(value, list) and column != 'variables':
+                value = tuple(value)
+            entry[column] = value
+        entry['bounded'] = bool(entry['bounded'])
+        return entry
+
+    @staticmethod
+    def _entry_to_row(entry):
+        return tuple(json.dumps(entry[column]) if column in _JSON_COLUMNS
+                     else entry[column] for column in _COLUMNS)
+
+    def _query(self, conn, paths):
+        rows = []
+        for i in range(0, len(paths), _MAX_QUERY_PARAMS):
+            chunk = paths[i:i + _MAX_QUERY_PARAMS]
+            rows.extend(conn.execute(
+                'SELECT {0} FROM files WHERE path IN ({1})'.format(
+                    ', '.join(_COLUMNS), ', '.join('?' * len(chunk))),
+                chunk).fetchall())
+        return {row[0]: self._row_to_entry(row) for row in rows}
+
+    def _store(self, conn, entries):
+        conn.executemany(
+            'INSERT OR REPLACE INTO files VALUES ({})'.format(
+                ', '.join('?' * len(_COLUMNS))),
+            [self._entry_to_row(entry) for entry in entries])
+        conn.commit()
+
+    def _stale_paths(self, paths, cached):
+        """Paths that are missing from the catalog or have changed on disk."""
+        stale = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = cached.get(path)
+            if (entry is None or entry['mtime'] != stat.st_mtime or
+                    entry['size'] != stat.st_size):
+                stale.append(path)
+        return stale
+
+    def entries(self, paths):
+        """Get the catalog entry of each file, scanning any stale files.
+
+        Parameters
+        ----------
+        paths : sequence of str
+            Paths to files
+
+        Returns
+        -------
+        list
+            The entry (a dict) for each path, or None for paths that do not
+            exist or could not be opened
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        with self._lock:
+            conn = self._connect()
+            try:
+                cached = self._query(conn, paths)
+                stale = self._stale_paths(paths, cached)
+                scanned = [entry for entry in map(scan_file, stale)
+                           if entry is not None]
+                if scanned:
+                    self._store(conn, scanned)
+                    cached.update({entry['path']: entry
+                                   for entry in scanned})
+            finally:
+                conn.close()
+        return [cached.get(path) if os.path.exists(path) else None
+                for path in paths]
+
+    def build(self, paths, processes=None):
+        """Scan the given files in parallel and add them to the catalog.
+
+        Files that are already cataloged and unchanged are skipped.
+
+        Parameters
+        ----------
+        paths : sequence of str
+            Paths to files (glob strings are expanded)
+        processes : int, optional
+            Number of worker processes.  Defaults to the number of CPUs.
+
+        Returns
+        -------
+        int
+            The number of files scanned
+        """
+        expanded = []
+        for path in paths:
+            expanded.extend(sorted(glob.glob(path)) or [path])
+        expanded = [os.path.abspath(path) for path in expanded]
+        with self._lock:
+            conn = self._connect()
+            try:
+                stale = self._stale_paths(expanded,
+                                          self._query(conn, expanded))
+                if processes is None:
+                    processes = cpu_count()
+                processes = max(1, min(processes, len(stale)))
+                if processes > 1:
+                    pool = Pool(processes)
+                    try:
+                        scanned = pool.map(scan_file, stale)
+                    finally:
+                        pool.close()
+                        pool.join()
+                else:
+                    scanned = list(map(scan_file, stale))
+                scanned = [entry for entry in scanned if entry is not None]
+                if scanned:
+                    self._store(conn, scanned)
+            finally:
+                conn.close()
+        return len(scanned)
+
+    def clear(self):
+        """Remove all entries from the catalog."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('DELETE FROM files')
+                conn.commit()
+            finally:
+                conn.close()
+
+
+catalog = FileCatalog()
+
+
+def main(args=None):
+    """Build the catalog for the files given on the command line."""
+    parser = argparse.ArgumentParser(
+        prog='python -m aospy.catalog',
+        description='Add input data files to the aospy file catalog.')
+    parser.add_argument('paths', nargs='+',
+                        help='Paths or glob strings of files to catalog')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of worker processes (default: number '
+                        'of CPUs)')
+    parser.add_argument('--catalog', default=None,
+                        help='Path to the catalog database (default: '
+                        '{})'.format(catalog.path))
+    args = parser.parse_args(args)
+    file_catalog = catalog if args.catalog is None else FileCatalog(
+        args.catalog)
+    n_scanned = file_catalog.build(args.paths, processes=args.processes)
+    print('Scanned {0} file(s) into {1}'.format(n_scanned, file_catalog.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,56 @@
 """aospy DataLoader objects"""
+from collections import OrderedDict
+import datetime
+import glob
 import logging
 import os
+import threading
 
 import numpy as np
 import xarray as xr
 
-from .internal_names import (ETA_STR, GRID_ATTRS, TIME_STR, TIME_BOUNDS_STR,
+from .catalog import catalog, _date_to_tuple
+from .internal_names import (AVERAGE_T1_STR, AVERAGE_T2_STR, ETA_STR,
+                             GRID_ATTRS, TIME_STR, TIME_BOUNDS_STR,
                              TIME_VAR_STRS)
 from .utils import times, io
 
 
-def _preprocess_and_rename_grid_attrs(func, **kwargs):
+_GRID_VAR_NAMES = frozenset(
+    list(GRID_ATTRS) + [name for names in GRID_ATTRS.values()
+                        for name in names] +
+    [AVERAGE_T1_STR, AVERAGE_T2_STR])
+
+
+def _drop_other_data_vars(ds, names):
+    """Drop all data variables other than those given and grid attributes.
+
+    Coordinates, and data variables matching any internal or external grid
+    attribute name (e.g. time bounds or surface area), are always retained.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+    names : sequence of str
+        Names of the data variables to retain
+
+    Returns
+    -------
+    xr.Dataset
+    """
+    keep = _GRID_VAR_NAMES.union(names)
+    drop = [name for name in ds.data_vars if name not in keep]
+    if drop:
+        return ds.drop(drop)
+    return ds
+
+
+def _no_preprocess(ds, **kwargs):
+    """The default ``preprocess_func`` of DataLoaders, which does nothing."""
+    return ds
+
+
+def _preprocess_and_rename_grid_attrs(func, data_vars=None, **kwargs):
     """Call a custom preprocessing method first then rename grid attrs
 
     This wrapper is needed to generate a single function to pass to the
@@ -26,6 +66,10 @@ def _preprocess_and_rename_grid_attrs(func, **kwargs):
        An arbitrary function to call before calling
        ``grid_attrs_to_aospy_names`` in ``_load_data_from_disk``.  Must take
        an xr.Dataset as an argument as well as ``**kwargs``.
+    data_vars : sequence of str (optional)
+       If given, all data variables other than these and grid attributes
+       are dropped after calling ``func``, so that subsequent processing and
+       concatenation only involve the data actually needed.
 
     Returns
     -------
@@ -36,7 +80,10 @@ def _preprocess_and_rename_grid_attrs(func, **kwargs):
     """
 
     def func_wrapper(ds):
-        return grid_attrs_to_aospy_names(func(ds, **kwargs))
+        ds = func(ds, **kwargs)
+        if data_vars is not None:
+            ds = _drop_other_data_vars(ds, data_vars)
+        return grid_attrs_to_aospy_names(ds)
     return func_wrapper
 
 
@@ -160,7 +207,7 @@ def _sel_var(ds, var, upcast_float32=True):
     raise LookupError(msg)
 
 
-def _prep_time_data(ds):
+def _prep_time_data(ds, min_year=None, max_year=None):
     """Prepare time coord. information in Dataset for use in aospy.
 
     1. Edit units attribute of time variable if it contains a Timestamp invalid
@@ -170,13 +217,18 @@ def _prep_time_data(ds):
        to construct the Dataset
     3. If the Dataset contains a time bounds coordinate, overwrite the time
        coordinate values with the averages of the time bounds at each timestep
-    4. Decode the times into np.datetime64 objects for time indexing
+    4. Decode the times into np.datetime64 objects (or, for dates outside of
+       their range, cftime dates where supported) for time indexing
 
     Parameters
     ----------
     ds : Dataset
         Pre-processed Dataset with time coordinate renamed to
         internal_names.TIME_STR
+    min_year, max_year : int, optional
+        Minimum and maximum years of the time values in the Dataset, if
+        already known (e.g. from the file catalog); see
+        ``times.numpy_datetime_workaround_encode_cf``
 
     Returns
     -------
@@ -184,7 +236,8 @@ def _prep_time_data(ds):
         The processed Dataset and minimum and maximum years in the loaded data
     """
     ds = times.ensure_time_as_dim(ds)
-    ds, min_year, max_year = times.numpy_datetime_workaround_encode_cf(ds)
+    ds, min_year, max_year = times.numpy_datetime_workaround_encode_cf(
+        ds, min_year, max_year)
     if TIME_BOUNDS_STR in ds:
         ds = times.ensure_time_avg_has_cf_metadata(ds)
         ds[TIME_STR] = times.average_time_bounds(ds)
@@ -193,12 +246,13 @@ def _prep_time_data(ds):
                         "values in time, even though this may not be "
                         "the case")
         ds = times.add_uniform_time_weights(ds)
-    ds = xr.decode_cf(ds, decode_times=True, decode_coords=False,
-                      mask_and_scale=True)
+    ds = times.decode_cf(ds, min_year, max_year, decode_times=True,
+                         decode_coords=False, mask_and_scale=True)
     return ds, min_year, max_year
 
 
-def _load_data_from_disk(file_set, preprocess_func=lambda ds: ds, **kwargs):
+def _load_data_from_disk(file_set, preprocess_func=lambda ds: ds,
+                         chunks=None, data_vars=None, **kwargs):
     """Load a Dataset from a list or glob-string of files.
 
     Datasets from files are concatenated along time,
@@ -211,16 +265,65 @@ def _load_data_from_disk(file_set, preprocess_func=lambda ds: ds, **kwargs):
     preprocess_func : function (optional)
         Custom function to call before applying any aospy logic
         to the loaded dataset
+    chunks : dict (optional)
+        Chunk sizes, keyed by aospy internal names (e.g. ``TIME_STR``), with
+        which each file is opened; see ``_file_chunks``
+    data_vars : sequence of str (optional)
+        Names of the data variables to load; all others (apart from grid
+        attributes) are dropped from each file as it is opened.  By default
+        all data variables are loaded.
 
     Returns
     -------
     Dataset
     """
     apply_preload_user_commands(file_set)
-    func = _preprocess_and_rename_grid_attrs(preprocess_func, **kwargs)
+    func = _preprocess_and_rename_grid_attrs(preprocess_func,
+                                             data_vars=data_vars, **kwargs)
+    if chunks is not None:
+        chunks = _file_chunks(file_set, chunks)
     return xr.open_mfdataset(file_set, preprocess=func, concat_dim=TIME_STR,
                              decode_times=False, decode_coords=False,
-                             mask_and_scale=True)
+                             mask_and_scale=True, chunks=chunks)
+
+
+def _file_chunks(file_set, chunks):
+    """Translate chunks keyed by internal names to those used in the files.
+
+    Files are chunked as they are opened, i.e. before their grid attributes
+    are renamed, so each dimension in ``chunks`` is mapped to whichever of
+    its external names (see ``aospy.internal_names.GRID_ATTRS``) is a
+    dimension of the first file, as found from its metadata alone.
+    Dimensions not found in the file (e.g. if they are only created by a
+    custom ``preprocess_func``) are left out, in which case each file is a
+    single chunk along them.
+
+    Parameters
+    ----------
+    file_set : list or str
+        List of paths to files or glob-string
+    chunks : dict
+        Chunk sizes keyed by aospy internal names
+
+    Returns
+    -------
+    dict
+    """
+    if isinstance(file_set, str):
+        paths = sorted(glob.glob(file_set))
+    else:
+        paths = list(file_set)
+    if not paths:
+        return chunks
+    with xr.open_dataset(paths[0], decode_cf=False) as ds:
+        dims = set(ds.dims)
+    file_chunks = {}
+    for name_int, size in chunks.items():
+        for name in (name_int,) + tuple(GRID_ATTRS.get(name_int, ())):
+            if name in dims:
+                file_chunks[name] = size
+                break
+    return file_chunks
 
 
 def apply_preload_user_commands(file_set, cmd=io.dmget):
@@ -234,13 +337,253 @@ def apply_preload_user_commands(file_set, cmd=io.dmget):
         cmd(file_set)
 
 
+def _year_range(entries):
+    """Min and max years of the time values of cataloged files, if known."""
+    try:
+        return (min(entry['time_start'][0] for entry in entries),
+                max(entry['time_end'][0] for entry in entries))
+    except (TypeError, ValueError):
+        return None, None
+
+
+def _max_time_shift(time_offset):
+    """Upper bound on how far a ``time_offset`` shifts any time value."""
+    if not time_offset:
+        return datetime.timedelta(0)
+    return datetime.timedelta(
+        days=(366 * abs(time_offset.get('years', 0)) +
+              31 * abs(time_offset.get('months', 0)) +
+              abs(time_offset.get('days', 0))),
+        hours=abs(time_offset.get('hours', 0)))
+
+
+def _shifted_date_tuple(date, shift):
+    """Date tuple of a shifted date, or of the date if the shift overflows."""
+    try:
+        return _date_to_tuple(date + shift)
+    except OverflowError:
+        return _date_to_tuple(date)
+
+
+def _prune_file_set(file_set, var, start_date, end_date, known=None,
+                    time_offset=None):
+    """Restrict a file set to files with the variable and requested dates.
+
+    Uses the file catalog (see ``aospy.catalog``) to drop any files whose
+    time extent does not overlap the requested date range or that do not
+    contain any of the variable's names, without opening any files that have
+    previously been cataloged.  Files whose time extent cannot be determined
+    are always retained.  For files without time bounds, a one day margin is
+    added on either side of the requested range to account for small time
+    offsets applied after loading.  The requested range is further widened
+    on either side by the largest shift of the time values that
+    ``time_offset`` (applied after loading) can cause, since the files
+    are cataloged with their unshifted times.  If no files would remain
+    after either
+    step, that step is skipped, so that the usual errors for missing data
+    (or variables) are raised downstream.
+
+    Parameters
+    ----------
+    file_set : list or str
+        List of paths to files or glob-string
+    var : aospy.Var or None
+        Variable to be loaded.  If None, files are not filtered by variable.
+    start_date, end_date : datetime.datetime
+        Requested date range
+    known : dict, optional
+        Catalog entries keyed by path (see ``DataLoader._catalog_entries``),
+        used in place of querying the catalog for the paths it contains
+    time_offset : dict, optional
+        Offset applied to the time values after loading (see
+        ``utils.times.apply_time_offset``)
+
+    Returns
+    -------
+    file_set : list or str
+        The pruned file set
+    entries : list
+        The catalog entries of the files in the pruned file set, or None if
+        the file set was not pruned
+    """
+    if isinstance(file_set, str):
+        paths = sorted(glob.glob(file_set))
+    else:
+        paths = list(file_set)
+    if not paths:
+        return file_set, None
+    known = dict(known or {})
+    unknown = [path for path in paths if path not in known]
+    if unknown:
+        known.update(zip(unknown, catalog.entries(unknown)))
+    entries = [known[path] for path in paths]
+    if start_date is not None and end_date is not None:
+        shift = _max_time_shift(time_offset)
+        start = _shifted_date_tuple(start_date, -shift)
+        end = _shifted_date_tuple(end_date, shift)
+        margin = shift + datetime.timedelta(days=1)
+        start_margin = _shifted_date_tuple(start_date, -margin)
+        end_margin = _shifted_date_tuple(end_date, margin)
+        in_range = []
+        for entry in entries:
+            if entry is None or entry['extent_start'] is None:
+                in_range.append(True)
+            elif entry['bounded']:
+                in_range.append(entry['extent_start'] < end and
+                                entry['extent_end'] > start)
+            else:
+                in_range.append(entry['extent_start'] <= end_margin and
+                                entry['extent_end'] >= start_margin)
+        if any(in_range):
+            paths, entries = zip(*[(path, entry) for path, entry, keep
+                                   in zip(paths, entries, in_range) if keep])
+    if var is not None:
+        has_var = [entry is None or
+                   bool(set(var.names).intersection(entry['variables']))
+                   for entry in entries]
+        if any(has_var):
+            paths, entries = zip(*[(path, entry) for path, entry, keep
+                                   in zip(paths, entries, has_var) if keep])
+    return list(paths), list(entries)
+
+
+class InputCache(object):
+    """Size-bounded, process-wide cache of loaded input DataArrays.
+
+    Every ``Calc`` loads its inputs independently, so without a cache a suite
+    of calculations sharing the same input variables re-reads the same files
+    once per ``Calc``.  ``DataLoader.load_variable`` consults the module-level
+    instance of this class, ``input_cache``, before reading from disk.
+
+    Entries are evicted in least-recently-used order once the total size of
+    the cached arrays exceeds ``max_bytes``.  Arrays larger than
+    ``max_bytes`` are never cached.
+
+    Arrays are copied both when added to and when retrieved from the cache,
+    so that callers (e.g. ``Var`` functions modifying their inputs in place)
+    can never corrupt the cached values.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Upper bound on the summed ``nbytes`` of all cached DataArrays.  Set
+        to 0 to disable caching.
+
+    Attributes
+    ----------
+    hits, misses, evictions : int
+        Counters of cache hits, cache misses, and evicted entries
+    """
+    def __init__(self, max_bytes=2 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Return a copy of the cached DataArray, or None if absent."""
+        with self._lock:
+            try:
+                da = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries[key] = da
+            self.hits += 1
+        return da.copy(deep=True)
+
+    def put(self, key, da):
+        """Add a copy of the DataArray to the cache, evicting old entries as
+        needed."""
+        nbytes = da.nbytes
+        if nbytes > self.max_bytes:
+            return
+        da = da.copy(deep=True)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = da
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.nbytes -= old.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return a dict summarizing the current state of the cache."""
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, entries=len(self),
+                    nbytes=self.nbytes, max_bytes=self.max_bytes)
+
+
+input_cache = InputCache()
+
+
 class DataLoader(object):
     """A fundamental DataLoader object"""
+    time_chunks = None
+    use_catalog = False
+
+    def _loading_attrs(self, **DataAttrs):
+        """The subset of the DataAttrs that affect the loaded values.
+
+        ``intvl_out`` is only passed on to a custom ``preprocess_func``;
+        otherwise it affects the loaded values through the file set alone
+        (e.g. in ``GFDLDataLoader``).
+        """
+        if self.preprocess_func is _no_preprocess:
+            DataAttrs.pop('intvl_out', None)
+        return io.hashable(DataAttrs)
+
+    def _input_cache_key(self, var, file_set, start_date, end_date,
+                         time_offset, **DataAttrs):
+        """Key identifying a unique ``load_variable`` request.
+
+        The loader itself, along with the loader settings that affect the
+        loaded values, are part of the key, so that different loaders (or
+        the same loader with e.g. a different ``preprocess_func``) never
+        share entries.
+        """
+        return (self, self.preprocess_func, self.upcast_float32,
+                var.names, io.hashable(file_set), start_date, end_date,
+                io.hashable(time_offset), self._loading_attrs(**DataAttrs))
+
     def load_variable(self, var=None, start_date=None, end_date=None,
-                      time_offset=None, **DataAttrs):
+                      time_offset=None, use_cache=True, **DataAttrs):
         """Load a DataArray for requested variable and time range.
 
         Automatically renames all grid attributes to match aospy conventions.
+        Results are cached in ``aospy.data_loader.input_cache``, so repeated
+        requests for the same data (e.g. by different ``Calc`` objects in a
+        suite) are only read from disk once.
+
+        If the DataLoader's ``use_catalog`` attribute is True, the file
+        catalog (see ``aospy.catalog``) is used to open only the files that
+        contain the variable and overlap the requested dates, and to find the
+        range of years in the data without decoding the time axis.
+
+        If the DataLoader's ``time_chunks`` attribute is set, the returned
+        DataArray is instead a lazy, dask-backed array chunked along time
+        with chunks of that length; in that case nothing is read into memory
+        (or cached) until the values are needed.
 
         Parameters
         ----------
@@ -253,6 +596,8 @@ class DataLoader(object):
         time_offset : dict
             Option to add a time offset to the time coordinate to correct for
             incorrect metadata.
+        use_cache : bool, default True
+            Whether to look up and store the result in the input cache
         **DataAttrs
             Attributes needed to identify a unique set of files to load from
 
@@ -263,19 +608,85 @@ class DataLoader(object):
         """
         file_set = self._generate_file_set(var=var, start_date=start_date,
                                            end_date=end_date, **DataAttrs)
+        min_year, max_year = None, None
+        file_set, entries = self._catalog_file_set(
+            file_set, var, start_date, end_date, time_offset=time_offset)
+        if entries is not None:
+            min_year, max_year = _year_range(entries)
+        key = self._input_cache_key(var, file_set, start_date, end_date,
+                                    time_offset, **DataAttrs)
+        lazy = self.time_chunks is not None
+        use_cache = use_cache and not lazy
+        if use_cache:
+            da = input_cache.get(key)
+            if da is not None:
+                return da
+        chunks = {TIME_STR: self.time_chunks} if lazy else None
         ds = _load_data_from_disk(file_set, self.preprocess_func,
+                                  chunks=chunks, data_vars=var.names,
                                   start_date=start_date, end_date=end_date,
                                   time_offset=time_offset, **DataAttrs)
-        ds, min_year, max_year = _prep_time_data(ds)
+        ds, min_year, max_year = _prep_time_data(ds, min_year, max_year)
         ds = set_grid_attrs_as_coords(ds)
         da = _sel_var(ds, var, self.upcast_float32)
         da = self._maybe_apply_time_shift(da, time_offset, **DataAttrs)
 
-        start_date_xarray = times.numpy_datetime_range_workaround(
-            start_date, min_year, max_year)
-        end_date_xarray = start_date_xarray + (end_date - start_date)
-        return times.sel_time(da, np.datetime64(start_date_xarray),
-                              np.datetime64(end_date_xarray)).load()
+        example = da[TIME_STR].values.flat[0]
+        if isinstance(example, np.datetime64):
+            start_date_xarray = times.numpy_datetime_range_workaround(
+                start_date, min_year, max_year)
+            # Shift the end date by the same number of years as the start
+            # date, so that it does not depend on which years are leap years
+            # (and hence on the range of years loaded).
+            try:
+                end_date_xarray = end_date.replace(
+                    year=(end_date.year + start_date_xarray.year -
+                          start_date.year))
+            except ValueError:
+                # February 29th shifted to a year that is not a leap year
+                end_date_xarray = start_date_xarray + (end_date - start_date)
+        else:
+            start_date_xarray, end_date_xarray = start_date, end_date
+        da = times.sel_time(da, times.to_date_type(start_date_xarray, example),
+                            times.to_date_type(end_date_xarray, example))
+        if lazy:
+            return da.chunk({TIME_STR: self.time_chunks})
+        da = da.load()
+        if use_cache:
+            input_cache.put(key, da)
+        return da
+
+    def _catalog_file_set(self, file_set, var, start_date, end_date,
+                          known=None, time_offset=None):
+        """Prune the file set using the file catalog, if it is enabled.
+
+        See ``_prune_file_set``.  Files are only dropped for lacking the
+        variable if the DataLoader has no custom ``preprocess_func``, since
+        that may derive the variable from other fields in the files.
+
+        Returns
+        -------
+        file_set : list or str
+        entries : list or None
+        """
+        if not self.use_catalog:
+            return file_set, None
+        preprocess_func = getattr(self, 'preprocess_func', _no_preprocess)
+        if preprocess_func is not _no_preprocess:
+            var = None
+        return _prune_file_set(file_set, var, start_date, end_date,
+                               known=known, time_offset=time_offset)
+
+    def _catalog_entries(self, paths):
+        """Catalog entries of the given files keyed by path, if enabled.
+
+        Returns
+        -------
+        dict, or None if the file catalog is not used
+        """
+        if not self.use_catalog or not paths:
+            return None
+        return dict(zip(paths, catalog.entries(paths)))
 
     @staticmethod
     def _maybe_apply_time_shift(da, time_offset=None, **DataAttrs):
@@ -312,6 +723,17 @@ class DictDataLoader(DataLoader):
     preprocess_func : function (optional)
         A function to apply to every Dataset before processing in aospy.  Must
         take a Dataset and ``**kwargs`` as its two arguments.
+    time_chunks : int (optional)
+        If given, load data lazily as dask arrays with chunks of this many
+        time indices, rather than reading the full date range into memory.
+        Default None.
+    use_catalog : bool (default False)
+        Whether to use the file catalog (see ``aospy.catalog``) to open only
+        the files that contain the requested variable and overlap the
+        requested date range.  The catalog is stored on disk, by default
+        within ``~/.aospy_cache``.  Files are not filtered by variable if a
+        ``preprocess_func`` is given, and the catalog should not be used if
+        ``preprocess_func`` shifts the times in the data.
 
     Examples
     --------
@@ -336,11 +758,14 @@ class DictDataLoader(DataLoader):
     >>> data_loader = DictDataLoader(file_map, preprocess)
     """
     def __init__(self, file_map=None, upcast_float32=True,
-                 preprocess_func=lambda ds, **kwargs: ds):
+                 preprocess_func=_no_preprocess, time_chunks=None,
+                 use_catalog=False):
         """Create a new DictDataLoader"""
         self.file_map = file_map
         self.upcast_float32 = upcast_float32
         self.preprocess_func = preprocess_func
+        self.time_chunks = time_chunks
+        self.use_catalog = use_catalog
 
     def _generate_file_set(self, var=None, start_date=None, end_date=None,
                            domain=None, intvl_in=None, dtype_in_vert=None,
@@ -375,6 +800,17 @@ class NestedDictDataLoader(DataLoader):
     preprocess_func : function (optional)
         A function to apply to every Dataset before processing in aospy.  Must
         take a Dataset and ``**kwargs`` as its two arguments.
+    time_chunks : int (optional)
+        If given, load data lazily as dask arrays with chunks of this many
+        time indices, rather than reading the full date range into memory.
+        Default None.
+    use_catalog : bool (default False)
+        Whether to use the file catalog (see ``aospy.catalog``) to open only
+        the files that contain the requested variable and overlap the
+        requested date range.  The catalog is stored on disk, by default
+        within ``~/.aospy_cache``.  Files are not filtered by variable if a
+        ``preprocess_func`` is given, and the catalog should not be used if
+        ``preprocess_func`` shifts the times in the data.
 
     Examples
     --------
@@ -389,11 +825,14 @@ class NestedDictDataLoader(DataLoader):
     possible function to pass as a ``preprocess_func``.
     """
     def __init__(self, file_map=None, upcast_float32=True,
-                 preprocess_func=lambda ds, **kwargs: ds):
+                 preprocess_func=_no_preprocess, time_chunks=None,
+                 use_catalog=False):
         """Create a new NestedDictDataLoader"""
         self.file_map = file_map
         self.upcast_float32 = upcast_float32
         self.preprocess_func = preprocess_func
+        self.time_chunks = time_chunks
+        self.use_catalog = use_catalog
 
     def _generate_file_set(self, var=None, start_date=None, end_date=None,
                            domain=None, intvl_in=None, dtype_in_vert=None,
@@ -434,6 +873,17 @@ class GFDLDataLoader(DataLoader):
     preprocess_func : function (optional)
         A function to apply to every Dataset before processing in aospy.  Must
         take a Dataset and ``**kwargs`` as its two arguments.
+    time_chunks : int (optional)
+        If given, load data lazily as dask arrays with chunks of this many
+        time indices, rather than reading the full date range into memory.
+        Default None.
+    use_catalog : bool (default False)
+        Whether to use the file catalog (see ``aospy.catalog``) to open only
+        the files that contain the requested variable and overlap the
+        requested date range.  The catalog is stored on disk, by default
+        within ``~/.aospy_cache``.  Files are not filtered by variable if a
+        ``preprocess_func`` is given, and the catalog should not be used if
+        ``preprocess_func`` shifts the times in the data.
 
     Examples
     --------
@@ -453,7 +903,8 @@ class GFDLDataLoader(DataLoader):
     def __init__(self, template=None, data_direc=None, data_dur=None,
                  data_start_date=None, data_end_date=None,
                  upcast_float32=None,
-                 preprocess_func=lambda ds, **kwargs: ds):
+                 preprocess_func=_no_preprocess, time_chunks=None,
+                 use_catalog=None):
         """Create a new GFDLDataLoader"""
         attrs = ['data_direc', 'data_dur', 'data_start_date', 'data_end_date',
                  'preprocess_func']
@@ -485,6 +936,14 @@ class GFDLDataLoader(DataLoader):
                 self.upcast_float32 = upcast_float32
             else:
                 self.upcast_float32 = template.upcast_float32
+            if time_chunks is not None:
+                self.time_chunks = time_chunks
+            else:
+                self.time_chunks = template.time_chunks
+            if use_catalog is not None:
+                self.use_catalog = use_catalog
+            else:
+                self.use_catalog = template.use_catalog
         else:
             self.data_direc = data_direc
             self.data_dur = data_dur
@@ -495,6 +954,11 @@ class GFDLDataLoader(DataLoader):
                 self.upcast_float32 = True
             else:
                 self.upcast_float32 = upcast_float32
+            self.time_chunks = time_chunks
+            if use_catalog is None:
+                self.use_catalog = False
+            else:
+                self.use_catalog = use_catalog
 
     @staticmethod
     def _maybe_apply_time_shift(da, time_offset=None, **DataAttrs):
@@ -1,6 +1,11 @@
 """Functionality for representing data on disk of individual models."""
+import glob
+import hashlib
 import logging
+import os
+import threading
 
+from dask.local import get_sync
 import numpy as np
 import xarray as xr
 
@@ -97,6 +102,310 @@ def _grid_sfc_area(lon, lat, lon_bounds=None, lat_bounds=None):
     return sfc_area.transpose()
 
 
+# Grid data are available as attributes of Model objects, which are looked up
+# in the grid registry on first access.
+_LEVS_THICK_STR = 'levs_thick'
+_GRID_DATA_NAMES = (tuple(internal_names.GRID_ATTRS) + (_LEVS_THICK_STR,))
+# Grid data that are None (rather than missing) if not in the grid files.
+_OPTIONAL_GRID_DATA_NAMES = (internal_names.PLEVEL_STR, _LEVS_THICK_STR)
+# Names of grid data within grid files.
+_GRID_FILE_NAMES = frozenset(
+    name for names in internal_names.GRID_ATTRS.values() for name in names)
+
+
+def _open_grid_files(grid_file_paths):
+    """Open the files holding grid data."""
+    if isinstance(grid_file_paths, str):
+        grid_file_paths = [grid_file_paths]
+    datasets = []
+    for path in grid_file_paths:
+        try:
+            ds = xr.open_dataset(path, decode_times=False)
+        except TypeError:
+            # Grid data may be loaded within tasks of a distributed
+            # computation, so they are loaded without the active scheduler.
+            ds = xr.open_mfdataset(path, decode_times=False).load(
+                get=get_sync)
+        except (RuntimeError, OSError) as e:
+            msg = str(e) + ': {}'.format(path)
+            raise RuntimeError(msg)
+        datasets.append(ds)
+    return tuple(datasets)
+
+
+def _expand_paths(grid_file_paths):
+    """The files matching the (possibly nested sequences of) patterns."""
+    if isinstance(grid_file_paths, str):
+        return sorted(glob.glob(grid_file_paths)) or [grid_file_paths]
+    return [path for paths in grid_file_paths
+            for path in _expand_paths(paths)]
+
+
+def _values_hash(arr):
+    """Hash of the values (and their shape and type) of an array."""
+    values = np.ascontiguousarray(arr)
+    sha = hashlib.sha1(repr((values.shape, values.dtype.str)).encode('utf-8'))
+    sha.update(values.tobytes())
+    return sha.hexdigest()
+
+
+def _grid_vars_hash(path):
+    """Hash of the values of the grid variables in a file, ignoring others."""
+    sha = hashlib.sha1()
+    with xr.open_dataset(path, decode_cf=False) as ds:
+        for name in sorted(_GRID_FILE_NAMES.intersection(ds.variables)):
+            sha.update(name.encode('utf-8'))
+            sha.update(_values_hash(ds[name].values).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def _write_atomically(path, write):
+    """Write a file via a temporary file, so readers never see it partial."""
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    write(tmp_path)
+    utils.io.replace_file(tmp_path, path)
+
+
+class _Grid(object):
+    """The grid data from a set of grid files, each loaded on first use.
+
+    Grid data derived from those in the files (the bounds of the grid cells
+    if not in the files, and the surface area computed from them) are
+    computed once.  If ``cache_dir`` is given, they are also saved to a file
+    named by the key of the grid in that directory, from which they are
+    read by other processes using the same grid.  The hash of the values
+    of each grid attribute is computed once, when the attribute is stored,
+    so that coordinates can be compared against it cheaply.
+    """
+    _DERIVED_NAMES = (internal_names.LON_BOUNDS_STR,
+                      internal_names.LAT_BOUNDS_STR,
+                      internal_names.SFC_AREA_STR)
+
+    def __init__(self, key, grid_file_paths, cache_dir=None):
+        self.key = key
+        self.grid_file_paths = grid_file_paths
+        self.cache_dir = cache_dir
+        self._datasets = None
+        self._data = {}
+        self._hashes = {}
+        self._derived = None
+        self._lock = threading.RLock()
+
+    def _cache_path(self):
+        return os.path.join(self.cache_dir, self.key + '.nc')
+
+    def _load_cache(self):
+        """Read the derived grid data saved by previous processes."""
+        self._derived = {}
+        if self.cache_dir is None:
+            return
+        try:
+            with xr.open_dataset(self._cache_path()) as ds:
+                self._derived = {name: ds[name].load()
+                                 for name in ds.data_vars}
+        except (IOError, OSError, RuntimeError, EOFError):
+            pass
+
+    def _save_cache(self):
+        if self.cache_dir is None or not self._derived:
+            return
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            ds = xr.Dataset(self._derived)
+            _write_atomically(self._cache_path(), ds.to_netcdf)
+        except (IOError, OSError, RuntimeError) as e:
+            logging.debug('Unable to save grid cache: {}'.format(e))
+
+    def _from_files(self, name_int):
+        """Get a grid attribute from the grid files given its names in them."""
+        if self._datasets is None:
+            self._datasets = _open_grid_files(self.grid_file_paths)
+        for name in internal_names.GRID_ATTRS[name_int]:
+            grid_attr = _get_grid_attr(self._datasets, name)
+            if grid_attr is not None:
+                TIME_STR = internal_names.TIME_STR
+                renamed_attr = _rename_coords(grid_attr)
+                if ((TIME_STR not in renamed_attr.dims) and
+                   (TIME_STR in renamed_attr)):
+                    renamed_attr = renamed_attr.drop(TIME_STR)
+                return renamed_attr
+
+    def _derived_sfc_area(self):
+        """The surface area computed from the grid cell bounds.
+
+        The surface area and any bounds derived for it are saved to the
+        cache together, once, when first computed.
+        """
+        if self._derived is None:
+            self._load_cache()
+        if internal_names.SFC_AREA_STR not in self._derived:
+            self._derive(internal_names.SFC_AREA_STR)
+            self._save_cache()
+        return self._derived[internal_names.SFC_AREA_STR]
+
+    def _derive(self, name):
+        """Get derived grid data, computing them if needed."""
+        if self._derived is None:
+            self._load_cache()
+        if name not in self._derived:
+            if name == internal_names.SFC_AREA_STR:
+                value = _grid_sfc_area(
+                    self.get(internal_names.LON_STR),
+                    self.get(internal_names.LAT_STR),
+                    self._bounds(internal_names.LON_STR),
+                    self._bounds(internal_names.LAT_STR))
+            else:
+                dim = (internal_names.LON_STR
+                       if name == internal_names.LON_BOUNDS_STR
+                       else internal_names.LAT_STR)
+                value = _bounds_from_array(self.get(dim), dim, name)
+            self._derived[name] = value
+        return self._derived[name]
+
+    def _bounds(self, dim):
+        """The bounds of the grid cells along the lon or lat dimension.
+
+        As in ``_grid_sfc_area``, these are computed from the cell centers
+        unless the files contain the bounds along both dimensions.
+        """
+        lon_bounds = self.get(internal_names.LON_BOUNDS_STR)
+        lat_bounds = self.get(internal_names.LAT_BOUNDS_STR)
+        if lon_bounds is None or lat_bounds is None:
+            if dim == internal_names.LON_STR:
+                return self._derive(internal_names.LON_BOUNDS_STR)
+            return self._derive(internal_names.LAT_BOUNDS_STR)
+        return lon_bounds if dim == internal_names.LON_STR else lat_bounds
+
+    def _compute(self, name):
+        if name == _LEVS_THICK_STR:
+            level = self.get(internal_names.PLEVEL_STR)
+            if level is None:
+                return None
+            return utils.vertcoord.level_thickness(level)
+        value = self._from_files(name)
+        if name == internal_names.SFC_AREA_STR and not np.any(value):
+            if (self.get(internal_names.LON_STR) is None or
+                    self.get(internal_names.LAT_STR) is None):
+                return None
+            return self._derived_sfc_area()
+        return value
+
+    def get(self, name):
+        """The grid attribute of the given internal name, or None."""
+        with self._lock:
+            if name not in self._data:
+                value = self._compute(name)
+                self._data[name] = value
+                self._hashes[name] = (None if value is None
+                                      else _values_hash(value))
+            return self._data[name]
+
+    def hash(self, name):
+        """Hash of the values of a grid attribute, or None if absent."""
+        with self._lock:
+            self.get(name)
+            return self._hashes[name]
+
+
+class GridRegistry(object):
+    """Process-wide registry of the grid data of Models.
+
+    Grids are keyed by the path, size, and modification time of each of
+    their grid files, together with a hash of the values of the grid
+    variables in it (other variables, e.g. in model history files used as
+    grid files, are not read).  Models sharing grid files (and copies of a
+    Model, e.g. those unpickled by each worker of a parallel computation)
+    thus share a single copy of the grid data, each attribute of which is
+    only loaded on first use.  The hash of each file is computed once per
+    process for as long as its size and modification time do not change.
+    ``Model`` objects consult the module-level instance of this class,
+    ``grid_registry``.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Counters of lookups of registered and unregistered grids
+    """
+    def __init__(self):
+        self._grids = {}
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._grids)
+
+    def _file_hash(self, path):
+        stat = os.stat(path)
+        stat_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            file_hash = self._file_hashes.get(stat_key)
+        if file_hash is None:
+            try:
+                grid_hash = _grid_vars_hash(path)
+            except (IOError, OSError, RuntimeError, ValueError):
+                grid_hash = None
+            file_hash = hashlib.sha1(
+                repr(stat_key + (grid_hash,)).encode('utf-8')).hexdigest()
+            with self._lock:
+                self._file_hashes[stat_key] = file_hash
+        return file_hash
+
+    def key(self, grid_file_paths):
+        """The key of the grid of the given grid files."""
+        if isinstance(grid_file_paths, str):
+            grid_file_paths = [grid_file_paths]
+        sha = hashlib.sha1()
+        for path in _expand_paths(grid_file_paths):
+            try:
+                sha.update(self._file_hash(path).encode('utf-8'))
+            except (IOError, OSError):
+                sha.update(path.encode('utf-8'))
+        return sha.hexdigest()
+
+    def get(self, key, grid_file_paths, cache_dir=None):
+        """The grid of the given key, registered from the files if needed.
+
+        Parameters
+        ----------
+        key : str
+            The key of the grid, as returned by ``key``
+        grid_file_paths : sequence of str
+            The files holding the grid data
+        cache_dir : str, optional
+            Directory in which the grid data derived from those in the files
+            are saved, and from which they are read if already saved
+        """
+        with self._lock:
+            grid = self._grids.get(key)
+            if grid is None:
+                self.misses += 1
+                grid = _Grid(key, grid_file_paths, cache_dir=cache_dir)
+                self._grids[key] = grid
+            else:
+                self.hits += 1
+                if grid.cache_dir is None:
+                    grid.cache_dir = cache_dir
+            return grid
+
+    def clear(self):
+        """Remove all grids and reset the counters."""
+        with self._lock:
+            self._grids.clear()
+            self._file_hashes.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return a dict summarizing the current state of the registry."""
+        return dict(hits=self.hits, misses=self.misses, grids=len(self))
+
+
+grid_registry = GridRegistry()
+
+
 class Model(object):
     """An object that describes a single climate or weather model.
 
@@ -124,7 +433,13 @@ class Model(object):
         specified
     grid_file_paths : list
         The paths to netCDF files stored on disk from which the model's
-        coordinate data can be taken.
+        coordinate data can be taken.  Each grid attribute (e.g. ``lat``,
+        ``sfc_area``, or ``levs_thick``) is loaded from them on first
+        access, and shared with all Models with the same grid files via
+        ``aospy.model.grid_registry``.
+    grid_cache_dir : str or None
+        Directory in which grid data derived from those in the grid files are
+        saved
     default_start_date, default_end_date : datetime.datetime
         The default start and end dates of any calculations using this Model
 
@@ -133,7 +448,7 @@ class Model(object):
     def __init__(self, name=None, description=None, proj=None,
                  grid_file_paths=None, default_start_date=None,
                  default_end_date=None, runs=None, default_runs=None,
-                 load_grid_data=False):
+                 load_grid_data=False, grid_cache_dir=None):
         """
         Parameters
         ----------
@@ -160,7 +475,13 @@ class Model(object):
             by default.
         load_grid_data : bool, optional (default False)
             Whether or not to load the grid data specified by 'grid_file_paths'
-            upon initilization
+            upon initilization.  Otherwise each grid attribute is loaded on
+            first access.
+        grid_cache_dir : str, optional
+            Directory in which grid data derived from those in the grid files
+            (the bounds and surface area of the grid cells, if not in the
+            files) are saved, so that they are only computed once for each
+            grid rather than once per process.  Default None (not saved).
 
         See Also
         --------
@@ -181,6 +502,7 @@ class Model(object):
 
         grid_file_paths = [] if grid_file_paths is None else grid_file_paths
         self.grid_file_paths = grid_file_paths
+        self.grid_cache_dir = grid_cache_dir
 
         self.default_start_date = default_start_date
         self.default_end_date = default_end_date
@@ -193,65 +515,57 @@ class Model(object):
         else:
             self.default_runs = default_runs
 
-        self._grid_data_is_set = False
         if load_grid_data:
             self.set_grid_data()
-            self._grid_data_is_set = True
 
     def __str__(self):
         return 'Model instance "' + self.name + '"'
 
     __repr__ = __str__
 
-    def _get_grid_files(self):
-        """Get the files holding grid data for an aospy object."""
-        grid_file_paths = self.grid_file_paths
-        datasets = []
-        if isinstance(grid_file_paths, str):
-            grid_file_paths = [grid_file_paths]
-        for path in grid_file_paths:
-            try:
-                ds = xr.open_dataset(path, decode_times=False)
-            except TypeError:
-                ds = xr.open_mfdataset(path, decode_times=False).load()
-            except (RuntimeError, OSError) as e:
-                msg = str(e) + ': {}'.format(path)
-                raise RuntimeError(msg)
-            datasets.append(ds)
-        return tuple(datasets)
-
-    def _set_mult_grid_attr(self):
+    def _grid(self):
+        """The model's grid in the grid registry.
+
+        Only the key of the grid is stored on the Model, so that pickled
+        Models do not carry the grid data.
         """
-        Set multiple attrs from grid file given their names in the grid file.
+        paths = self.grid_file_paths
+        handle = self.__dict__.get('_grid_handle')
+        if handle is None or handle[0] != repr(paths):
+            handle = (repr(paths), grid_registry.key(paths))
+            self._grid_handle = handle
+        return grid_registry.get(handle[1], paths,
+                                 cache_dir=self.__dict__.get('grid_cache_dir'))
+
+    def __getattr__(self, name):
+        # Only called for attributes not set on the Model itself.
+        if (name not in _GRID_DATA_NAMES or
+                'grid_file_paths' not in self.__dict__):
+            raise AttributeError("'Model' object has no attribute "
+                                 "'{}'".format(name))
+        value = self._grid().get(name)
+        if value is None and name not in _OPTIONAL_GRID_DATA_NAMES:
+            raise AttributeError("No grid data '{0}' for {1}".format(
+                name, self))
+        return value
+
+    def grid_hash(self, name):
+        """Hash of the values of a grid attribute, or None if absent.
+
+        For grid data from the grid files, the hash is computed once per
+        grid, rather than on each call.
         """
-        grid_objs = self._get_grid_files()
-        for name_int, names_ext in internal_names.GRID_ATTRS.items():
-            for name in names_ext:
-                grid_attr = _get_grid_attr(grid_objs, name)
-                if grid_attr is not None:
-                    TIME_STR = internal_names.TIME_STR
-                    renamed_attr = _rename_coords(grid_attr)
-                    if ((TIME_STR not in renamed_attr.dims) and
-                       (TIME_STR in renamed_attr)):
-                        renamed_attr = renamed_attr.drop(TIME_STR)
-                    setattr(self, name_int, renamed_attr)
-                    break
+        if (name in self.__dict__ or name not in _GRID_DATA_NAMES or
+                'grid_file_paths' not in self.__dict__):
+            value = getattr(self, name, None)
+            return None if value is None else _values_hash(value)
+        return self._grid().hash(name)
 
     def set_grid_data(self):
-        """Populate the attrs that hold grid data."""
-        if self._grid_data_is_set:
-            return
-        self._set_mult_grid_attr()
-        if not np.any(getattr(self, 'sfc_area', None)):
-            try:
-                sfc_area = _grid_sfc_area(self.lon, self.lat, self.lon_bounds,
-                                          self.lat_bounds)
-            except AttributeError:
-                sfc_area = _grid_sfc_area(self.lon, self.lat)
-            self.sfc_area = sfc_area
-        try:
-            self.levs_thick = utils.vertcoord.level_thickness(self.level)
-        except AttributeError:
-            self.level = None
-            self.levs_thick = None
-        self._grid_data_is_set = True
+        """Load all grid data from the grid files.
+
+        Grid data are otherwise loaded on first access to each attribute.
+        """
+        grid = self._grid()
+        for name in _GRID_DATA_NAMES:
+            grid.get(name)
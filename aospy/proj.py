@@ -3,6 +3,10 @@ import logging
 import time
 
 from . import utils
+from .archive import TarArchive
+
+
+_OUTPUT_FORMATS = ('netcdf', 'zarr')
 
 
 class Proj(object):
@@ -29,6 +33,17 @@ class Proj(object):
     direc_out, tar_direc_out : str
         The paths to the root directories of, respectively, the standard and
         .tar versions of the output of aospy calculations saved to disk.
+    archive_class : subclass of aospy.archive.Archive
+        The type of archive in which outputs are saved in ``tar_direc_out``
+    output_format : {'netcdf', 'zarr'}
+        The format in which outputs are saved in ``direc_out``
+    output_compressor : numcodecs compressor or None
+        The compressor of Zarr outputs
+    output_chunks : dict or None
+        The chunk sizes along each dimension of Zarr outputs
+    results_store : bool
+        Whether outputs are also added to the ``aospy.results.ResultsStore``
+        of their run
     models : dict
         A dictionary with entries of the form ``{model_obj.name: model_obj}``,
         for each of this ``Proj``'s child model objects
@@ -42,7 +57,9 @@ class Proj(object):
 
     def __init__(self, name, description=None, models=None,
                  default_models=None, regions=None, direc_out='',
-                 tar_direc_out=''):
+                 tar_direc_out='', archive_class=TarArchive,
+                 output_format='netcdf', output_compressor=None,
+                 output_chunks=None, results_store=False):
         """
         Parameters
         ----------
@@ -63,6 +80,26 @@ class Proj(object):
         direc_out, tar_direc_out : str
             Path to the root directories of where, respectively, regular output
             and a .tar-version of the output will be saved to disk.
+        archive_class : subclass of aospy.archive.Archive, optional
+            The type of archive in which outputs are saved in
+            ``tar_direc_out``.  Default :py:class:`aospy.archive.TarArchive`.
+        output_format : {'netcdf', 'zarr'}, optional
+            The format in which outputs are saved in ``direc_out``.  Default
+            'netcdf'.  Zarr outputs (which require the ``zarr`` package) are
+            chunked and compressed, and new regional averages are added to
+            them in place.  They are not added to tar archives.
+        output_compressor : numcodecs compressor, optional
+            The compressor of Zarr outputs, e.g.
+            ``numcodecs.Blosc(cname='zstd', clevel=3)``.  Default zarr's
+            default compressor.
+        output_chunks : dict, optional
+            The chunk sizes of Zarr outputs, with entries of the form
+            ``{dim_name: chunk_size}``.  Dimensions not included are not
+            chunked.  Default None (chunked as computed).
+        results_store : bool, optional
+            Whether outputs are also added to a single store per run, which
+            can be queried and opened without instantiating `Calc` objects;
+            see :py:class:`aospy.results.ResultsStore`.  Default False.
 
         Note
         ----
@@ -80,6 +117,14 @@ class Proj(object):
         self.description = '' if description is None else description
         self.direc_out = direc_out
         self.tar_direc_out = tar_direc_out
+        self.archive_class = archive_class
+        if output_format not in _OUTPUT_FORMATS:
+            raise ValueError("output_format must be one of {0}; got "
+                             "'{1}'".format(_OUTPUT_FORMATS, output_format))
+        self.output_format = output_format
+        self.output_compressor = output_compressor
+        self.output_chunks = output_chunks
+        self.results_store = results_store
 
         if models is None:
             self.models = []
@@ -1,9 +1,15 @@
 """Functionality pertaining to aggregating data over geographical regions."""
+from collections import OrderedDict
+import hashlib
 import logging
+import threading
 
 import numpy as np
+import scipy.sparse
+import xarray as xr
 
 from . import internal_names
+from .utils.io import hashable
 
 
 def _add_to_mask(data, lat_bounds, lon_bounds):
@@ -159,23 +165,46 @@ class Region(object):
 
     __repr__ = __str__
 
+    def _cache_key(self):
+        return hashable(self.mask_bounds), self.do_land_mask
+
+    def _mask(self, data):
+        """Boolean mask of the region on the data's horizontal grid."""
+        key = ('mask', self._cache_key(),
+               _grid_hash(data, with_area=False, with_land_mask=False))
+        mask = mask_cache.get(key)
+        if mask is None:
+            mask = _make_mask(data, self.mask_bounds)
+            if isinstance(mask, xr.DataArray):
+                mask = mask.reset_coords(drop=True)
+            mask_cache.put(key, mask)
+        return mask
+
+    def _area_weights(self, data):
+        """Surface area within the region, times any land or ocean mask."""
+        key = ('weights', self._cache_key(),
+               _grid_hash(data, with_land_mask=bool(self.do_land_mask)))
+        weights = mask_cache.get(key)
+        if weights is None:
+            sfc_area = data[internal_names.SFC_AREA_STR]
+            land_mask = _get_land_mask(data, self.do_land_mask)
+            weights = sfc_area.where(self._mask(data)) * land_mask
+            weights = weights.reset_coords(drop=True)
+            mask_cache.put(key, weights)
+        return weights
+
     def mask_var(self, data):
         """Mask the data of the given variable outside the region."""
-        return data.where(_make_mask(data, self.mask_bounds))
+        return data.where(self._mask(data))
 
     def ts(self, data):
         """Create time-series of region-average data."""
-        data_masked = self.mask_var(data)
-        sfc_area = data.sfc_area
-        land_mask = _get_land_mask(data, self.do_land_mask)
-
-        weights = self.mask_var(sfc_area) * land_mask
+        weights = self._area_weights(data)
         # Mask weights where data values are initially invalid in addition
         # to applying the region mask.
-        weights = weights.where(np.isfinite(data))
-        sum_weights = _sum_over_lat_lon(weights)
-        return (_sum_over_lat_lon(data_masked*sfc_area*land_mask) /
-                sum_weights)
+        sum_weights = _sum_over_lat_lon(
+            weights.where(xr.ufuncs.isfinite(data)))
+        return _sum_over_lat_lon(data*weights) / sum_weights
 
     def av(self, data):
         """Time average of region-average time-series."""
@@ -190,3 +219,244 @@ class Region(object):
         if 'year' not in ts_.coords:
             return ts_
         return ts_.std('year')
+
+
+def _grid_hash(data, with_area=True, with_land_mask=True):
+    """Hash of the horizontal grid and (optionally) its area and land mask.
+
+    Parameters
+    ----------
+    data : xarray.DataArray
+        Data with latitude and longitude (and, optionally, surface area and
+        land mask) coordinates
+    with_area : bool, optional
+        Whether to include the surface area in the hash.  Default True.
+    with_land_mask : bool, optional
+        Whether to include the land mask, if present, in the hash.  Default
+        True.
+
+    Returns
+    -------
+    str
+    """
+    names = [internal_names.LAT_STR, internal_names.LON_STR]
+    if with_area:
+        names.append(internal_names.SFC_AREA_STR)
+    if with_land_mask and internal_names.LAND_MASK_STR in data.coords:
+        names.append(internal_names.LAND_MASK_STR)
+    sha = hashlib.sha1()
+    for name in names:
+        arr = data[name]
+        values = np.ascontiguousarray(arr.values)
+        sha.update(repr((name, arr.dims, values.shape,
+                         values.dtype.str)).encode('utf-8'))
+        sha.update(values.tobytes())
+    return sha.hexdigest()
+
+
+class RegionMaskCache(object):
+    """Size-bounded, process-wide cache of region masks and area weights.
+
+    Masking data by a region requires comparing the latitude and longitude
+    of every grid point to the region's bounds, and averaging over it
+    additionally requires the (land-masked) surface area within it.  Because
+    these depend only on the region and the horizontal grid, they are
+    computed once per region and grid and stored in the module-level
+    instance of this class, ``mask_cache``, which is shared by all `Calc`
+    objects in a process.
+
+    Keys combine the region's bounds and land mask setting with a hash of
+    the grid's coordinates (see ``_grid_hash``), so that modifying a region
+    or loading data on a different grid never returns a stale entry.
+    Cached objects are shared and must not be modified in place.
+
+    Entries are evicted in least-recently-used order once there are more
+    than ``max_entries`` of them.
+
+    Parameters
+    ----------
+    max_entries : int
+        Upper bound on the number of cached masks and weights.  Set to 0 to
+        disable caching.
+
+    Attributes
+    ----------
+    hits, misses, evictions : int
+        Counters of cache hits, cache misses, and evicted entries
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """Return the cached object, or None if absent."""
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries[key] = value
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Add the object to the cache, evicting old entries as needed."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries and reset the counters.
+
+        Call this e.g. after modifying a grid's surface area or land mask
+        in place, which the keys cannot detect.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return a dict summarizing the current state of the cache."""
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, entries=len(self),
+                    max_entries=self.max_entries)
+
+
+mask_cache = RegionMaskCache()
+
+
+class RegionSet(object):
+    """A collection of regions whose averages are computed together.
+
+    Rather than masking and summing the data separately for each region (as
+    in :py:meth:`Region.ts`), each region's normalized area weights (which
+    account for its mask and any land or ocean mask) on the data's
+    horizontal grid are precomputed as one row of a sparse weight matrix,
+    and all regional averages are then obtained in a single matrix
+    multiplication.  The weights are renormalized at each point in time (or
+    other non-horizontal dimension) to exclude grid points where the data
+    are NaN, giving the same result as :py:meth:`Region.ts`.
+
+    Parameters
+    ----------
+    regions : sequence of Region objects
+        The regions.  Their names must be unique.
+
+    See Also
+    --------
+    aospy.Calc.region_calcs
+    """
+    def __init__(self, regions):
+        self.regions = list(regions)
+
+    def __str__(self):
+        return 'RegionSet of ' + str(self.regions)
+
+    __repr__ = __str__
+
+    def weights(self, data):
+        """Sparse matrix of each region's (unnormalized) area weights.
+
+        Parameters
+        ----------
+        data : xarray.DataArray
+            Data defined on the horizontal grid, with surface area (and, if
+            any region uses a land mask, land mask) coordinates
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            Of shape (number of regions, number of grid points), where the
+            grid points are ordered as in the flattened (lat, lon) grid.
+            The matrix is cached in ``aospy.region.mask_cache`` and must not
+            be modified.
+        """
+        key = ('region_set',
+               tuple(region._cache_key() for region in self.regions),
+               _grid_hash(data))
+        weights = mask_cache.get(key)
+        if weights is None:
+            lat_lon = [internal_names.LAT_STR, internal_names.LON_STR]
+            grid = xr.broadcast(data[internal_names.LAT_STR],
+                                data[internal_names.LON_STR])[0]
+            rows = []
+            for region in self.regions:
+                region_weights = region._area_weights(data)
+                region_weights = (xr.broadcast(region_weights, grid)[0]
+                                  .transpose(*lat_lon).values.ravel())
+                rows.append(np.where(np.isfinite(region_weights),
+                                     region_weights, 0.))
+            weights = scipy.sparse.csr_matrix(np.array(rows))
+            mask_cache.put(key, weights)
+        return weights
+
+    def ts(self, data):
+        """Create time-series of the region-averages of data.
+
+        Parameters
+        ----------
+        data : xarray.DataArray
+
+        Returns
+        -------
+        xarray.Dataset
+            With one variable per region, named after the region
+        """
+        lat_lon = [internal_names.LAT_STR, internal_names.LON_STR]
+        if data.chunks is not None:
+            # Keep dask-backed data lazy.
+            return xr.Dataset({region.name: region.ts(data)
+                               for region in self.regions})
+        weights = self.weights(data)
+        other_dims = [dim for dim in data.dims if dim not in lat_lon]
+        data = data.transpose(*(other_dims + lat_lon))
+        values = data.values.reshape(-1, weights.shape[1])
+        finite = np.isfinite(values)
+        totals = weights.dot(np.where(finite, values, 0.).T).T
+        sum_weights = weights.dot(finite.T.astype(float)).T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            averages = totals / sum_weights
+        shape = [data[dim].size for dim in other_dims]
+        coords = {name: coord for name, coord in data.coords.items()
+                  if not set(coord.dims).intersection(lat_lon)}
+        return xr.Dataset(
+            {region.name: xr.DataArray(averages[:, i].reshape(shape),
+                                       dims=other_dims, coords=coords)
+             for i, region in enumerate(self.regions)})
+
+    def av(self, data):
+        """Time averages of the region-average time-series."""
+        ts_ = self.ts(data)
+        if 'year' not in ts_.coords:
+            return ts_
+        return _reduce_data_vars(ts_, lambda arr: arr.mean('year'))
+
+    def std(self, data):
+        """Standard deviations of the region-average time-series."""
+        ts_ = self.ts(data)
+        if 'year' not in ts_.coords:
+            return ts_
+        return _reduce_data_vars(ts_, lambda arr: arr.std('year'))
+
+
+def _reduce_data_vars(ds, func):
+    """Apply a reduction separately to each variable of a Dataset."""
+    return xr.Dataset({name: func(arr) for name, arr in ds.data_vars.items()})
@@ -0,0 +1,261 @@
+"""A consolidated store of the outputs of aospy calculations.
+
+Each `Calc` saves each of its outputs to its own netCDF file, so loading
+many outputs (e.g. for a figure comparing several variables, regions, or
+time reductions) requires constructing a `Calc` for, and opening, each of
+them.  If the ``results_store`` argument of its `Proj` is True, each `Calc`
+also adds its outputs to a :py:class:`ResultsStore` holding all outputs of
+its run, which can be queried and opened directly::
+
+    >>> from aospy.results import ResultsStore
+    >>> store = ResultsStore.for_run(example_proj, example_model, example_run)
+    >>> precip_avs = store.load(var='precip', dtype_out_time='av')
+"""
+import json
+import logging
+import os
+
+import netCDF4
+import xarray as xr
+
+from .utils.io import file_lock, replace_file
+
+
+ENTRY_FIELDS = ('var', 'model', 'run', 'ens_mem', 'intvl_in', 'intvl_out',
+                'dtype_in_time', 'dtype_in_vert', 'dtype_out_time',
+                'dtype_out_vert', 'start_year', 'end_year', 'region')
+_ENTRY_ATTR = 'aospy_results_entry'
+_GROUP_PREFIX = 'result'
+
+
+def _entry_key(entry):
+    return json.dumps([entry[field] for field in ENTRY_FIELDS], default=str)
+
+
+def _group_number(group):
+    return int(group[len(_GROUP_PREFIX):])
+
+
+def _matches(value, criterion):
+    if isinstance(criterion, (list, tuple, set)):
+        return value in criterion
+    return value == criterion
+
+
+class ResultsStore(object):
+    """A single netCDF file holding many aospy outputs, with an index.
+
+    Each output is stored in its own group of a NETCDF4 file, together
+    with the specifications of the calculation it resulted from (its
+    "entry"; see ``ENTRY_FIELDS``).  Outputs are added by appending a new
+    group, so that the cost does not depend on the size of the store.
+    Replacing an output appends its new version without removing the old
+    one, so the store grows with each replacement until ``compact`` is
+    called to remove superseded versions.
+
+    The entries of the latest version of each output are recorded in a JSON
+    index alongside the store (``results.nc.index``), so that outputs can be
+    queried without opening the store.  The index is rebuilt from the
+    entries stored in each group if it is missing or out of date.  Outputs
+    are loaded into memory when opened, and the store is closed again
+    straight away: the file cannot be appended to while it is open, so
+    holding it open would prevent outputs from being added.
+
+    Parameters
+    ----------
+    path : str
+        Path to the store
+    """
+    file_name = 'results.nc'
+
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return 'ResultsStore "{}"'.format(self.path)
+
+    __repr__ = __str__
+
+    @classmethod
+    def for_run(cls, proj, model, run):
+        """The store of the outputs of the given run.
+
+        Parameters
+        ----------
+        proj : aospy.Proj
+        model : aospy.Model
+        run : aospy.Run
+        """
+        return cls(os.path.join(proj.direc_out, proj.name, model.name,
+                                run.name, cls.file_name))
+
+    @property
+    def _index_path(self):
+        return self.path + '.index'
+
+    def _scan(self):
+        """Build the index from the entries stored with each output."""
+        index = dict(entries={}, groups=0, size=0)
+        if os.path.isfile(self.path):
+            with netCDF4.Dataset(self.path) as nc:
+                groups = sorted(nc.groups, key=_group_number)
+                for group in groups:
+                    entry = json.loads(nc.groups[group].getncattr(
+                        _ENTRY_ATTR))
+                    index['entries'][_entry_key(entry)] = entry
+                if groups:
+                    index['groups'] = _group_number(groups[-1]) + 1
+            index['size'] = os.path.getsize(self.path)
+        return index
+
+    def _write_index(self, index):
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        replace_file(tmp_path, self._index_path)
+
+    def _read_index(self):
+        """The index, or None if it is missing or out of date."""
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        size = (os.path.getsize(self.path) if os.path.isfile(self.path)
+                else 0)
+        if index.get('size') != size:
+            return None
+        return index
+
+    def _index(self, locked=False):
+        index = self._read_index()
+        if index is not None:
+            return index
+        if not locked:
+            with file_lock(self.path):
+                return self._index(locked=True)
+        logging.debug('Indexing {}'.format(self.path))
+        index = self._scan()
+        self._write_index(index)
+        return index
+
+    def _load_entries(self, entries):
+        """Load the outputs with the given entries, opening the store once."""
+        if not entries:
+            return []
+        with file_lock(self.path):
+            with netCDF4.Dataset(self.path) as nc:
+                return [xr.open_dataset(xr.backends.NetCDF4DataStore(
+                    nc.groups[entry['group']]))[entry['name']].load()
+                    for entry in entries]
+
+    def add(self, data, **entry):
+        """Add an output, replacing any output with the same entry.
+
+        Parameters
+        ----------
+        data : xarray.DataArray
+            The output
+        **entry
+            The value of each of the ``ENTRY_FIELDS`` for this output
+
+        Raises
+        ------
+        ValueError
+            If any of the ``ENTRY_FIELDS`` are missing
+        """
+        missing = [field for field in ENTRY_FIELDS if field not in entry]
+        if missing:
+            raise ValueError('Missing entry fields: {}'.format(missing))
+        name = data.name if data.name is not None else entry['var']
+        ds = data.to_dataset(name=name)
+        with file_lock(self.path):
+            index = self._index(locked=True)
+            group = '{0}{1}'.format(_GROUP_PREFIX, index['groups'])
+            entry = dict(entry, name=name, group=group)
+            # Round trip through JSON so that the index matches the entries
+            # read back from the store.
+            entry = json.loads(json.dumps(entry, default=str))
+            ds.attrs = {_ENTRY_ATTR: json.dumps(entry)}
+            mode = 'a' if os.path.isfile(self.path) else 'w'
+            ds.to_netcdf(self.path, mode=mode, group=group,
+                         engine='netcdf4', format='NETCDF4')
+            index['entries'][_entry_key(entry)] = entry
+            index['groups'] += 1
+            index['size'] = os.path.getsize(self.path)
+            self._write_index(index)
+
+    def query(self, **criteria):
+        """Entries of the outputs matching the given criteria.
+
+        Parameters
+        ----------
+        **criteria
+            Required values of any of the ``ENTRY_FIELDS``.  A list, tuple,
+            or set matches any of its values.
+
+        Returns
+        -------
+        list of dict
+            The matching entries, in the order their outputs were added.
+            Besides the ``ENTRY_FIELDS``, each has the name of the output
+            (``name``) and of the group storing it (``group``).
+        """
+        for field in criteria:
+            if field not in ENTRY_FIELDS:
+                raise ValueError("Unknown entry field '{0}'; must be one of "
+                                 "{1}".format(field, ENTRY_FIELDS))
+        entries = sorted(self._index()['entries'].values(),
+                         key=lambda entry: _group_number(entry['group']))
+        return [entry for entry in entries
+                if all(_matches(entry[field], criterion)
+                       for field, criterion in criteria.items())]
+
+    def open(self, entry):
+        """Load the output with the given entry.
+
+        Parameters
+        ----------
+        entry : dict
+            An entry returned by ``query``
+
+        Returns
+        -------
+        xarray.DataArray
+        """
+        [data] = self._load_entries([entry])
+        return data
+
+    def load(self, **criteria):
+        """Load the outputs matching the given criteria.
+
+        See ``query`` for the criteria.
+
+        Returns
+        -------
+        list of xarray.DataArray
+            The matching outputs, in the same order as the entries returned
+            by ``query``
+        """
+        return self._load_entries(self.query(**criteria))
+
+    def compact(self):
+        """Rewrite the store without superseded versions of its outputs."""
+        with file_lock(self.path):
+            index = self._index(locked=True)
+            entries = sorted(index['entries'].values(),
+                             key=lambda entry: _group_number(entry['group']))
+            tmp_path = self.path + '.tmp'
+            for number, entry in enumerate(entries):
+                with xr.open_dataset(self.path, group=entry['group'],
+                                     decode_cf=False) as ds:
+                    ds = ds.load()
+                group = '{0}{1}'.format(_GROUP_PREFIX, number)
+                entry = dict(entry, group=group)
+                ds.attrs[_ENTRY_ATTR] = json.dumps(entry)
+                ds.to_netcdf(tmp_path, mode='a' if number else 'w',
+                             group=group, engine='netcdf4',
+                             format='NETCDF4')
+            if entries:
+                replace_file(tmp_path, self.path)
+            self._write_index(self._scan())
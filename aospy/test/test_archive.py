@@ -0,0 +1,88 @@
+"""Test suite for aospy.archive module."""
+from multiprocessing.pool import ThreadPool
+import os
+import tarfile
+
+import pytest
+
+from aospy.archive import TarArchive
+
+
+def _write(direc, name, contents):
+    path = os.path.join(str(direc), name)
+    with open(path, 'wb') as f:
+        f.write(contents)
+    return path
+
+
+@pytest.fixture
+def archive(tmpdir):
+    return TarArchive(os.path.join(str(tmpdir), 'tar', 'data.tar'))
+
+
+def _read_with_tarfile(path, name):
+    with tarfile.open(path, 'r') as tar:
+        return tar.extractfile(name).read()
+
+
+def test_add_and_replace(tmpdir, archive):
+    archive.add(_write(tmpdir, 'a.nc', b'a' * 1000), 'a.nc')
+    archive.add(_write(tmpdir, 'b.nc', b'b' * 512), 'b.nc')
+    archive.add(_write(tmpdir, 'a.nc', b'A' * 10), 'a.nc')
+    assert archive.names() == ['a.nc', 'b.nc']
+    assert archive.open('a.nc').read() == b'A' * 10
+    assert archive.open('b.nc').read() == b'b' * 512
+    # The archive remains readable by tarfile, which uses the last version.
+    assert _read_with_tarfile(archive.path, 'a.nc') == b'A' * 10
+    with pytest.raises(KeyError):
+        archive.open('c.nc')
+
+
+def test_add_does_not_rewrite(tmpdir, archive):
+    archive.add(_write(tmpdir, 'a.nc', b'a' * 5000), 'a.nc')
+    with open(archive.path, 'rb') as f:
+        before = f.read()
+    archive.add(_write(tmpdir, 'a.nc', b'b' * 10), 'a.nc')
+    with open(archive.path, 'rb') as f:
+        after = f.read()
+    # Only the end-of-archive marker of the original archive is overwritten.
+    assert after.startswith(before[:-2 * tarfile.BLOCKSIZE])
+
+
+def test_index_rebuilt(tmpdir, archive):
+    os.makedirs(os.path.dirname(archive.path))
+    with tarfile.open(archive.path, 'w') as tar:
+        tar.add(_write(tmpdir, 'a.nc', b'a' * 100), arcname='a.nc')
+    assert archive.open('a.nc').read() == b'a' * 100
+    archive.add(_write(tmpdir, 'b.nc', b'b' * 100), 'b.nc')
+    os.remove(archive.path + '.index')
+    assert TarArchive(archive.path).names() == ['a.nc', 'b.nc']
+    assert _read_with_tarfile(archive.path, 'b.nc') == b'b' * 100
+
+
+def test_concurrent_add(tmpdir, archive):
+    paths = [_write(tmpdir, '{}.nc'.format(i), str(i).encode() * 3000)
+             for i in range(8)]
+    pool = ThreadPool(4)
+    try:
+        pool.map(lambda path: archive.add(path, os.path.basename(path)),
+                 paths)
+    finally:
+        pool.close()
+        pool.join()
+    with tarfile.open(archive.path, 'r') as tar:
+        assert sorted(tar.getnames()) == sorted(archive.names())
+    for i in range(8):
+        assert (archive.open('{}.nc'.format(i)).read() ==
+                str(i).encode() * 3000)
+
+
+def test_compact(tmpdir, archive):
+    for contents in [b'a' * 5000, b'b' * 5000, b'c' * 10]:
+        archive.add(_write(tmpdir, 'a.nc', contents), 'a.nc')
+    size = os.path.getsize(archive.path)
+    archive.compact()
+    assert os.path.getsize(archive.path) < size
+    assert archive.open('a.nc').read() == b'c' * 10
+    with tarfile.open(archive.path, 'r') as tar:
+        assert tar.getnames() == ['a.nc']
@@ -1,5 +1,6 @@
+from datetime import datetime
 from multiprocessing import cpu_count
-from os.path import isfile
+from os.path import getmtime, isfile
 import shutil
 import sys
 
@@ -13,7 +14,9 @@ from aospy.automate import (_get_attr_by_tag, _permuted_dicts_of_specs,
                             _user_verify, CalcSuite, _MODELS_STR, _RUNS_STR,
                             _VARIABLES_STR, _REGIONS_STR,
                             _compute_or_skip_on_error, submit_mult_calcs,
-                            _n_workers_for_local_cluster)
+                            _n_workers_for_local_cluster,
+                            _group_calcs_by_shared_inputs,
+                            _max_group_size)
 from . import requires_pytest_catchlog
 from .data.objects import examples as lib
 from .data.objects.examples import (
@@ -304,6 +307,52 @@ def test_n_workers_for_local_cluster(calcsuite_init_specs_two_calcs):
     assert result == expected
 
 
+def test_group_calcs_by_shared_inputs(calcsuite_init_specs_two_calcs):
+    specs = calcsuite_init_specs_two_calcs
+    calcs = CalcSuite(specs).create_calcs()
+    assert _group_calcs_by_shared_inputs(calcs) == [[0], [1]]
+
+    # A Calc of a function of both variables links the two groups.
+    specs['variables'] = [condensation_rain, convection_rain, precip]
+    calcs = CalcSuite(specs).create_calcs()
+    assert _group_calcs_by_shared_inputs(calcs) == [[0, 1, 2]]
+    assert _group_calcs_by_shared_inputs(calcs, max_group_size=2) == [
+        [0, 1], [2]]
+    assert _max_group_size(calcs, n_workers=2) == 2
+    assert _max_group_size(calcs, n_workers=8) == 1
+
+    # Different date ranges require separate loads.
+    specs['variables'] = [condensation_rain]
+    specs['date_ranges'] = [(datetime(4, 1, 1), datetime(4, 12, 31)),
+                            (datetime(5, 1, 1), datetime(5, 12, 31))]
+    calcs = CalcSuite(specs).create_calcs()
+    assert _group_calcs_by_shared_inputs(calcs) == [[0], [1]]
+
+
+@pytest.mark.parametrize('parallelize', [False, True])
+def test_submit_calcs_sharing_inputs(calcsuite_init_specs_two_calcs,
+                                     parallelize):
+    specs = calcsuite_init_specs_two_calcs
+    specs['variables'] = [condensation_rain, precip, convection_rain]
+    expected = [calc.name for calc in CalcSuite(specs).create_calcs()]
+    calcs = submit_mult_calcs(specs, dict(parallelize=parallelize,
+                                          write_to_tar=False))
+    assert [calc.name for calc in calcs] == expected
+    assert_calc_files_exist(calcs, False, ['av'])
+
+
+def test_submit_mult_calcs_skip_up_to_date(calcsuite_init_specs_single_calc):
+    exec_options = dict(parallelize=False, write_to_tar=False)
+    calc, = submit_mult_calcs(calcsuite_init_specs_single_calc, exec_options)
+    mtime = getmtime(calc.path_out['av'])
+
+    exec_options = dict(parallelize=False, write_to_tar=False,
+                        skip_up_to_date=True)
+    calc, = submit_mult_calcs(calcsuite_init_specs_single_calc, exec_options)
+    assert getmtime(calc.path_out['av']) == mtime
+    assert calc.data_out == {}
+
+
 @pytest.fixture
 def calc_suite(calcsuite_init_specs):
     return CalcSuite(calcsuite_init_specs)
@@ -1,17 +1,29 @@
 #!/usr/bin/env python
 """Basic test of the Calc module on 2D data."""
+import copy
 import datetime
+from multiprocessing.pool import ThreadPool
+import os
 from os.path import isfile
 import shutil
 import unittest
 import pytest
 
+import dask.array
+import numpy as np
 import xarray as xr
 
-from aospy.calc import Calc, CalcInterface, _add_metadata_as_attrs
+from aospy import RegionSet, data_loader, utils
+from aospy.catalog import FileCatalog
+from aospy.utils.io import file_lock
+from aospy.data_loader import NestedDictDataLoader
+from aospy.calc import (Calc, CalcInterface, _add_metadata_as_attrs,
+                        _chunk_sizes, _drop_date_coords, _save_netcdf,
+                        _YearlyMoments)
+from aospy.results import ResultsStore
 from .data.objects.examples import (
     example_proj, example_model, example_run, condensation_rain,
-    precip, sphum, globe, sahel
+    precip, precip_files, sphum, globe, sahel
 )
 
 def _test_output_attrs(calc, dtype_out):
@@ -126,6 +138,34 @@ class TestCalcBasic(unittest.TestCase):
         calc.compute()
         _test_files_and_attrs(calc, 'reg.av')
 
+    def test_skip_up_to_date(self):
+        calc_int = CalcInterface(intvl_out='ann',
+                                 dtype_out_time=['av', 'reg.av'],
+                                 region=[globe],
+                                 **self.test_params)
+        calc = Calc(calc_int)
+        self.assertFalse(calc.is_up_to_date())
+        calc.compute()
+        self.assertTrue(calc.is_up_to_date())
+
+        calc = Calc(calc_int)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('Up-to-date calculation was recomputed')
+        calc._get_all_data = fail
+        self.assertIs(calc.compute(skip_up_to_date=True), calc)
+        with self.assertRaises(AssertionError):
+            calc.compute(skip_up_to_date=False)
+
+        params = self.test_params.copy()
+        params['date_range'] = (datetime.datetime(4, 1, 1),
+                                datetime.datetime(5, 12, 31))
+        calc = Calc(CalcInterface(intvl_out='ann',
+                                  dtype_out_time=['av', 'reg.av'],
+                                  region=[globe], **params))
+        self.assertFalse(calc.is_up_to_date())
+
+
 class TestCalcComposite(TestCalcBasic):
     def setUp(self):
         self.test_params = {
@@ -155,6 +195,229 @@ class TestCalc3D(TestCalcBasic):
             'dtype_out_vert': 'vert_int'
         }
 
+
+def _make_calc(proj=example_proj, var=condensation_rain,
+               date_range=(datetime.datetime(4, 1, 1),
+                           datetime.datetime(6, 12, 31)), **kwargs):
+    """Calc of the example run's monthly data, by default over years 4-6."""
+    return Calc(CalcInterface(
+        proj=proj, model=example_model, run=example_run, var=var,
+        date_range=date_range, intvl_in='monthly', dtype_in_time='ts',
+        **kwargs))
+
+
+@pytest.fixture
+def remove_output_direcs():
+    yield
+    for direc in [example_proj.direc_out, example_proj.tar_direc_out]:
+        shutil.rmtree(direc, ignore_errors=True)
+
+
+@pytest.mark.parametrize('var', [condensation_rain, precip])
+@pytest.mark.parametrize('intvl_out', ['ann', 'djf'])
+@pytest.mark.parametrize('use_catalog', [True, False])
+def test_compute_append(remove_output_direcs, tmpdir, monkeypatch, var,
+                        intvl_out, use_catalog):
+    monkeypatch.setattr(example_run.data_loader, 'use_catalog', use_catalog)
+    catalog = FileCatalog(str(tmpdir.join('catalog.sqlite')))
+    monkeypatch.setattr(data_loader, 'catalog', catalog)
+
+    def make_calc(end_year):
+        return _make_calc(
+            var=var, date_range=(datetime.datetime(4, 1, 1),
+                                 datetime.datetime(end_year, 12, 31)),
+            intvl_out=intvl_out,
+            dtype_out_time=['ts', 'av', 'std', 'reg.ts', 'reg.av'],
+            region=[globe, sahel])
+
+    expected = make_calc(6).compute(write_to_tar=False)
+    shutil.rmtree(example_proj.direc_out)
+
+    calc = make_calc(6)
+    assert calc._find_prior_calc() is None
+    make_calc(4).compute(write_to_tar=False)
+    queried = []
+    entries = catalog.entries
+
+    def counted_entries(paths):
+        queried.append(paths)
+        return entries(paths)
+    monkeypatch.setattr(catalog, 'entries', counted_entries)
+    prior = calc._find_prior_calc()
+    assert prior.end_date == datetime.datetime(4, 12, 31)
+    assert len(queried) == int(use_catalog)
+
+    def get_all_data(start_date, end_date):
+        assert start_date == datetime.datetime(5, 1, 1)
+        return Calc._get_all_data(calc, start_date, end_date)
+    calc._get_all_data = get_all_data
+    calc.compute(write_to_tar=False, append=True)
+    assert calc.is_up_to_date()
+    for dtype_out_time, data in expected.data_out.items():
+        xr.testing.assert_allclose(calc.data_out[dtype_out_time], data)
+
+
+@pytest.mark.parametrize('var', [condensation_rain, precip])
+@pytest.mark.parametrize('years_per_block', [1, 2])
+@pytest.mark.parametrize('dtype_out_time', [['ts', 'av', 'std', 'reg.av'],
+                                            ['av', 'std', 'reg.std']])
+def test_compute_years_per_block(remove_output_direcs, var, years_per_block,
+                                 dtype_out_time):
+    def make_calc():
+        return _make_calc(
+            var=var, date_range=(datetime.datetime(4, 3, 1),
+                                 datetime.datetime(6, 12, 31)),
+            intvl_out='djf', dtype_out_time=dtype_out_time,
+            region=[globe, sahel])
+
+    expected = make_calc().compute(write_to_tar=False)
+    data_loader.input_cache.clear()
+    result = make_calc().compute(write_to_tar=False,
+                                 years_per_block=years_per_block)
+    # Streamed blocks bypass the input cache, to bound the memory use.
+    assert len(data_loader.input_cache) == 0
+    for dtype_out_time, data in expected.data_out.items():
+        actual = result.data_out[dtype_out_time]
+        assert set(actual.coords) == set(data.coords)
+        xr.testing.assert_allclose(_drop_date_coords(actual),
+                                   _drop_date_coords(data))
+
+
+def test_apply_all_time_reductions(remove_output_direcs, monkeypatch):
+    calls = []
+    region_set_ts = RegionSet.ts
+
+    def ts(self, data):
+        calls.append(data)
+        return region_set_ts(self, data)
+    monkeypatch.setattr(RegionSet, 'ts', ts)
+
+    calc = _make_calc(
+        intvl_out='ann',
+        dtype_out_time=['ts', 'av', 'std', 'reg.ts', 'reg.av', 'reg.std'],
+        region=[globe, sahel])
+    calc.compute(write_to_tar=False)
+    assert len(calls) == 1
+
+    ts = calc.data_out['ts']
+    xr.testing.assert_allclose(calc.data_out['av'], ts.mean('year'))
+    xr.testing.assert_allclose(calc.data_out['std'], ts.std('year'))
+    reg_ts = calc.data_out['reg.ts']
+    for name in ['globe', 'sahel']:
+        xr.testing.assert_allclose(calc.data_out['reg.av'][name],
+                                   reg_ts[name].mean('year'))
+        xr.testing.assert_allclose(calc.data_out['reg.std'][name],
+                                   reg_ts[name].std('year'))
+
+
+@pytest.fixture
+def daily_data_loader(tmpdir):
+    """DataLoader of daily data for Jan-Mar of year 4 on the example grid.
+
+    The daily values vary about the monthly-mean values of the example
+    data, with a weekly cycle.
+    """
+    path = os.path.join(os.path.dirname(precip_files),
+                        '00040101.precip_monthly.nc')
+    ds = xr.open_dataset(path, decode_times=False).isel(
+        time=slice(0, 3)).load()
+    day = np.arange(90)
+    month = np.searchsorted(ds['time_bounds'].values[:, 1] - 1095., day,
+                            side='right')
+    cycle = xr.DataArray(1. + 0.5 * np.sin(2. * np.pi * day / 7.),
+                         dims=['time'])
+    daily = ds.isel(time=month)
+    daily['time'] = xr.DataArray(1095.5 + day, dims=['time'],
+                                 attrs=ds['time'].attrs)
+    for name in ['condensation_rain', 'convection_rain']:
+        daily[name] = (daily[name] * cycle).astype(np.float32)
+    daily['time_bounds'] = (('time', 'nv'),
+                            1095. + np.stack([day, day + 1], axis=1))
+    daily['average_DT'] = ('time', np.ones(90), ds['average_DT'].attrs)
+    path = str(tmpdir.join('00040101.precip_daily.nc'))
+    daily.to_netcdf(path)
+    return NestedDictDataLoader({'daily': {'condensation_rain': [path],
+                                           'convection_rain': [path]}})
+
+
+def _product(condensation_rain, convection_rain):
+    return condensation_rain * convection_rain
+
+
+@pytest.mark.parametrize(('linear', 'expected_func'),
+                         [(False, _product), (True, precip.func)])
+def test_full_mean_eddy_ts(remove_output_direcs, daily_data_loader,
+                           monkeypatch, linear, expected_func):
+    monkeypatch.setattr(example_run, 'data_loader', daily_data_loader)
+    calls = []
+
+    def func(*args):
+        calls.append(args)
+        return expected_func(*args)
+    var = copy.copy(precip)
+    var.func = func
+    var.linear = linear
+
+    calc = Calc(CalcInterface(
+        proj=example_proj, model=example_model, run=example_run, var=var,
+        date_range=(datetime.datetime(4, 1, 1),
+                    datetime.datetime(4, 3, 31)),
+        intvl_in='daily', dtype_in_time='ts', intvl_out='ann',
+        dtype_out_time=['av', 'time-mean.av', 'eddy.av']))
+    calc.compute(write_to_tar=False)
+    assert len(calls) == (1 if linear else 2)
+
+    data = [daily_data_loader.load_variable(
+        v, calc.start_date, calc.end_date, intvl_in='daily')
+        for v in precip.variables]
+    full = expected_func(*data)
+    if linear:
+        monthly = utils.times.monthly_mean_ts(full)
+    else:
+        monthly = expected_func(
+            *[utils.times.monthly_mean_ts(d) for d in data])
+    eddy = full - utils.times.monthly_mean_at_each_ind(monthly, full)
+    # Each day has the same weight, as does each month's mean.  The eddy
+    # term of a linear function averages to zero up to round-off.
+    atol = 1e-6 * float(abs(full).max())
+    for dtype_out_time, expected in [('av', full), ('time-mean.av', monthly),
+                                     ('eddy.av', eddy)]:
+        actual = calc.data_out[dtype_out_time]
+        np.testing.assert_allclose(
+            actual.values,
+            expected.mean('time').transpose(*actual.dims).values,
+            rtol=1e-5, atol=atol)
+    if not linear:
+        assert float(abs(calc.data_out['eddy.av']).max()) > atol
+
+
+def test_compute_time_chunks(remove_output_direcs, monkeypatch):
+    def make_calc():
+        return _make_calc(var=precip, intvl_out='djf',
+                          dtype_out_time=['ts', 'av', 'std', 'reg.av'],
+                          region=[globe, sahel])
+
+    expected = make_calc().compute(write_to_tar=False)
+    monkeypatch.setattr(example_run, 'data_loader', NestedDictDataLoader(
+        example_run.data_loader.file_map, time_chunks=5))
+    result = make_calc().compute(write_to_tar=False)
+    for dtype_out_time, data in expected.data_out.items():
+        xr.testing.assert_allclose(result.data_out[dtype_out_time], data)
+
+
+def test_yearly_moments():
+    values = np.random.RandomState(0).rand(7, 3)
+    values[:4, 0] = np.nan
+    values[:, 1] = np.nan
+    arr = xr.DataArray(values, dims=['year', 'lat'],
+                       coords={'year': np.arange(7)})
+    moments = _YearlyMoments()
+    for block in [slice(0, 2), slice(2, 3), slice(3, 7)]:
+        moments.update(arr.isel(year=block))
+    xr.testing.assert_allclose(moments.av(), arr.mean('year'))
+    xr.testing.assert_allclose(moments.std(), arr.std('year'))
+
+
 @pytest.mark.parametrize(
     ('units', 'description', 'dtype_out_vert', 'expected_units',
      'expected_description'),
@@ -187,5 +450,161 @@ def test_attrs(units, description, dtype_out_vert, expected_units,
         assert expected_units == arr.attrs['units']
         assert expected_description == arr.attrs['description']
 
+
+def test_zarr_output(remove_output_direcs):
+    pytest.importorskip('zarr')
+    proj = copy.copy(example_proj)
+    proj.output_format = 'zarr'
+
+    def make_calc(proj, regions):
+        return _make_calc(proj=proj, intvl_out='ann',
+                          dtype_out_time=['ts', 'reg.ts'], region=regions)
+
+    expected = make_calc(example_proj, [globe, sahel]).compute(
+        write_to_tar=False)
+    calc = make_calc(proj, [globe]).compute()
+    assert calc.path_out['ts'].endswith('.zarr')
+    assert calc.is_up_to_date()
+    make_calc(proj, [sahel]).compute()
+
+    result = make_calc(proj, [globe])
+    xr.testing.assert_allclose(result.load('ts'), expected.data_out['ts'])
+    # The example land mask is all zeros, so sahel's values are all NaN,
+    # which assert_allclose treats as equal.
+    for region in [globe, sahel]:
+        xr.testing.assert_allclose(
+            result._load_from_disk('reg.ts', region=region),
+            expected.data_out['reg.ts'][region.name])
+
+
+@pytest.mark.parametrize('chunks', [None, 'ts', 'map'])
+def test_compression(remove_output_direcs, chunks):
+    def make_calc():
+        return _make_calc(intvl_out='ann',
+                          dtype_out_time=['ts', 'av', 'reg.av'],
+                          region=[globe])
+
+    expected = make_calc().compute(write_to_tar=False)
+    compression = dict(complevel=4, least_significant_digit=3, chunks=chunks)
+    calc = make_calc().compute(write_to_tar=False, compression=compression)
+    with xr.open_dataset(calc.path_out['ts']) as ds:
+        encoding = ds[calc.name].encoding
+        assert encoding['zlib']
+        assert encoding['shuffle']
+        if chunks is not None:
+            assert (encoding['chunksizes'] ==
+                    _chunk_sizes(ds[calc.name], chunks))
+        xr.testing.assert_allclose(ds[calc.name], expected.data_out['ts'],
+                                   atol=1e-3)
+    for dtype_out_time, region in [('av', False), ('reg.av', globe)]:
+        result = make_calc()._load_from_disk(dtype_out_time, region=region)
+        assert np.isfinite(result).all()
+
+
+def test_load_compressed_from_tar(remove_output_direcs):
+    expected = _make_calc(intvl_out='ann', dtype_out_time='ts').compute(
+        compression=True)
+    shutil.rmtree(example_proj.direc_out)
+    result = _make_calc(intvl_out='ann', dtype_out_time='ts').load('ts')
+    xr.testing.assert_allclose(result, expected.data_out['ts'])
+
+
+def test_chunk_sizes():
+    arr = xr.DataArray(np.zeros((3, 2, 64, 128)),
+                       dims=['year', 'pfull', 'lat', 'lon'])
+    assert _chunk_sizes(arr, 'ts') == (3, 1, 32, 32)
+    assert _chunk_sizes(arr, 'map') == (1, 1, 64, 128)
+
+
+def test_reg_outputs_written_in_place(remove_output_direcs):
+    def make_calc(regions):
+        return _make_calc(intvl_out='ann',
+                          dtype_out_time=['reg.ts', 'reg.av'], region=regions)
+
+    expected = make_calc([globe, sahel]).compute(write_to_tar=False)
+    shutil.rmtree(example_proj.direc_out)
+    calc = make_calc([globe]).compute(write_to_tar=False)
+    inode = os.stat(calc.path_out['reg.ts']).st_ino
+    make_calc([sahel]).compute(write_to_tar=False)
+    make_calc([globe]).compute(write_to_tar=False)
+    assert os.stat(calc.path_out['reg.ts']).st_ino == inode
+    for dtype_out_time in ['reg.ts', 'reg.av']:
+        with xr.open_dataset(calc.path_out[dtype_out_time]) as ds:
+            for name in ['globe', 'sahel']:
+                xr.testing.assert_allclose(
+                    ds[name], expected.data_out[dtype_out_time][name])
+
+
+def test_save_netcdf_append(tmpdir):
+    path = os.path.join(str(tmpdir), 'reg.nc')
+    year = np.arange(3)
+
+    def dataset(name, value, year=year):
+        return xr.Dataset({name: ('year', np.full(len(year), value))},
+                          coords={'year': year})
+
+    def save(i):
+        with file_lock(path):
+            _save_netcdf(dataset(str(i), i), path, append=True)
+    pool = ThreadPool(4)
+    try:
+        pool.map(save, range(8))
+    finally:
+        pool.close()
+        pool.join()
+    with xr.open_dataset(path) as ds:
+        assert sorted(ds.data_vars) == [str(i) for i in range(8)]
+
+    # Variables of different dimensions cannot be written in place.
+    _save_netcdf(dataset('0', 10., year=np.arange(4)), path, append=True)
+    with xr.open_dataset(path) as ds:
+        assert len(ds.data_vars) == 8
+        assert (ds['0'] == 10.).all()
+
+
+def test_results_store(remove_output_direcs):
+    proj = copy.copy(example_proj)
+    proj.results_store = True
+    calc = _make_calc(proj=proj, intvl_out='ann',
+                      dtype_out_time=['av', 'reg.av'], region=[globe, sahel])
+    calc.compute(write_to_tar=False)
+    store = ResultsStore.for_run(proj, example_model, example_run)
+    [av] = store.load(var='condensation_rain', dtype_out_time='av')
+    xr.testing.assert_allclose(av, calc.data_out['av'])
+    entries = store.query(dtype_out_time='reg.av', intvl_out='ann',
+                          start_year=4, end_year=6)
+    assert sorted(entry['region'] for entry in entries) == ['globe',
+                                                            'sahel']
+    [sahel_av] = store.load(region='sahel')
+    xr.testing.assert_allclose(sahel_av,
+                               calc.data_out['reg.av']['sahel'])
+
+
+def test_add_grid_attributes_lazy():
+    calc = _make_calc(intvl_out='ann', dtype_out_time='av')
+    lat, lon = example_model.lat, example_model.lon
+    ds = xr.Dataset(
+        {'condensation_rain': (('lat', 'lon'), dask.array.zeros(
+            (lat.size, lon.size), chunks=16))},
+        coords={'lat': lat.values, 'lon': lon.values})
+    result = calc._add_grid_attributes(ds)
+    assert isinstance(result['condensation_rain'].data, dask.array.Array)
+    for name in ['sfc_area', 'land_mask']:
+        assert name in result.coords
+        np.testing.assert_array_equal(result[name],
+                                      getattr(example_model, name))
+
+
+def test_add_grid_attributes_mismatch():
+    calc = _make_calc(intvl_out='ann', dtype_out_time='av')
+    lat, lon = example_model.lat, example_model.lon
+    ds = xr.Dataset(
+        {'condensation_rain': (('lat', 'lon'), np.zeros((lat.size,
+                                                         lon.size)))},
+        coords={'lat': lat.values + 1e-10, 'lon': lon.values})
+    result = calc._add_grid_attributes(ds)
+    np.testing.assert_array_equal(result['lat'], lat)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,12 +4,17 @@ from datetime import datetime
 import os
 import unittest
 
+import dask.array
 import numpy as np
 import pytest
 import xarray as xr
 
+from aospy import data_loader
+from aospy.catalog import FileCatalog
 from aospy.data_loader import (DataLoader, DictDataLoader, GFDLDataLoader,
-                               NestedDictDataLoader, grid_attrs_to_aospy_names,
+                               NestedDictDataLoader, InputCache,
+                               _file_chunks, _prune_file_set, _year_range,
+                               grid_attrs_to_aospy_names,
                                set_grid_attrs_as_coords, _sel_var,
                                _prep_time_data,
                                _preprocess_and_rename_grid_attrs,
@@ -19,7 +24,7 @@ from aospy.internal_names import (LAT_STR, LON_STR, TIME_STR, TIME_BOUNDS_STR,
                                   TIME_WEIGHTS_STR, GRID_ATTRS)
 from aospy.utils import io
 from .data.objects.examples import (condensation_rain, convection_rain, precip,
-                                    example_run, ROOT_PATH)
+                                    example_run, precip_files, ROOT_PATH)
 
 
 @pytest.mark.parametrize(
@@ -196,6 +201,24 @@ class TestDataLoader(AospyDataLoaderTestCase):
         result = _preprocess_and_rename_grid_attrs(preprocess_func)(self.ds)
         xr.testing.assert_identical(result, expected)
 
+    def test_preprocess_and_rename_grid_attrs_data_vars(self):
+        ds = self.ds.copy()
+        ds['area'] = ds[self.ALT_LAT_STR]
+        ds['b'] = ds[self.ALT_LAT_STR]
+
+        def preprocess_func(ds, **kwargs):
+            ds['c'] = 2. * ds['a']
+            return ds
+
+        result = _preprocess_and_rename_grid_attrs(
+            preprocess_func, data_vars=['c'])(ds)
+        assert 'c' in result
+        assert SFC_AREA_STR in result
+        assert TIME_BOUNDS_STR in result
+        assert 'a' not in result
+        assert 'b' not in result
+        assert LAT_STR in result.coords
+
 
 class TestDictDataLoader(TestDataLoader):
     def setUp(self):
@@ -273,6 +296,15 @@ class TestGFDLDataLoader(TestDataLoader):
         new = GFDLDataLoader(self.DataLoader, upcast_float32=True)
         self.assertEqual(new.upcast_float32, True)
 
+        new = GFDLDataLoader(self.DataLoader, time_chunks=12)
+        self.assertEqual(new.time_chunks, 12)
+        self.assertEqual(GFDLDataLoader(new).time_chunks, 12)
+
+        self.assertEqual(self.DataLoader.use_catalog, False)
+        new = GFDLDataLoader(self.DataLoader, use_catalog=True)
+        self.assertEqual(new.use_catalog, True)
+        self.assertEqual(GFDLDataLoader(new).use_catalog, True)
+
     def test_maybe_apply_time_offset_inst(self):
         inst_ds = xr.decode_cf(self.inst_ds)
         self.generate_file_set_args['dtype_in_time'] = 'inst'
@@ -456,12 +488,251 @@ class TestGFDLDataLoader(TestDataLoader):
         self.assertEqual(result, expected)
 
 
+def test_input_cache_hit_miss():
+    cache = InputCache(max_bytes=1000)
+    da = xr.DataArray(np.zeros(10))
+    assert cache.get('a') is None
+    cache.put('a', da)
+    result = cache.get('a')
+    xr.testing.assert_identical(result, da)
+    assert result is not da
+    assert cache.stats() == dict(hits=1, misses=1, evictions=0, entries=1,
+                                 nbytes=da.nbytes, max_bytes=1000)
+
+
+def test_input_cache_copies():
+    cache = InputCache(max_bytes=1000)
+    da = xr.DataArray(np.zeros(10), dims=['x'],
+                      coords={'x': np.arange(10), 'y': ('x', np.ones(10))})
+    cache.put('a', da)
+    da.values[0] = 1.
+    result = cache.get('a')
+    result.values[1] = 1.
+    result['y'].values[0] = 0.
+    expected = cache.get('a')
+    assert (expected == 0.).all()
+    assert (expected['y'] == 1.).all()
+
+
+def test_input_cache_lru_eviction():
+    cache = InputCache(max_bytes=200)
+    for key in ['a', 'b']:
+        cache.put(key, xr.DataArray(np.zeros(10)))
+    # Touch 'a' so that 'b' is the least recently used entry.
+    cache.get('a')
+    cache.put('c', xr.DataArray(np.zeros(10)))
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.evictions == 1
+    assert cache.nbytes == 160
+
+
+def test_input_cache_too_large():
+    cache = InputCache(max_bytes=10)
+    cache.put('a', xr.DataArray(np.zeros(10)))
+    assert 'a' not in cache
+    assert cache.nbytes == 0
+
+
+@pytest.fixture
+def file_catalog(tmpdir, monkeypatch):
+    file_catalog = FileCatalog(str(tmpdir.join('catalog.sqlite')))
+    monkeypatch.setattr(data_loader, 'catalog', file_catalog)
+    return file_catalog
+
+
+def _precip_path(year):
+    return os.path.join(os.path.split(ROOT_PATH)[0], 'netcdf',
+                        '000{}0101.precip_monthly.nc'.format(year))
+
+
+@pytest.mark.parametrize(
+    ('start_date', 'end_date', 'expected_years'),
+    [(datetime(4, 1, 1), datetime(4, 12, 31), [4]),
+     (datetime(5, 1, 1), datetime(6, 12, 31), [5, 6]),
+     (datetime(4, 6, 1), datetime(5, 2, 1), [4, 5]),
+     (datetime(6, 1, 1), datetime(6, 1, 31), [6])])
+def test_prune_file_set(file_catalog, start_date, end_date, expected_years):
+    result, entries = _prune_file_set(precip_files, condensation_rain,
+                                      start_date, end_date)
+    assert result == [_precip_path(year) for year in expected_years]
+    assert _year_range(entries) == (expected_years[0], expected_years[-1])
+
+
+def test_prune_file_set_time_offset(file_catalog):
+    # Shifting the year 4 data forward by a year moves it into year 5.
+    result, _ = _prune_file_set(precip_files, condensation_rain,
+                                datetime(5, 3, 1), datetime(5, 12, 31),
+                                time_offset=dict(years=1))
+    assert result == [_precip_path(year) for year in [4, 5, 6]]
+
+    result, _ = _prune_file_set(precip_files, condensation_rain,
+                                datetime(5, 3, 1), datetime(5, 12, 31),
+                                time_offset=dict(days=-20))
+    assert result == [_precip_path(year) for year in [5, 6]]
+
+
+def test_load_variable_use_catalog_time_offset(file_catalog):
+    args = (condensation_rain, datetime(5, 1, 1), datetime(5, 12, 31),
+            dict(years=1))
+    loader = NestedDictDataLoader(example_run.data_loader.file_map)
+    expected = loader.load_variable(*args, intvl_in='monthly',
+                                    use_cache=False)
+    loader = NestedDictDataLoader(example_run.data_loader.file_map,
+                                  use_catalog=True)
+    result = loader.load_variable(*args, intvl_in='monthly', use_cache=False)
+    xr.testing.assert_identical(result, expected)
+    assert result.sizes[TIME_STR] == 12
+
+
+def test_file_chunks(tmpdir):
+    assert _file_chunks(precip_files, {TIME_STR: 6}) == {TIME_STR: 6}
+    path = str(tmpdir.join('xtime.nc'))
+    xr.Dataset({'a': (('XTIME', 'lat'), np.zeros((4, 2)))}).to_netcdf(path)
+    assert _file_chunks([path], {TIME_STR: 2, 'pfull': 1}) == {'XTIME': 2}
+
+
+def test_prune_file_set_no_overlap(file_catalog):
+    result, _ = _prune_file_set(precip_files, condensation_rain,
+                                datetime(1, 1, 1), datetime(1, 12, 31))
+    assert result == [_precip_path(year) for year in [4, 5, 6]]
+
+
+def test_prune_file_set_unknown_extent(file_catalog):
+    file_set = ['a.nc', _precip_path(4), _precip_path(5)]
+    result, entries = _prune_file_set(file_set, condensation_rain,
+                                      datetime(5, 1, 1), datetime(5, 12, 31))
+    assert result == ['a.nc', _precip_path(5)]
+    assert _year_range(entries) == (None, None)
+
+
+def test_prune_file_set_variables(file_catalog):
+    sphum_path = os.path.join(os.path.split(ROOT_PATH)[0], 'netcdf',
+                              '00060101.sphum_monthly.nc')
+    file_set = [_precip_path(6), sphum_path]
+    result, _ = _prune_file_set(file_set, condensation_rain,
+                                datetime(6, 1, 1), datetime(6, 12, 31))
+    assert result == [_precip_path(6)]
+
+    # Variables absent from every file leave the file set unchanged.
+    result, _ = _prune_file_set(file_set, precip, datetime(6, 1, 1),
+                                datetime(6, 12, 31))
+    assert result == file_set
+
+
+def test_catalog_file_set(file_catalog):
+    sphum_path = os.path.join(os.path.split(ROOT_PATH)[0], 'netcdf',
+                              '00060101.sphum_monthly.nc')
+    file_set = [_precip_path(6), sphum_path]
+    args = (file_set, condensation_rain, datetime(6, 1, 1),
+            datetime(6, 12, 31))
+    assert DictDataLoader().use_catalog is False
+    assert DictDataLoader()._catalog_file_set(*args) == (file_set, None)
+    result, _ = DictDataLoader(use_catalog=True)._catalog_file_set(*args)
+    assert result == [_precip_path(6)]
+
+    # A preprocess_func may derive the variable from other fields.
+    loader = DictDataLoader(preprocess_func=lambda ds, **kwargs: ds,
+                            use_catalog=True)
+    result, _ = loader._catalog_file_set(*args)
+    assert result == file_set
+
+
+def test_catalog_persisted(file_catalog, monkeypatch):
+    paths = [_precip_path(4)]
+    entry, = file_catalog.entries(paths)
+    assert entry['time_start'] == (4, 1, 17, 0, 0, 0)
+    assert (entry['extent_start'], entry['extent_end']) == (
+        (4, 1, 1, 0, 0, 0), (5, 1, 1, 0, 0, 0))
+    assert entry['bounded']
+    assert 'condensation_rain' in entry['variables']
+
+    def fail(path):
+        raise AssertionError('File was re-scanned')
+    monkeypatch.setattr('aospy.catalog.scan_file', fail)
+    assert FileCatalog(file_catalog.path).entries(paths) == [entry]
+
+
+def test_catalog_invalidated(file_catalog, tmpdir):
+    path = str(tmpdir.join('data.nc'))
+    ds = xr.Dataset(coords={TIME_STR: ('time', [0., 31.], {
+        'units': 'days since 2000-01-01', 'calendar': 'noleap'})})
+    ds.to_netcdf(path)
+    entry, = file_catalog.entries([path])
+    assert entry['extent_start'] == (2000, 1, 1, 0, 0, 0)
+    assert not entry['bounded']
+
+    ds[TIME_STR] = ('time', [365., 396.], ds[TIME_STR].attrs)
+    ds.to_netcdf(path)
+    os.utime(path, (0, 0))
+    entry, = file_catalog.entries([path])
+    assert entry['extent_start'] == (2001, 1, 1, 0, 0, 0)
+
+
+def test_catalog_build(file_catalog):
+    assert file_catalog.build([precip_files], processes=2) == 3
+    assert file_catalog.build([precip_files], processes=2) == 0
+    file_catalog.clear()
+    assert file_catalog.build([precip_files], processes=1) == 3
+
+
+@pytest.mark.parametrize('use_catalog', [True, False])
+def test_load_variable_use_catalog(file_catalog, monkeypatch, use_catalog):
+    file_sets = []
+    load_data_from_disk = data_loader._load_data_from_disk
+
+    def spy(file_set, *args, **kwargs):
+        file_sets.append(file_set)
+        return load_data_from_disk(file_set, *args, **kwargs)
+    monkeypatch.setattr(data_loader, '_load_data_from_disk', spy)
+    data_loader.input_cache.clear()
+
+    loader = NestedDictDataLoader(example_run.data_loader.file_map,
+                                  use_catalog=use_catalog)
+    result = loader.load_variable(condensation_rain, datetime(5, 1, 1),
+                                  datetime(5, 12, 31), intvl_in='monthly')
+    data_loader.input_cache.clear()
+    expected = xr.open_dataset(_precip_path(5))['condensation_rain']
+    np.testing.assert_array_equal(result.values, expected.values)
+    if use_catalog:
+        assert file_sets == [[_precip_path(5)]]
+    else:
+        assert file_sets == [precip_files]
+
+
 class LoadVariableTestCase(unittest.TestCase):
     def setUp(self):
         self.data_loader = example_run.data_loader
+        data_loader.input_cache.clear()
 
     def tearDown(self):
-        pass
+        data_loader.input_cache.clear()
+
+    def test_load_variable_cached(self):
+        args = (condensation_rain, datetime(5, 1, 1), datetime(5, 12, 31))
+        first = self.data_loader.load_variable(*args, intvl_in='monthly')
+        assert data_loader.input_cache.misses == 1
+        second = self.data_loader.load_variable(*args, intvl_in='monthly')
+        assert data_loader.input_cache.hits == 1
+        xr.testing.assert_identical(first, second)
+
+        self.data_loader.load_variable(condensation_rain, datetime(4, 1, 1),
+                                       datetime(4, 12, 31),
+                                       intvl_in='monthly')
+        assert data_loader.input_cache.misses == 2
+
+        # The output interval does not affect the loaded data.
+        self.data_loader.load_variable(*args, intvl_in='monthly',
+                                       intvl_out='jja')
+        assert data_loader.input_cache.hits == 2
+
+    def test_load_variable_no_cache(self):
+        args = (condensation_rain, datetime(5, 1, 1), datetime(5, 12, 31))
+        self.data_loader.load_variable(*args, intvl_in='monthly',
+                                       use_cache=False)
+        self.assertEqual(len(data_loader.input_cache), 0)
+        self.assertEqual(data_loader.input_cache.misses, 0)
 
     def test_load_variable(self):
         result = self.data_loader.load_variable(
@@ -472,6 +743,17 @@ class LoadVariableTestCase(unittest.TestCase):
         expected = xr.open_dataset(filepath)['condensation_rain']
         np.testing.assert_array_equal(result.values, expected.values)
 
+    def test_load_variable_lazy(self):
+        args = (condensation_rain, datetime(4, 1, 1), datetime(5, 12, 31))
+        expected = self.data_loader.load_variable(*args, intvl_in='monthly')
+        lazy_loader = NestedDictDataLoader(self.data_loader.file_map,
+                                           time_chunks=6)
+        result = lazy_loader.load_variable(*args, intvl_in='monthly')
+        assert isinstance(result.data, dask.array.Array)
+        self.assertEqual(result.chunks[0], (6, 6, 6, 6))
+        self.assertEqual(len(data_loader.input_cache), 1)
+        np.testing.assert_array_equal(result.values, expected.values)
+
     def test_load_variable_float32_to_float64(self):
         def preprocess(ds, **kwargs):
             # This function converts testing data to the float32 datatype
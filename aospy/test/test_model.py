@@ -0,0 +1,112 @@
+"""Test suite for aospy.model module."""
+import copy
+import os
+import pickle
+
+import cloudpickle
+import pytest
+import xarray as xr
+
+from aospy import model as model_module
+from aospy.model import Model, grid_registry
+from .data.objects.examples import example_model, example_run
+
+
+@pytest.fixture
+def model():
+    grid_registry.clear()
+    yield Model(name='example_model',
+                grid_file_paths=copy.deepcopy(example_model.grid_file_paths),
+                runs=[copy.copy(example_run)])
+    grid_registry.clear()
+
+
+def test_grid_data_lazy(model):
+    assert len(grid_registry) == 0
+    assert model.lat.shape == (64,)
+    assert model.sfc_area.shape == (64, 128)
+    assert model.level is None
+    assert model.levs_thick is None
+    with pytest.raises(AttributeError):
+        model.nonexistent_attribute
+    assert 'lat' not in model.__dict__
+    assert grid_registry.stats()['grids'] == 1
+
+
+def test_grid_data_shared(model):
+    other = Model(name='other', grid_file_paths=model.grid_file_paths,
+                  runs=[copy.copy(example_run)])
+    assert other.land_mask is model.land_mask
+    assert grid_registry.stats()['grids'] == 1
+
+
+def test_grid_data_not_pickled(model):
+    model.set_grid_data()
+    pickled = cloudpickle.dumps(model)
+    assert len(pickled) < model.sfc_area.nbytes
+    grid_registry.clear()
+    unpickled = pickle.loads(pickled)
+    assert (unpickled.lat == model.lat).all()
+
+
+def test_grid_data_changed_paths(model):
+    lat = model.lat
+    path = os.path.join(os.path.dirname(model.grid_file_paths[0][0]),
+                        '00040101.precip_monthly.nc')
+    model.grid_file_paths = [path]
+    assert model.lat is not lat
+    assert grid_registry.stats()['grids'] == 2
+
+
+def test_grid_hash(model, monkeypatch):
+    lat_hash = model.grid_hash('lat')
+    assert lat_hash == model_module._values_hash(model.lat)
+    assert model.grid_hash('level') is None
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Grid data re-hashed')
+    monkeypatch.setattr(model_module, '_values_hash', fail)
+    other = Model(name='other', grid_file_paths=model.grid_file_paths,
+                  runs=[copy.copy(example_run)])
+    assert other.grid_hash('lat') == lat_hash
+
+
+def test_grid_cache(tmpdir, model, monkeypatch):
+    cache_dir = str(tmpdir)
+    model.grid_cache_dir = cache_dir
+    saved = []
+    write_atomically = model_module._write_atomically
+
+    def counted_write(path, write):
+        saved.append(path)
+        write_atomically(path, write)
+    monkeypatch.setattr(model_module, '_write_atomically', counted_write)
+    sfc_area = model.sfc_area
+    assert os.listdir(cache_dir) == [model._grid().key + '.nc']
+    assert len(saved) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Grid data recomputed')
+    monkeypatch.setattr(model_module, '_grid_sfc_area', fail)
+    grid_registry.clear()
+    other = Model(name='other', grid_file_paths=model.grid_file_paths,
+                  runs=[copy.copy(example_run)], grid_cache_dir=cache_dir)
+    xr.testing.assert_allclose(other.sfc_area, sfc_area)
+    assert len(saved) == 1
+
+
+def test_grid_key(tmpdir, model, monkeypatch):
+    path = str(tmpdir.join('grid.nc'))
+    ds = xr.Dataset({'precip': (('lat',), [1., 2.])},
+                    coords={'lat': [-45., 45.]})
+    ds.to_netcdf(path)
+    key = grid_registry.key(path)
+    assert grid_registry.key(path) == key
+    os.utime(path, (0, 0))
+    assert grid_registry.key(path) != key
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Grid file re-hashed')
+    key = grid_registry.key(path)
+    monkeypatch.setattr(model_module, '_grid_vars_hash', fail)
+    assert grid_registry.key(path) == key
@@ -1,10 +1,11 @@
+import dask.array
 import numpy as np
 import pytest
 import xarray as xr
 
-from aospy import Region
-from aospy.region import _get_land_mask
-from aospy.internal_names import (LAT_STR, LON_STR,
+from aospy import Region, RegionSet
+from aospy.region import _get_land_mask, mask_cache, RegionMaskCache
+from aospy.internal_names import (LAT_STR, LON_STR, YEAR_STR,
                                   SFC_AREA_STR, LAND_MASK_STR)
 
 
@@ -97,3 +98,92 @@ def test_ts_land_mask(data_for_reg_calcs):
     result = region_land_mask.ts(data_for_reg_calcs)
     expected = xr.DataArray(data_for_reg_calcs.values[3, 0])
     xr.testing.assert_identical(result, expected)
+
+
+def test_ts_lazy(data_for_reg_calcs):
+    expected = region_land_mask.ts(data_for_reg_calcs)
+    result = region_land_mask.ts(data_for_reg_calcs.chunk())
+    assert isinstance(result.data, dask.array.Array)
+    xr.testing.assert_allclose(result.compute(), expected)
+
+
+def test_mask_cache(data_for_reg_calcs):
+    mask_cache.clear()
+    expected = region_land_mask.ts(data_for_reg_calcs)
+    assert mask_cache.stats()['misses'] == 2
+    assert len(mask_cache) == 2
+
+    # Region and grid are unchanged, so the cached mask and weights are used.
+    result = region_land_mask.ts(data_for_reg_calcs.copy(deep=True) * 1.)
+    xr.testing.assert_identical(result, expected)
+    assert mask_cache.stats()['hits'] == 1
+
+    # A different land mask on the same grid invalidates the weights.
+    data = data_for_reg_calcs.copy(deep=True)
+    data[LAND_MASK_STR] = data[LAND_MASK_STR] * 0. + 1.
+    result = region_land_mask.ts(data)
+    xr.testing.assert_identical(result, region_no_land_mask.ts(data))
+
+    mask_cache.clear()
+    assert len(mask_cache) == 0
+    assert mask_cache.stats()['hits'] == 0
+
+
+def test_mask_cache_bounded():
+    cache = RegionMaskCache(max_entries=2)
+    for key in range(3):
+        cache.put(key, key)
+    assert len(cache) == 2
+    assert 0 not in cache
+    assert cache.get(2) == 2
+    assert cache.stats()['evictions'] == 1
+
+    disabled = RegionMaskCache(max_entries=0)
+    disabled.put(0, 0)
+    assert disabled.get(0) is None
+
+
+region_ocean = Region(
+    name='ocean',
+    description='Test region with ocean mask spanning two rectangles',
+    mask_bounds=[((-20., 5.), (0., 5.)), ((5., 30.), (5., 20.))],
+    do_land_mask='ocean'
+)
+
+
+@pytest.fixture()
+def region_set():
+    land = Region(name='land', lat_bounds=(0., 90.), lon_bounds=(0., 5.),
+                  do_land_mask=True)
+    return RegionSet([region_no_land_mask, land, region_ocean])
+
+
+@pytest.fixture()
+def yearly_data_for_reg_calcs(data_for_reg_calcs):
+    years = xr.DataArray([1, 2, 3], dims=[YEAR_STR], coords=[[1, 2, 3]])
+    data = data_for_reg_calcs * years
+    data[0, 1, 1] = np.nan
+    return data.transpose(LAT_STR, YEAR_STR, LON_STR)
+
+
+def test_region_set_weights(data_for_reg_calcs, region_set):
+    weights = region_set.weights(data_for_reg_calcs)
+    assert weights.shape == (3, data_for_reg_calcs.size)
+    assert weights.nnz == 6
+    assert region_set.weights(data_for_reg_calcs) is weights
+
+
+@pytest.mark.parametrize('method', ['ts', 'av', 'std'])
+def test_region_set(yearly_data_for_reg_calcs, region_set, method):
+    result = getattr(region_set, method)(yearly_data_for_reg_calcs)
+    assert set(result.data_vars) == {'test', 'land', 'ocean'}
+    for region in region_set.regions:
+        expected = getattr(region, method)(yearly_data_for_reg_calcs)
+        xr.testing.assert_allclose(result[region.name], expected)
+
+
+def test_region_set_lazy(yearly_data_for_reg_calcs, region_set):
+    expected = region_set.ts(yearly_data_for_reg_calcs)
+    result = region_set.ts(yearly_data_for_reg_calcs.chunk())
+    assert isinstance(result['test'].data, dask.array.Array)
+    xr.testing.assert_allclose(result.compute(), expected)
@@ -0,0 +1,75 @@
+"""Test suite for aospy.results module."""
+import os
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from aospy.results import ENTRY_FIELDS, ResultsStore
+
+
+def _entry(**fields):
+    entry = {field: None for field in ENTRY_FIELDS}
+    entry.update(var='precip', dtype_out_time='av', start_year=4,
+                 end_year=6)
+    entry.update(fields)
+    return entry
+
+
+def _data(value, name='precip'):
+    return xr.DataArray(np.full((2, 3), value), dims=['lat', 'lon'],
+                        coords={'lat': [0., 1.], 'lon': [0., 1., 2.]},
+                        name=name, attrs={'units': 'mm/day'})
+
+
+@pytest.fixture
+def store(tmpdir):
+    return ResultsStore(os.path.join(str(tmpdir), 'results.nc'))
+
+
+def test_add_query_load(store):
+    store.add(_data(1.), **_entry())
+    store.add(_data(2.), **_entry(dtype_out_time='ts'))
+    store.add(_data(3., name='globe'), **_entry(region='globe'))
+    assert len(store.query()) == 3
+    assert store.load(var='condensation_rain') == []
+    assert [entry['dtype_out_time'] for entry in
+            store.query(var='precip', region=None)] == ['av', 'ts']
+    [result] = store.load(dtype_out_time='av', region=None)
+    assert result.attrs['units'] == 'mm/day'
+    # Outputs loaded earlier remain usable after others are added.
+    store.add(_data(4.), **_entry(dtype_out_time='std'))
+    xr.testing.assert_identical(result, _data(1.))
+    [result] = store.load(region='globe')
+    assert float(result.mean()) == 3.
+    assert len(store.load(dtype_out_time=['av', 'ts'])) == 3
+    assert len(store.query()) == 4
+    with pytest.raises(ValueError):
+        store.query(variable='precip')
+    with pytest.raises(ValueError):
+        store.add(_data(1.), var='precip')
+
+
+def test_replace_and_compact(store):
+    for value in [1., 2., 3.]:
+        store.add(_data(value), **_entry())
+    store.add(_data(4.), **_entry(end_year=7))
+    results = store.load()
+    assert [float(result.mean()) for result in results] == [3., 4.]
+    size = os.path.getsize(store.path)
+    store.compact()
+    assert os.path.getsize(store.path) < size
+    # Outputs loaded before compacting are unaffected by it.
+    assert [float(result.mean()) for result in results] == [3., 4.]
+    assert [entry['group'] for entry in store.query()] == ['result0',
+                                                           'result1']
+    assert [float(result.mean()) for result in store.load()] == [3., 4.]
+
+
+def test_index_rebuilt(store):
+    store.add(_data(1.), **_entry())
+    store.add(_data(2.), **_entry())
+    store.add(_data(3.), **_entry(var='condensation_rain'))
+    expected = store.query()
+    os.remove(store.path + '.index')
+    assert ResultsStore(store.path).query() == expected
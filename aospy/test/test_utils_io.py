@@ -1,6 +1,11 @@
 #!/usr/bin/env python
 """Test suite for aospy.io module."""
+import os
+import shutil
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
 import aospy.utils.io as io
@@ -24,6 +29,58 @@ class TestIO(AospyIOTestCase):
                  'gfdl.ncrc3-default-repro/1/history/'
                  '00010101.atmos_month.nc')
 
+    def test_replace_file(self):
+        direc = tempfile.mkdtemp()
+        try:
+            src, dst = [os.path.join(direc, name) for name in ('src', 'dst')]
+            for path, text in [(src, 'new'), (dst, 'old')]:
+                with open(path, 'w') as f:
+                    f.write(text)
+            io.replace_file(src, dst)
+            self.assertFalse(os.path.exists(src))
+            with open(dst) as f:
+                self.assertEqual(f.read(), 'new')
+        finally:
+            shutil.rmtree(direc)
+
+    def test_file_lock(self):
+        direc = tempfile.mkdtemp()
+        path = os.path.join(direc, 'sub', 'file.nc')
+        fcntl = io.fcntl
+        try:
+            for value in [fcntl, None]:
+                io.fcntl = value
+                with io.file_lock(path):
+                    self.assertTrue(os.path.exists(path + '.lock'))
+                self.assertFalse(os.path.exists(path + '.lock'))
+        finally:
+            io.fcntl = fcntl
+            shutil.rmtree(direc)
+
+    def test_file_lock_waits_for_lock_file(self):
+        direc = tempfile.mkdtemp()
+        path = os.path.join(direc, 'file.nc')
+        acquired = []
+
+        def lock():
+            with io.file_lock(path, poll_interval=0.01):
+                acquired.append(os.path.exists(path + '.held'))
+        fcntl, io.fcntl = io.fcntl, None
+        try:
+            # Simulate another process holding the lock.
+            open(path + '.lock', 'w').close()
+            thread = threading.Thread(target=lock)
+            thread.start()
+            time.sleep(0.1)
+            self.assertEqual(acquired, [])
+            open(path + '.held', 'w').close()
+            os.remove(path + '.lock')
+            thread.join(10)
+            self.assertEqual(acquired, [True])
+        finally:
+            io.fcntl = fcntl
+            shutil.rmtree(direc)
+
 
 if __name__ == '__main__':
     sys.exit(unittest.main())
@@ -2,6 +2,7 @@
 """Test suite for aospy.timedate module."""
 import datetime
 
+import dask.array
 import numpy as np
 import pandas as pd
 import pytest
@@ -18,12 +19,16 @@ from aospy.utils.times import (
     average_time_bounds,
     monthly_mean_ts,
     monthly_mean_at_each_ind,
+    deviation_from_monthly_mean,
     ensure_datetime,
     datetime_or_default,
     numpy_datetime_range_workaround,
     numpy_datetime_workaround_encode_cf,
     month_indices,
     _month_conditional,
+    _month_codes,
+    _decode_extreme_dates,
+    _datetime_field,
     extract_months,
     ensure_time_avg_has_cf_metadata,
     _assert_has_data_for_time,
@@ -32,7 +37,11 @@ from aospy.utils.times import (
     ensure_time_as_dim,
     convert_scalar_to_indexable_coord,
     sel_time,
-    yearly_average
+    yearly_average,
+    decode_cf,
+    to_date_type,
+    _CFTIMEINDEX,
+    _yearly_average_groupby
 )
 
 
@@ -160,7 +169,9 @@ def test_numpy_datetime_range_workaround():
         datetime.datetime(pd.Timestamp.min.year + 4, 1, 1))
 
 
-def test_numpy_datetime_workaround_encode_cf():
+def test_numpy_datetime_workaround_encode_cf(monkeypatch):
+    monkeypatch.setattr('aospy.utils.times._CFTIMEINDEX', False)
+
     def create_test_data(days, ref_units, expected_units):
         # 1095 days corresponds to three years in a noleap calendar
         # This allows us to generate ranges which straddle the
@@ -243,6 +254,108 @@ def test_numpy_datetime_workaround_encode_cf():
     assert max_yr == 2265
 
 
+@pytest.mark.parametrize(
+    ('days', 'units', 'years', 'expected_units'),
+    [(10., 'days since 2000-01-01 00:00:00', (2000, 2003),
+      'days since 2000-01-01 00:00:00'),
+     (255169., 'days since 0001-01-01 00:00:00', (700, 703),
+      'days since 979-01-01 00:00:00'),
+     (2., 'days since 2262-01-01 00:00:00', (2262, 2265),
+      'days since 1678-01-01 00:00:00')])
+def test_numpy_datetime_workaround_encode_cf_known_years(
+        days, units, years, expected_units, monkeypatch):
+    monkeypatch.setattr('aospy.utils.times._CFTIMEINDEX', False)
+    time = xr.DataArray([days, days + 1095.], dims=[TIME_STR])
+    ds = xr.Dataset(coords={TIME_STR: time})
+    ds[TIME_STR].attrs['units'] = units
+    ds[TIME_STR].attrs['calendar'] = 'noleap'
+    actual, min_yr, max_yr = numpy_datetime_workaround_encode_cf(
+        ds, *years)
+    assert actual[TIME_STR].attrs['units'] == expected_units
+    assert (min_yr, max_yr) == years
+
+
+requires_cftimeindex = pytest.mark.skipif(
+    not _CFTIMEINDEX, reason='requires cftime and xarray >= 0.10.3')
+
+
+@requires_cftimeindex
+@pytest.mark.parametrize(('units', 'dtype'),
+                         [('days since 0700-01-01', object),
+                          ('days since 2000-01-01', 'datetime64[ns]')])
+def test_decode_cf(units, dtype):
+    time = xr.DataArray([0., 1095.], dims=[TIME_STR],
+                        attrs={'units': units, 'calendar': 'noleap'})
+    ds = xr.Dataset(coords={TIME_STR: time})
+    actual, min_yr, max_yr = numpy_datetime_workaround_encode_cf(ds)
+    assert actual[TIME_STR].attrs['units'] == units
+    decoded = decode_cf(actual, min_yr, max_yr)
+    assert decoded[TIME_STR].dtype == dtype
+    year = int(units.split()[2][:4])
+    np.testing.assert_array_equal(
+        _datetime_field(decoded[TIME_STR].values, 'year'), [year, year + 3])
+
+
+def test_to_date_type(time_360_day):
+    date = datetime.datetime(4, 12, 31)
+    assert to_date_type(date, np.datetime64('2000-01-01')) == np.datetime64(
+        '0004-12-31')
+    actual = to_date_type(date, time_360_day.values[0])
+    assert type(actual) is type(time_360_day.values[0])
+    assert (actual.year, actual.month, actual.day) == (4, 12, 30)
+
+
+@requires_cftimeindex
+def test_apply_time_offset_cftime(time_360_day):
+    actual = apply_time_offset(time_360_day, years=1, months=1, days=-1,
+                               hours=3)
+    desired = [date.replace(year=date.year + 1 + date.month // 12,
+                            month=date.month % 12 + 1) -
+               datetime.timedelta(days=1, hours=-3)
+               for date in time_360_day.values]
+    np.testing.assert_array_equal(np.asarray(actual), desired)
+
+
+@pytest.fixture
+def submonthly_noleap():
+    time = xr.DataArray(np.arange(0., 365. * 2, 0.25) + 3. / 24.,
+                        dims=[TIME_STR],
+                        attrs={'units': 'days since 0001-01-01',
+                               'calendar': 'noleap'})
+    time = decode_cf(xr.Dataset(coords={TIME_STR: time}), 1, 2)[TIME_STR]
+    return xr.DataArray(np.random.random((len(time), 2)),
+                        dims=[TIME_STR, 'lon'],
+                        coords={TIME_STR: time, 'lon': [0., 1.]}, name='a')
+
+
+@requires_cftimeindex
+def test_monthly_mean_ts_cftime(submonthly_noleap):
+    arr = submonthly_noleap
+    actual = monthly_mean_ts(arr)
+    assert actual.sizes[TIME_STR] == 24
+    ends = actual[TIME_STR].values
+    assert (ends[0].year, ends[0].month, ends[0].day) == (1, 1, 31)
+    assert (ends[1].year, ends[1].month, ends[1].day) == (1, 2, 28)
+    np.testing.assert_allclose(
+        actual.values[0], arr.isel(**{TIME_STR: slice(0, 124)}).mean(
+            TIME_STR))
+    # Lazy arrays are grouped by month instead.
+    xr.testing.assert_allclose(monthly_mean_ts(arr.chunk()).load(), actual)
+
+
+@requires_cftimeindex
+def test_deviation_from_monthly_mean_cftime(submonthly_noleap):
+    arr = submonthly_noleap
+    monthly_means = monthly_mean_ts(arr).isel(**{TIME_STR: slice(1, 3)})
+    desired = arr - monthly_mean_at_each_ind(monthly_means, arr)
+    assert desired.isel(**{TIME_STR: slice(0, 124)}).isnull().all()
+    np.testing.assert_allclose(
+        desired.isel(**{TIME_STR: slice(124, 236)}),
+        arr.isel(**{TIME_STR: slice(124, 236)}) - monthly_means[0])
+    actual = deviation_from_monthly_mean(arr, monthly_means)
+    xr.testing.assert_allclose(actual, desired)
+
+
 def test_month_indices():
     np.testing.assert_array_equal(month_indices('ann'), range(1, 13))
     np.testing.assert_array_equal(month_indices('jja'),
@@ -286,6 +399,60 @@ def test_month_conditional():
                                   np.array([False, False]))
 
 
+@pytest.fixture
+def time_360_day():
+    time = xr.DataArray(np.arange(0., 720., 30.), dims=[TIME_STR],
+                        attrs={'units': 'days since 0001-01-01',
+                               'calendar': '360_day'})
+    ds = xr.decode_cf(xr.Dataset(coords={TIME_STR: time}))
+    return ds[TIME_STR]
+
+
+def test_decode_extreme_dates():
+    time = xr.DataArray([1095., 0., 30.], dims=[TIME_STR],
+                        attrs={'units': 'days since 0004-01-01',
+                               'calendar': 'noleap'})
+    extremes = _decode_extreme_dates(time)
+    np.testing.assert_array_equal(_datetime_field(extremes, 'year'), [4, 7])
+
+    time.attrs['units'] = 'days since 2000-01-01'
+    extremes = _decode_extreme_dates(time)
+    assert np.issubdtype(extremes.dtype, np.datetime64)
+    np.testing.assert_array_equal(_datetime_field(extremes, 'year'),
+                                  [2000, 2003])
+
+
+def test_datetime_field_non_standard_calendar(time_360_day):
+    np.testing.assert_array_equal(_datetime_field(time_360_day, 'year'),
+                                  np.repeat([1, 2], 12))
+    np.testing.assert_array_equal(_datetime_field(time_360_day, 'month'),
+                                  np.tile(np.arange(1, 13), 2))
+    np.testing.assert_array_equal(
+        _month_conditional(time_360_day, 'djf'),
+        np.tile(np.arange(1, 13), 2) % 12 < 3)
+
+
+def test_yearly_average_non_standard_calendar(time_360_day):
+    arr = xr.DataArray(np.arange(24.), dims=[TIME_STR],
+                       coords={TIME_STR: time_360_day})
+    actual = yearly_average(arr, xr.ones_like(arr))
+    desired = xr.DataArray([5.5, 17.5], dims=['year'],
+                           coords={'year': [1, 2]})
+    xr.testing.assert_allclose(actual, desired)
+
+
+def test_month_codes_memoized():
+    times = pd.date_range('2000-01-01', freq='6H', periods=10)
+    time = xr.DataArray(times, dims=[TIME_STR], coords=[times])
+    codes = _month_codes(time)
+    np.testing.assert_array_equal(codes, times.month)
+    assert _month_codes(time.copy(deep=True)) is codes
+
+    shifted = time + np.timedelta64(40, 'D')
+    np.testing.assert_array_equal(_month_codes(shifted),
+                                  (times + pd.Timedelta(days=40)).month)
+
+
 def test_extract_months():
     time = xr.DataArray(pd.date_range(start='2001-02-18', end='2002-07-12',
                                       freq='1D'), dims=[TIME_STR])
@@ -500,6 +667,39 @@ def test_sel_time():
     assert result[SUBSET_END_DATE_STR].values == end_date
 
 
+@pytest.fixture
+def submonthly_with_gap():
+    time = pd.date_range('2000-01-01 03:00', freq='6H', periods=4 * 150)
+    time = time[(time.month != 3)]
+    arr = xr.DataArray(np.random.random((3, len(time), 2)),
+                       dims=['lat', TIME_STR, 'lon'],
+                       coords={TIME_STR: time, 'lat': [1., 2., 3.],
+                               'lon': [0., 1.]}, name='a')
+    arr[1, :20, 0] = np.nan
+    return arr
+
+
+def test_monthly_mean_ts_matches_resample(submonthly_with_gap):
+    arr = submonthly_with_gap
+    desired = arr.resample('1M', TIME_STR, how='mean').dropna(TIME_STR)
+    actual = monthly_mean_ts(arr)
+    assert desired.identical(actual)
+
+
+def test_deviation_from_monthly_mean(submonthly_with_gap):
+    arr = submonthly_with_gap
+    monthly_means = monthly_mean_ts(arr)
+    desired = arr - monthly_mean_at_each_ind(monthly_means, arr)
+    actual = deviation_from_monthly_mean(arr, monthly_means)
+    xr.testing.assert_identical(actual, desired)
+
+    # Means for only some of the months
+    monthly_means = monthly_means.isel(**{TIME_STR: slice(1, 3)})
+    desired = arr - monthly_mean_at_each_ind(monthly_means, arr)
+    actual = deviation_from_monthly_mean(arr, monthly_means)
+    xr.testing.assert_identical(actual, desired)
+
+
 def test_yearly_average_no_mask():
     times = pd.to_datetime(['2000-06-01', '2000-06-15',
                             '2001-07-04', '2001-10-01', '2001-12-31',
@@ -521,6 +721,17 @@ def test_yearly_average_no_mask():
     xr.testing.assert_allclose(actual, desired)
 
 
+def test_yearly_average_lazy():
+    times = pd.date_range('2000-01-01', freq='1M', periods=36)
+    arr = xr.DataArray(np.random.random((len(times),)),
+                       dims=[TIME_STR], coords={TIME_STR: times})
+    dt = xr.ones_like(arr)
+    expected = yearly_average(arr, dt)
+    actual = yearly_average(arr.chunk({TIME_STR: 12}), dt)
+    assert isinstance(actual.data, dask.array.Array)
+    xr.testing.assert_allclose(actual.compute(), expected)
+
+
 def test_yearly_average_masked_data():
     times = pd.to_datetime(['2000-06-01', '2000-06-15',
                             '2001-07-04', '2001-10-01', '2001-12-31',
@@ -544,6 +755,35 @@ def test_yearly_average_masked_data():
     xr.testing.assert_allclose(actual, desired)
 
 
+@pytest.mark.parametrize('chunks', [None, 5, 17])
+def test_yearly_average_matches_groupby(chunks):
+    times = pd.date_range('2000-01-01', freq='1M', periods=40)
+    arr = xr.DataArray(np.random.random((3, len(times), 2)),
+                       dims=['lat', TIME_STR, 'lon'],
+                       coords={TIME_STR: times, 'lat': [1., 2., 3.],
+                               'lon': [0., 1.]})
+    arr[0, :14, 0] = np.nan
+    arr[1, 3, 1] = np.nan
+    dt = xr.DataArray(np.random.random((len(times),)), dims=[TIME_STR],
+                      coords={TIME_STR: times})
+    expected = _yearly_average_groupby(arr, dt)
+    if chunks is not None:
+        arr = arr.chunk({TIME_STR: chunks})
+    actual = yearly_average(arr, dt)
+    assert actual.dims == expected.dims
+    xr.testing.assert_allclose(actual.compute(), expected)
+
+
+def test_yearly_average_unsorted_times():
+    times = pd.to_datetime(['2001-06-01', '2000-06-15', '2001-07-04'])
+    arr = xr.DataArray(np.random.random((len(times),)),
+                       dims=[TIME_STR], coords={TIME_STR: times})
+    dt = xr.ones_like(arr)
+    actual = yearly_average(arr, dt)
+    expected = _yearly_average_groupby(arr, dt)
+    xr.testing.assert_identical(actual, expected)
+
+
 def test_average_time_bounds(ds_time_encoded_cf):
     ds = ds_time_encoded_cf
     actual = average_time_bounds(ds)[TIME_STR]
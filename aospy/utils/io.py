@@ -1,9 +1,19 @@
 """Utility functions for data input and output."""
+from contextlib import contextmanager
+import errno
 import logging
+import os
 import subprocess
+import threading
+import time
 
 import numpy as np
 
+try:
+    import fcntl
+except ImportError:  # e.g. on Windows
+    fcntl = None
+
 
 def _robust_bool(obj):
     try:
@@ -12,6 +22,15 @@ def _robust_bool(obj):
         return obj.any()
 
 
+def hashable(obj):
+    """Convert lists and dicts to (possibly nested) tuples for hashing."""
+    if isinstance(obj, dict):
+        return tuple(sorted((k, hashable(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(hashable(o) for o in obj)
+    return obj
+
+
 def get_parent_attr(obj, attr, strict=False):
     """Search recursively through an object and its parent for an attribute.
 
@@ -170,3 +189,107 @@ def dmget(files_list):
         subprocess.call(['dmget'] + files_list)
     except OSError:
         logging.debug('dmget command not found in this machine')
+
+
+def replace_file(src, dst):
+    """Rename a file, replacing the destination if it exists.
+
+    Unlike ``os.rename``, this also works on Windows when the destination
+    exists.  On Python 3 the replacement is atomic (via ``os.replace``); on
+    Python 2 under Windows, the destination is removed before renaming.
+
+    Parameters
+    ----------
+    src, dst : str
+        Current and new path of the file
+    """
+    try:
+        replace = os.replace
+    except AttributeError:
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+    else:
+        replace(src, dst)
+
+
+_THREAD_LOCKS = {}
+_THREAD_LOCKS_LOCK = threading.Lock()
+
+
+def _lock_file_flock(lock_path):
+    """Create and ``flock`` the lock file, returning its open file object."""
+    while True:
+        lock_file = open(lock_path, 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # The previous holder of the lock removes the file upon releasing
+        # it, in which case the lock is not held on the file now at
+        # lock_path, and must be taken again.
+        try:
+            locked, current = os.fstat(lock_file.fileno()), os.stat(lock_path)
+        except OSError:
+            pass
+        else:
+            if (locked.st_dev, locked.st_ino) == (current.st_dev,
+                                                  current.st_ino):
+                return lock_file
+        lock_file.close()
+
+
+def _lock_file_exclusive(lock_path, poll_interval):
+    """Exclusively create the lock file, waiting while it exists."""
+    while True:
+        try:
+            return os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        time.sleep(poll_interval)
+
+
+@contextmanager
+def file_lock(path, poll_interval=0.05):
+    """Hold an exclusive lock on a file, e.g. while writing to it.
+
+    The lock is held across threads of this process and across processes,
+    via a ``.lock`` file alongside the given path, which is removed when the
+    lock is released.  Where ``fcntl`` is available, the lock file is locked
+    with ``flock``, which is released even if the process is killed.
+    Elsewhere (e.g. on Windows), the lock is taken by exclusively creating
+    the lock file, waiting while it exists; a lock file left behind by a
+    killed process must then be removed by hand.  The directory of the path
+    is created if necessary.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file to lock
+    poll_interval : float, optional
+        Seconds to wait between attempts to create the lock file, where
+        ``fcntl`` is not available
+    """
+    with _THREAD_LOCKS_LOCK:
+        thread_lock = _THREAD_LOCKS.setdefault(os.path.abspath(path),
+                                               threading.Lock())
+    with thread_lock:
+        direc = os.path.dirname(path)
+        if direc and not os.path.isdir(direc):
+            try:
+                os.makedirs(direc)
+            except OSError:
+                pass
+        lock_path = path + '.lock'
+        if fcntl is not None:
+            lock_file = _lock_file_flock(lock_path)
+            try:
+                yield
+            finally:
+                os.remove(lock_path)
+                lock_file.close()
+        else:
+            fd = _lock_file_exclusive(lock_path, poll_interval)
+            try:
+                yield
+            finally:
+                os.close(fd)
+                os.remove(lock_path)
@@ -1,16 +1,37 @@
 """Utility functions for handling times, dates, etc."""
+from collections import OrderedDict
 import datetime
+from distutils.version import LooseVersion
+import hashlib
+import threading
+import warnings
 
 import numpy as np
 import pandas as pd
+import scipy.sparse
 import xarray as xr
 
 from ..internal_names import (
     BOUNDS_STR, GRID_ATTRS_NO_TIMES, RAW_END_DATE_STR, RAW_START_DATE_STR,
     SUBSET_END_DATE_STR, SUBSET_START_DATE_STR, TIME_BOUNDS_STR, TIME_STR,
-    TIME_VAR_STRS, TIME_WEIGHTS_STR
+    TIME_VAR_STRS, TIME_WEIGHTS_STR, YEAR_STR
 )
 
+try:
+    import cftime
+except ImportError:
+    cftime = None
+
+# xarray can index times by cftime dates (via a CFTimeIndex) as of v0.10.3.
+# Before v0.11 this must be enabled using ``xr.set_options``, whereafter
+# dates that numpy.datetime64 cannot represent are always decoded as such.
+_CFTIMEINDEX = (cftime is not None and
+                LooseVersion(xr.__version__) >= LooseVersion('0.10.3'))
+_CFTIMEINDEX_OPTION = (_CFTIMEINDEX and
+                       LooseVersion(xr.__version__) < LooseVersion('0.11'))
+if _CFTIMEINDEX:
+    from xarray.coding.cftimeindex import CFTimeIndex
+
 
 def apply_time_offset(time, years=0, months=0, days=0, hours=0):
     """Apply a specified offset to the given time array.
@@ -32,7 +53,7 @@ def apply_time_offset(time, years=0, months=0, days=0, hours=0):
 
     Returns
     -------
-    pandas.DatetimeIndex
+    pandas.DatetimeIndex, or xarray.CFTimeIndex if the times are cftime dates
 
     Examples
     --------
@@ -50,11 +71,72 @@ def apply_time_offset(time, years=0, months=0, days=0, hours=0):
     DatetimeIndex(['1900-01-01', '1899-02-01'], dtype='datetime64[ns]',
                   freq=None)
     """
+    values = np.asarray(time.values)
+    if values.dtype == object:
+        delta = datetime.timedelta(days=days, hours=hours)
+        return _time_index([_add_months(date, 12 * years + months) + delta
+                            for date in values.ravel()])
     return (pd.to_datetime(time.values) +
             pd.tseries.offsets.DateOffset(years=years, months=months,
                                           days=days, hours=hours))
 
 
+def _time_index(dates):
+    """Index of cftime dates, to be used as a time coordinate."""
+    if _CFTIMEINDEX:
+        return CFTimeIndex(dates)
+    return pd.Index(dates)
+
+
+def _replace_date(date_type, year, month, day, *args):
+    """Date of the given type, clipping the day to the end of the month.
+
+    The day is clipped to the last day of the month in the calendar of the
+    date type if needed, e.g. February 29th becomes February 28th in a
+    noleap calendar, and the 31st of any month becomes the 30th in a 360-day
+    calendar.
+    """
+    while True:
+        try:
+            return date_type(year, month, day, *args)
+        except ValueError:
+            if day <= 28:
+                raise
+            day -= 1
+
+
+def _add_months(date, months):
+    """Shift a cftime date by a number of months, as pd.DateOffset does."""
+    if not months:
+        return date
+    month = date.month - 1 + months
+    return _replace_date(type(date), date.year + month // 12, month % 12 + 1,
+                         date.day, date.hour, date.minute, date.second,
+                         date.microsecond)
+
+
+def to_date_type(date, example):
+    """Convert a datetime.datetime to the type of dates of a time array.
+
+    Parameters
+    ----------
+    date : datetime.datetime
+    example : np.datetime64 or cftime date
+        A time value of the array
+
+    Returns
+    -------
+    np.datetime64 or cftime date
+        For cftime dates, the day is clipped to the end of the month in the
+        calendar of the dates (see ``_replace_date``).
+    """
+    if isinstance(example, np.datetime64):
+        return np.datetime64(date)
+    return _replace_date(type(example), date.year, date.month, date.day,
+                         date.hour, date.minute, date.second,
+                         date.microsecond)
+
+
 def average_time_bounds(ds):
     """Return the average of each set of time bounds in the Dataset.
 
@@ -97,6 +179,10 @@ def monthly_mean_ts(arr):
 
     Also drops any months with no data in the original DataArray.
 
+    For in-memory floating point data with sorted times, the mean is taken
+    directly over the contiguous block of timesteps within each month (see
+    ``_month_segments``); otherwise the data are resampled using pandas.
+
     Parameters
     ----------
     arr : xarray.DataArray
@@ -111,7 +197,41 @@ def monthly_mean_ts(arr):
     --------
     monthly_mean_at_each_ind : Copy monthly means to each submonthly time
     """
-    return arr.resample('1M', TIME_STR, how='mean').dropna(TIME_STR)
+    segments = _month_segments_if_vectorizable(arr)
+    if segments is None:
+        if arr[TIME_STR].dtype == object:
+            return _monthly_mean_ts_groupby(arr)
+        return arr.resample('1M', TIME_STR, how='mean').dropna(TIME_STR)
+    starts, month_keys, _ = segments
+    axis = arr.get_axis_num(TIME_STR)
+    values = np.moveaxis(arr.values, axis, 0)
+    means = np.empty((len(starts),) + values.shape[1:], dtype=values.dtype)
+    with warnings.catch_warnings():
+        # Months with no valid data at a point have a mean of NaN.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i, (start, end) in enumerate(zip(
+                starts, np.append(starts[1:], len(values)))):
+            means[i] = np.nanmean(values[start:end], axis=0)
+    data = np.moveaxis(means, 0, axis)
+    coords = {name: coord for name, coord in arr.coords.items()
+              if TIME_STR not in coord.dims}
+    coords[TIME_STR] = _month_end_dates(month_keys, arr[TIME_STR].values)
+    return xr.DataArray(data, dims=arr.dims, coords=coords,
+                        name=arr.name).dropna(TIME_STR)
+
+
+def _monthly_mean_ts_groupby(arr):
+    """Monthly means by grouping the timesteps by month.
+
+    Used for cftime dates, which pandas cannot resample.
+    """
+    keys = xr.DataArray(_month_keys(arr[TIME_STR].values), dims=[TIME_STR],
+                        coords={TIME_STR: arr[TIME_STR]}, name='month_key')
+    means = arr.groupby(keys).mean(TIME_STR)
+    means = means.rename({'month_key': TIME_STR}).transpose(*arr.dims)
+    means[TIME_STR] = _month_end_dates(means[TIME_STR].values,
+                                       arr[TIME_STR].values)
+    return means.dropna(TIME_STR)
 
 
 def monthly_mean_at_each_ind(monthly_means, sub_monthly_timeseries):
@@ -132,8 +252,12 @@ def monthly_mean_at_each_ind(monthly_means, sub_monthly_timeseries):
     See Also
     --------
     monthly_mean_ts : Create timeseries of monthly mean values
+    deviation_from_monthly_mean : Subtract the monthly means from a timeseries
     """
     time = monthly_means[TIME_STR]
+    if time.dtype == object:
+        return _monthly_mean_at_each_ind_cftime(monthly_means,
+                                                sub_monthly_timeseries)
     start = time.indexes[TIME_STR][0].replace(day=1, hour=0)
     end = time.indexes[TIME_STR][-1]
     new_indices = pd.DatetimeIndex(start=start, end=end, freq='MS')
@@ -141,6 +265,141 @@ def monthly_mean_at_each_ind(monthly_means, sub_monthly_timeseries):
     return arr_new.reindex_like(sub_monthly_timeseries, method='pad')
 
 
+def _monthly_mean_at_each_ind_cftime(monthly_means, sub_monthly_timeseries):
+    """Version of ``monthly_mean_at_each_ind`` for cftime dates.
+
+    As for np.datetime64 dates, months without a mean take that of the next
+    month with one, or of the last month if there is none, and times before
+    the first month with a mean are NaN.
+    """
+    mean_keys = _month_keys(monthly_means[TIME_STR].values)
+    keys = _month_keys(sub_monthly_timeseries[TIME_STR].values)
+    inds = np.minimum(np.searchsorted(mean_keys, keys), len(mean_keys) - 1)
+    arr = monthly_means.isel(**{TIME_STR: inds})
+    arr[TIME_STR] = sub_monthly_timeseries.indexes[TIME_STR]
+    return arr.where(xr.DataArray(keys >= mean_keys[0], dims=[TIME_STR],
+                                  coords={TIME_STR: arr[TIME_STR]}))
+
+
+def deviation_from_monthly_mean(sub_monthly_timeseries, monthly_means):
+    """Subtract from each value the mean over the month containing it.
+
+    Equivalent to ``sub_monthly_timeseries - monthly_mean_at_each_ind(
+    monthly_means, sub_monthly_timeseries)``, but for in-memory data the
+    monthly means are subtracted one month at a time, without constructing
+    the array of monthly means repeated at each time.
+
+    Parameters
+    ----------
+    sub_monthly_timeseries : xarray.DataArray
+        array of a timeseries at sub-monthly time resolution
+    monthly_means : xarray.DataArray
+        array of monthly means, e.g. from ``monthly_mean_ts``
+
+    Returns
+    -------
+    xarray.DataArray
+        The deviations from the monthly means, at each time of
+        ``sub_monthly_timeseries``
+
+    See Also
+    --------
+    monthly_mean_at_each_ind : Copy monthly means to each submonthly time
+    """
+    arr = sub_monthly_timeseries
+    segments = _month_segments_if_vectorizable(arr)
+    same_shape = (monthly_means.dims == arr.dims and all(
+        monthly_means[dim].size == arr[dim].size
+        for dim in arr.dims if dim != TIME_STR))
+    if (segments is None or not same_shape or
+            monthly_means.chunks is not None or
+            not _is_datetime_like(monthly_means[TIME_STR])):
+        return arr - monthly_mean_at_each_ind(monthly_means, arr)
+    starts, month_keys, _ = segments
+    mean_keys = _month_keys(monthly_means[TIME_STR].values)
+    # As in monthly_mean_at_each_ind, months without a mean take that of the
+    # next month with one, or of the last month if there is none.
+    inds = np.minimum(np.searchsorted(mean_keys, month_keys),
+                      len(mean_keys) - 1)
+    axis = arr.get_axis_num(TIME_STR)
+    values = np.moveaxis(arr.values, axis, 0)
+    means = np.moveaxis(monthly_means.values, axis, 0)
+    deviations = np.empty(values.shape, dtype=np.result_type(values, means))
+    for start, end, ind, key in zip(starts, np.append(starts[1:], len(values)),
+                                    inds, month_keys):
+        if key < mean_keys[0]:
+            deviations[start:end] = np.nan
+        else:
+            np.subtract(values[start:end], means[ind],
+                        out=deviations[start:end])
+    name = arr.name if arr.name == monthly_means.name else None
+    return xr.DataArray(np.moveaxis(deviations, 0, axis), dims=arr.dims,
+                        coords=arr.coords, name=name)
+
+
+def _month_keys(values):
+    """Number of months since year 0 of each date."""
+    return (_datetime_field(values, 'year') * 12 +
+            _datetime_field(values, 'month') - 1)
+
+
+def _is_datetime_like(time):
+    """Whether a time array holds np.datetime64 values or cftime dates."""
+    return time.dtype == object or np.issubdtype(time.dtype, np.datetime64)
+
+
+def _month_end_dates(month_keys, like=None):
+    """Midnight on the last day of each month (as labeled by resampling).
+
+    The dates are of the same type as those of the array ``like`` (by
+    default np.datetime64).
+    """
+    if like is not None and np.asarray(like).dtype == object:
+        date_type = type(np.asarray(like).flat[0])
+        return _time_index([
+            date_type(int(key) // 12, int(key) % 12 + 1, 1) -
+            datetime.timedelta(days=1) for key in np.asarray(month_keys) + 1])
+    next_month = (np.asarray(month_keys) - 1970 * 12 + 1).astype(
+        'datetime64[M]')
+    return (next_month.astype('datetime64[D]') -
+            np.timedelta64(1, 'D')).astype('datetime64[ns]')
+
+
+def _month_segments(time):
+    """Contiguous blocks of timesteps within the same month.
+
+    Parameters
+    ----------
+    time : xarray.DataArray
+        Sorted array of times
+
+    Returns
+    -------
+    starts : numpy.ndarray
+        Index of the first timestep of each block
+    month_keys : numpy.ndarray
+        Number of months since year 0 of each block
+    keys : numpy.ndarray
+        Number of months since year 0 of each timestep
+    """
+    keys = _month_keys(time.values)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return starts, keys[starts], keys
+
+
+def _month_segments_if_vectorizable(arr):
+    """Month segments of in-memory float data with sorted times, else None."""
+    time = arr[TIME_STR]
+    if (arr.chunks is not None or time.ndim != 1 or
+            not np.issubdtype(arr.dtype, np.floating) or
+            not _is_datetime_like(time)):
+        return None
+    segments = _month_segments(time)
+    if np.any(np.diff(segments[2]) < 0):
+        return None
+    return segments
+
+
 def yearly_average(arr, dt):
     """Average a sub-yearly time-series over each year.
 
@@ -148,6 +407,13 @@ def yearly_average(arr, dt):
     original array had valid data.  Accounts for (i.e. ignores) masked values
     in original data when computing the annual averages.
 
+    If the time coordinate is sorted and ``dt`` varies only in time, the
+    weighted sums over each year are computed as segmented reductions over
+    the contiguous blocks of timesteps within each year (for dask-backed
+    arrays, block by block after aligning the chunks with the years), which
+    is much faster than grouping by year.  Otherwise the data are grouped
+    by year.
+
     Parameters
     ----------
     arr : xarray.DataArray
@@ -164,13 +430,109 @@ def yearly_average(arr, dt):
 
     """
     assert_matching_time_coord(arr, dt)
+    years = _datetime_field(arr[TIME_STR].values, 'year')
+    if dt.dims != (TIME_STR,) or np.any(np.diff(years) < 0):
+        return _yearly_average_groupby(arr, dt)
+    starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    axis = arr.get_axis_num(TIME_STR)
+    weights = np.asarray(dt.values, dtype=float)
+    if arr.chunks is None:
+        data = _segment_average(arr.values, weights, starts, axis)
+    else:
+        data = _segment_average_dask(arr.data, weights, starts, axis)
+    coords = {name: coord for name, coord in arr.coords.items()
+              if TIME_STR not in coord.dims}
+    coords[YEAR_STR] = years[starts]
+    dims = [YEAR_STR if dim == TIME_STR else dim for dim in arr.dims]
+    name = arr.name if arr.name == dt.name else None
+    return xr.DataArray(data, dims=dims, coords=coords, name=name)
+
+
+def _yearly_average_groupby(arr, dt):
+    """Average over each year by grouping the timesteps by year."""
     yr_str = TIME_STR + '.year'
     # Retain original data's mask.
-    dt = dt.where(np.isfinite(arr))
+    dt = dt.where(xr.ufuncs.isfinite(arr))
     return ((arr*dt).groupby(yr_str).sum(TIME_STR) /
             dt.groupby(yr_str).sum(TIME_STR))
 
 
+def _segment_average(values, weights, starts, axis):
+    """Weighted average over contiguous segments of an axis, ignoring NaNs.
+
+    The weighted sums are computed as the product of a sparse matrix, whose
+    rows hold the weights of each segment, with the data.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+    weights : numpy.ndarray
+        1D array of weights along ``axis``
+    starts : numpy.ndarray
+        Index along ``axis`` of the start of each segment, starting with 0
+    axis : int
+
+    Returns
+    -------
+    numpy.ndarray
+        Same shape as ``values`` except along ``axis``, which has one entry
+        per segment
+    """
+    n = values.shape[axis]
+    values = np.moveaxis(values, axis, 0)
+    shape = values.shape[1:]
+    values = values.reshape(n, -1)
+    segments = np.repeat(np.arange(len(starts)),
+                         np.diff(np.append(starts, n)))
+    weights = np.where(np.isfinite(weights), weights, 0.)
+    matrix = scipy.sparse.csr_matrix(
+        (weights, (segments, np.arange(n))), shape=(len(starts), n))
+    valid = np.isfinite(values)
+    if valid.all():
+        total = matrix.dot(values)
+        sum_weights = matrix.dot(np.ones((n, 1)))
+    else:
+        total = matrix.dot(np.where(valid, values, 0.))
+        sum_weights = matrix.dot(valid.astype(float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = total / sum_weights
+    return np.moveaxis(average.reshape((len(starts),) + shape), 0, axis)
+
+
+def _segment_average_dask(data, weights, starts, axis):
+    """Lazy version of ``_segment_average`` for dask arrays.
+
+    The array is rechunked along ``axis`` so that no segment spans multiple
+    chunks, grouping consecutive segments into chunks no longer than the
+    longest original chunk (or a single segment, if that is longer).  Each
+    chunk is then averaged independently.
+    """
+    bounds = np.append(starts, data.shape[axis])
+    max_chunk = max(data.chunks[axis])
+    chunk_bounds = [0]
+    n_segments = [0]
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        if n_segments[-1] and end - chunk_bounds[-1] > max_chunk:
+            chunk_bounds.append(begin)
+            n_segments.append(0)
+        n_segments[-1] += 1
+    chunk_bounds.append(bounds[-1])
+    chunk_bounds = np.array(chunk_bounds)
+
+    def average_block(block, block_id=None):
+        begin, end = chunk_bounds[block_id[axis]:block_id[axis] + 2]
+        local_starts = starts[(starts >= begin) & (starts < end)] - begin
+        return _segment_average(block, weights[begin:end], local_starts,
+                                axis)
+
+    time_chunks = tuple(int(n) for n in np.diff(chunk_bounds))
+    data = data.rechunk({axis: time_chunks})
+    chunks = list(data.chunks)
+    chunks[axis] = tuple(n_segments)
+    return data.map_blocks(average_block, chunks=tuple(chunks),
+                           dtype=np.result_type(data.dtype, float))
+
+
 def ensure_datetime(obj):
     """Return the object if it is of type datetime.datetime; else raise.
 
@@ -245,7 +607,72 @@ def numpy_datetime_range_workaround(date, min_year, max_year):
     return date
 
 
-def numpy_datetime_workaround_encode_cf(ds):
+def _year_in_datetime64_range(year):
+    """Whether all dates in the given year are representable as datetime64.
+
+    Returns None for the edge years 1677 and 2262, which are only partially
+    representable.
+    """
+    if pd.Timestamp.min.year < year < pd.Timestamp.max.year:
+        return True
+    if year in (pd.Timestamp.min.year, pd.Timestamp.max.year):
+        return None
+    return False
+
+
+def _decode_extreme_dates(time):
+    """Decode only the earliest and latest of a raw time array's values.
+
+    Because decoding is monotonic, this suffices to determine the range of
+    the decoded dates (and whether they are representable as
+    np.datetime64) without decoding the whole array.
+
+    Parameters
+    ----------
+    time : xarray.DataArray
+        Raw (undecoded) time values, with CF ``units`` (and optionally
+        ``calendar``) attributes
+
+    Returns
+    -------
+    numpy.ndarray
+        The earliest and latest dates, of dtype np.datetime64 if both are
+        representable as such, or else cftime datetime objects
+    """
+    values = np.asarray(time.values)
+    attrs = {key: time.attrs[key] for key in ('units', 'calendar')
+             if key in time.attrs}
+    extremes = xr.Dataset({TIME_STR: ((TIME_STR + '_endpoints',),
+                                      [np.nanmin(values), np.nanmax(values)],
+                                      attrs)})
+    return xr.decode_cf(extremes)[TIME_STR].values
+
+
+def _datetime_field(values, field):
+    """Vectorized extraction of a field (e.g. 'year') of an array of dates.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Array of np.datetime64 values or of datetime-like objects (e.g.
+        cftime datetimes for non-standard calendars or out-of-range years)
+    field : str
+        Name of the field, e.g. 'year' or 'month'
+
+    Returns
+    -------
+    numpy.ndarray
+        Integer array of the same shape as ``values``
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        index = pd.DatetimeIndex(values.ravel())
+        return np.asarray(getattr(index, field)).reshape(values.shape)
+    return np.array([getattr(date, field) for date in values.ravel()],
+                    dtype=int).reshape(values.shape)
+
+
+def numpy_datetime_workaround_encode_cf(ds, min_year=None, max_year=None):
     """Generate CF-compliant units for out-of-range dates.
 
     Hack to address np.datetime64, and therefore pandas and xarray, not
@@ -258,9 +685,17 @@ def numpy_datetime_workaround_encode_cf(ds):
     (hours, minutes, seconds, etc.) intact and with the time-spacing between
     values intact.
 
+    This is only needed if xarray cannot index times by cftime dates (see
+    ``decode_cf``); otherwise the Dataset is returned unchanged.
+
     Parameters
     ----------
     ds : xarray.Dataset
+    min_year, max_year : int, optional
+        Minimum and maximum years of the time values in the Dataset, if
+        already known (e.g. from ``aospy.catalog``).  If both are given,
+        the time array does not need to be decoded to find them, unless
+        either falls in one of the edge years 1677 or 2262.
 
     Returns
     -------
@@ -271,23 +706,59 @@ def numpy_datetime_workaround_encode_cf(ds):
     time = ds[TIME_STR]
     units = time.attrs['units']
     units_yr = units.split(' since ')[1].split('-')[0]
-    min_yr_decoded = xr.decode_cf(time.to_dataset(name='dummy'))
-    min_date = min_yr_decoded[TIME_STR].values[0]
-    max_date = min_yr_decoded[TIME_STR].values[-1]
-    if all(isinstance(date, np.datetime64) for date in [min_date, max_date]):
-        return ds, pd.Timestamp(min_date).year, pd.Timestamp(max_date).year
+    in_range = None
+    if min_year is not None and max_year is not None:
+        in_range = [_year_in_datetime64_range(year)
+                    for year in (min_year, max_year)]
+    if in_range is None or None in in_range:
+        extremes = _decode_extreme_dates(time)
+        min_yr, max_yr = _datetime_field(extremes, 'year')
+        if np.issubdtype(extremes.dtype, np.datetime64):
+            return ds, min_yr, max_yr
+    elif all(in_range):
+        return ds, min_year, max_year
     else:
-        min_yr = min_date.year
-        max_yr = max_date.year
-        offset = int(units_yr) - min_yr + 1
-        new_units_yr = pd.Timestamp.min.year + offset
-        new_units = units.replace(units_yr, str(new_units_yr))
-
-        for VAR_STR in TIME_VAR_STRS:
-            if VAR_STR in ds:
-                var = ds[VAR_STR]
-                var.attrs['units'] = new_units
+        min_yr = min_year
+        max_yr = max_year
+    if _CFTIMEINDEX:
         return ds, min_yr, max_yr
+    offset = int(units_yr) - min_yr + 1
+    new_units_yr = pd.Timestamp.min.year + offset
+    new_units = units.replace(units_yr, str(new_units_yr))
+
+    for VAR_STR in TIME_VAR_STRS:
+        if VAR_STR in ds:
+            var = ds[VAR_STR]
+            var.attrs['units'] = new_units
+    return ds, min_yr, max_yr
+
+
+def decode_cf(ds, min_year, max_year, **kwargs):
+    """Decode CF metadata, with out-of-range times decoded to cftime dates.
+
+    If xarray supports indexing times by cftime dates, times in years that
+    numpy.datetime64 cannot represent are decoded to cftime dates in the
+    calendar of the data, rather than shifted to start in 1678 (see
+    ``numpy_datetime_workaround_encode_cf``).
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+    min_year, max_year : int
+        Minimum and maximum years of the time values in the Dataset, as
+        returned by ``numpy_datetime_workaround_encode_cf``
+    **kwargs
+        Passed to ``xr.decode_cf``
+
+    Returns
+    -------
+    xarray.Dataset
+    """
+    if _CFTIMEINDEX_OPTION and not all(
+            _year_in_datetime64_range(year) for year in (min_year, max_year)):
+        with xr.set_options(enable_cftimeindex=True):
+            return xr.decode_cf(ds, **kwargs)
+    return xr.decode_cf(ds, **kwargs)
 
 
 def month_indices(months):
@@ -355,10 +826,53 @@ def _month_conditional(time, months):
         months_array = month_indices(months)
     else:
         months_array = months
-    cond = False
-    for month in months_array:
-        cond |= (time['{}.month'.format(TIME_STR)] == month)
-    return cond
+    codes = _month_codes(time)
+    cond = np.in1d(codes.ravel(), months_array).reshape(codes.shape)
+    return xr.DataArray(cond, dims=time.dims, coords=time.coords)
+
+
+# Month of each time value of recently used time coordinates, keyed by a hash
+# of the time values, so that the same months are not recomputed for each
+# variable (and for each Calc) sharing a time axis.
+_MONTH_CODES_CACHE = OrderedDict()
+_MONTH_CODES_CACHE_SIZE = 32
+_MONTH_CODES_LOCK = threading.Lock()
+
+
+def _month_codes(time):
+    """Month (1-12) of each value of a time array, memoized by its values.
+
+    Parameters
+    ----------
+    time : xarray.DataArray
+        Array of times
+
+    Returns
+    -------
+    numpy.ndarray
+        The month of each time.  This may be shared with other callers and
+        must not be modified.
+    """
+    values = np.asarray(time.values)
+    if not np.issubdtype(values.dtype, np.datetime64):
+        return _datetime_field(values, 'month')
+    key = (values.shape, values.dtype.str, hashlib.sha1(
+        np.ascontiguousarray(values).view(np.int64)).hexdigest())
+    with _MONTH_CODES_LOCK:
+        try:
+            codes = _MONTH_CODES_CACHE.pop(key)
+        except KeyError:
+            codes = None
+        else:
+            _MONTH_CODES_CACHE[key] = codes
+    if codes is None:
+        codes = _datetime_field(values, 'month')
+        codes.setflags(write=False)
+        with _MONTH_CODES_LOCK:
+            _MONTH_CODES_CACHE[key] = codes
+            while len(_MONTH_CODES_CACHE) > _MONTH_CODES_CACHE_SIZE:
+                _MONTH_CODES_CACHE.popitem(last=False)
+    return codes
 
 
 def extract_months(time, months):
@@ -493,9 +1007,9 @@ def sel_time(da, start_date, end_date):
     ----------
     da : DataArray or Dataset
         data to subset
-    start_date : np.datetime64
+    start_date : np.datetime64 or cftime date
         start of date interval
-    end_date : np.datetime64
+    end_date : np.datetime64 or cftime date
         end of date interval
 
     Returns
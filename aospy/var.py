@@ -34,6 +34,8 @@ class Var(object):
         The name of the default colormap to be used in plots of this variable
     valid_range : length-2 tuple
         The range of values outside which to flag as unphysical/erroneous
+    linear : bool
+        Whether `func` is linear in its arguments
 
     """
 
@@ -41,7 +43,8 @@ class Var(object):
                  func_input_dtype='DataArray', units='', plot_units='',
                  plot_units_conv=1, domain='atmos', description='',
                  def_time=False, def_vert=False, def_lat=False, def_lon=False,
-                 math_str=False, colormap='RdBu_r', valid_range=None):
+                 math_str=False, colormap='RdBu_r', valid_range=None,
+                 linear=False):
         """Instantiate a Var object.
 
         Parameters
@@ -81,6 +84,13 @@ class Var(object):
             be used in plots of this variable.
         valid_range : length-2 tuple
             The range of values outside which to flag as unphysical/erroneous
+        linear : bool, optional
+            Whether `func` is linear in its arguments (e.g. a sum of its
+            arguments times constants), in which case its monthly means equal
+            its values computed from the monthly means of its arguments.  If
+            so, when both full and 'time-mean' or 'eddy' outputs are
+            requested, `func` is only evaluated once.  Default False (always
+            True if `func` is not given).
 
         """
         self.name = name
@@ -94,6 +104,7 @@ class Var(object):
             self.func = lambda x: x
             self.variables = None
             self.func_input_dtype = None
+            linear = True
         else:
             self.func = func
             self.variables = variables
@@ -118,6 +129,7 @@ class Var(object):
         self.math_str = math_str
         self.colormap = colormap
         self.valid_range = valid_range
+        self.linear = linear
 
     def __str__(self):
         return 'Var instance "' + self.name + '"'
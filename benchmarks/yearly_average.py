@@ -0,0 +1,53 @@
+"""Benchmark of ``aospy.utils.times.yearly_average``.
+
+Compares the segmented reduction over the contiguous timesteps of each year
+with grouping by year, for 100 years of 6-hourly data on an 8x16 grid, with
+and without NaNs, and for dask-backed data in 5-year chunks.
+
+Usage: python benchmarks/yearly_average.py [--repeat N]
+"""
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from aospy.internal_names import TIME_STR
+from aospy.utils.times import _yearly_average_groupby, yearly_average
+
+
+def _example_data(with_nans=False):
+    time = pd.date_range('1900-01-01', '1999-12-31 18:00', freq='6H')
+    rng = np.random.RandomState(0)
+    values = rng.rand(time.size, 8, 16)
+    if with_nans:
+        values[rng.rand(*values.shape) < 0.1] = np.nan
+    arr = xr.DataArray(values, dims=[TIME_STR, 'lat', 'lon'],
+                       coords={TIME_STR: time})
+    dt = xr.DataArray(np.full(time.size, 0.25), dims=[TIME_STR],
+                      coords={TIME_STR: time})
+    return arr, dt
+
+
+def _time(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(repeat):
+    arr, dt = _example_data()
+    cases = [('without NaNs', arr),
+             ('with NaNs', _example_data(with_nans=True)[0]),
+             ('dask (5-year chunks)', arr.chunk({TIME_STR: 5 * 365 * 4}))]
+    print('{} timesteps'.format(arr[TIME_STR].size))
+    for name, data in cases:
+        times = [_time(lambda: func(data, dt).compute(), repeat)
+                 for func in (_yearly_average_groupby, yearly_average)]
+        print('{:<22}groupby {:.3f} s, segmented {:.3f} s'.format(
+            name, *times))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    main(parser.parse_args().repeat)